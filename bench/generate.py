@@ -0,0 +1,137 @@
+"""
+Generate synthetic Tiger programs for scaling tests (see scaling.py). Programs are deterministic for a given seed and
+grow along independent dimensions:
+
+- size: the number of statements in the body
+- depth: how deeply each statement's expression nests (parentheses, if-else and let)
+- declarations: the number of variable and function declarations
+- chain: the length of each statement's chain of binary operations
+- strings: the total number of characters in string literals
+
+Generated programs stick to what the interpreter evaluates today (see README.md): every 'if' has an 'else', chains only
+use '+' and '*' (which do not depend on the parser's grouping of equal precedences) and function parameters are not
+named like any variable. Every value stays small, so programs behave the same with and without integer overflow.
+
+Usage: python bench/generate.py [--size 100] [--depth 3] [--declarations 10] [--chain 5] [--strings 1000] [--seed 0]
+"""
+import argparse
+import random
+import sys
+
+# the length of each generated string literal, at most
+STRING_LENGTH = 64
+# the length of the chain summed by each function
+FUNCTION_CHAIN = 3
+LETTERS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 '
+
+
+class Generator:
+    def __init__(self, depth, declarations, chain, seed):
+        self.random = random.Random(seed)
+        self.depth = depth
+        self.chain = chain
+        self.variables = ['v%d' % index for index in range(max(1, (declarations + 1) // 2))]
+        self.functions = ['f%d' % index for index in range(declarations // 2)]
+        self.locals = 0
+
+    def below(self, n):
+        """Only random() is drawn from, so that programs are the same under Python 2 and 3 (unlike randint, choice)"""
+        return int(self.random.random() * n)
+
+    def choice(self, items):
+        return items[self.below(len(items))]
+
+    def operand(self, names):
+        """A small constant or the (small) value of a variable"""
+        if self.random.random() < 0.5:
+            return str(self.below(10))
+        return self.choice(names)
+
+    def term(self, names):
+        if self.functions and names is self.variables and self.random.random() < 0.2:
+            return '%s(%s, %s)' % (self.choice(self.functions), self.operand(names), self.operand(names))
+        if self.random.random() < 0.3:
+            return '%s * %s' % (self.operand(names), self.operand(names))
+        return self.operand(names)
+
+    def chain_of(self, length, names):
+        """A sum of 'length' terms; '+' only, so that the sum's value stays within length * 81 or so"""
+        return ' + '.join([self.term(names) for _ in range(max(1, length))])
+
+    def nested(self, depth, names):
+        """A chain wrapped in 'depth' levels of nesting; each level keeps the value within the same bounds and evaluates
+        the level it wraps: operands are below 10, so every 'if' takes its 'then' branch"""
+        expression = self.chain_of(self.chain, names)
+        for _ in range(depth):
+            form = self.below(3)
+            if form == 0:
+                expression = '(%s)' % expression
+            elif form == 1:
+                expression = 'if %s < 10 then %s else %s' % (self.operand(names), expression, self.operand(names))
+            else:
+                self.locals += 1
+                local = 'x%d' % self.locals
+                expression = 'let var %s := %s in %s end' % (local, self.operand(names), expression)
+        return expression
+
+    def declarations(self):
+        lines = []
+        for name in self.variables:
+            lines.append('  var %s := %d' % (name, self.below(10)))
+        # functions sum their parameters (never named like a variable) with constants, never calling each other; their
+        # bodies have a fixed length so that the cost of a call does not grow with the chain
+        for name in self.functions:
+            lines.append('  function %s(a: int, b: int): int = %s' % (name, self.chain_of(FUNCTION_CHAIN, ['a', 'b'])))
+        return lines
+
+    def strings(self, volume):
+        """Declarations of string variables holding 'volume' characters in all, and statements printing them"""
+        declarations = []
+        statements = []
+        index = 0
+        while volume > 0:
+            length = min(volume, STRING_LENGTH)
+            text = ''.join([self.choice(LETTERS) for _ in range(length)])
+            declarations.append('  var s%d := "%s"' % (index, text))
+            statements.append('print(s%d)' % index)
+            volume -= length
+            index += 1
+        return declarations, statements
+
+    def program(self, size, strings):
+        declarations = self.declarations()
+        string_declarations, string_statements = self.strings(strings)
+        statements = []
+        for index in range(size):
+            # each statement's value is bounded independently of the others: the accumulator is only printed
+            statements.append('total := %s' % self.nested(self.depth, self.variables))
+            if index % 10 == 9:
+                statements.append('print(total)')
+        statements.extend(string_statements)
+        statements.append('print(total)')
+        lines = ['let'] + declarations + string_declarations + ['  var total := 0', 'in']
+        lines.append('  ' + ';\n  '.join(statements))
+        lines.append('end')
+        return '\n'.join(lines) + '\n'
+
+
+def generate(size=100, depth=3, declarations=10, chain=5, strings=1000, seed=0):
+    """Return the source of a valid Tiger program of the given dimensions"""
+    return Generator(depth, declarations, chain, seed).program(size, strings)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Generate a synthetic Tiger program')
+    parser.add_argument('--size', type=int, default=100, help='number of statements (default: 100)')
+    parser.add_argument('--depth', type=int, default=3, help='nesting depth of each statement (default: 3)')
+    parser.add_argument('--declarations', type=int, default=10, help='number of declarations (default: 10)')
+    parser.add_argument('--chain', type=int, default=5, help='operations chained in each expression (default: 5)')
+    parser.add_argument('--strings', type=int, default=1000, help='characters of string literals (default: 1000)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv[1:])
+    sys.stdout.write(generate(args.size, args.depth, args.declarations, args.chain, args.strings, args.seed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
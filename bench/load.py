@@ -0,0 +1,125 @@
+"""
+Load-test tiger-interpreter --serve: start a server (or use a running one with --socket), send it the benchmark programs
+from a number of concurrent clients and report request latency percentiles and throughput.
+
+Usage: python bench/load.py [--python python2 | --binary bin/tiger-interpreter] [--clients 8] [--requests 50] ...
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIRECTORY = os.path.dirname(BENCH_DIRECTORY)
+sys.path.insert(0, ROOT_DIRECTORY)
+
+from run import BENCHMARKS, PROGRAMS_DIRECTORY  # noqa: E402
+from src.main.client import Client  # noqa: E402
+
+# seconds to wait for a started server to create its socket
+STARTUP_TIMEOUT = 30
+
+
+def programs(names):
+    """The source of each benchmark at its smallest size, so that latency is not dominated by a single program"""
+    sources = []
+    for name, sizes in BENCHMARKS:
+        if names and name not in names:
+            continue
+        with open(os.path.join(PROGRAMS_DIRECTORY, name + '.tig'), 'r') as template:
+            sources.append((name, template.read().replace('$N', str(sizes[0]))))
+    return sources
+
+
+def start_server(args, path):
+    if args.binary:
+        command = [args.binary]
+    else:
+        command = [args.python, os.path.join(ROOT_DIRECTORY, 'src', 'main', 'tiger-interpreter.py')]
+    command += ['--serve', path, '--allow-stop', '--workers', str(args.workers), '--cache-size',
+                str(args.cache_size)]
+    environment = dict(os.environ, PYTHONPATH=ROOT_DIRECTORY)
+    process = subprocess.Popen(command, env=environment)
+    deadline = time.time() + STARTUP_TIMEOUT
+    while not os.path.exists(path):
+        if process.poll() is not None or time.time() > deadline:
+            raise RuntimeError('Server failed to start: %s' % ' '.join(command))
+        time.sleep(0.05)
+    return process
+
+
+def client(path, sources, requests, offset, latencies, failures):
+    connection = Client(path)
+    try:
+        for index in range(requests):
+            name, source = sources[(offset + index) % len(sources)]
+            start = time.time()
+            reply = connection.run(source)
+            latencies.append(time.time() - start)
+            if reply.code != 0:
+                failures.append('%s: exit code %d %s' % (name, reply.code, reply.message))
+    finally:
+        connection.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Load-test tiger-interpreter --serve')
+    parser.add_argument('--socket', help='use the server already listening on this socket')
+    parser.add_argument('--python', default='python', help='Python used to start the server (default: python)')
+    parser.add_argument('--binary', help='start this translated interpreter instead of the CPython one')
+    parser.add_argument('--workers', type=int, default=4, help='worker processes of a started server (default: 4)')
+    parser.add_argument('--cache-size', type=int, default=64)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients (default: 8)')
+    parser.add_argument('--requests', type=int, default=50, help='requests sent by each client (default: 50)')
+    parser.add_argument('--benchmark', action='append', help='only send the named benchmark program(s)')
+    args = parser.parse_args(argv[1:])
+
+    sources = programs(args.benchmark)
+    directory = None
+    server = None
+    path = args.socket
+    if path is None:
+        directory = tempfile.mkdtemp(prefix='tiger-load-')
+        path = os.path.join(directory, 'tiger.sock')
+        server = start_server(args, path)
+
+    latencies = []
+    failures = []
+    try:
+        threads = [threading.Thread(target=client, args=(path, sources, args.requests, offset, latencies, failures))
+                   for offset in range(args.clients)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+    finally:
+        if server is not None:
+            stopping = Client(path)
+            stopping.stop()
+            stopping.close()
+            server.wait()
+            os.rmdir(directory)
+
+    if latencies:
+        print('requests: %d in %.2f s (%.1f/s) from %d clients' % (len(latencies), elapsed, len(latencies) / elapsed,
+                                                                   args.clients))
+        print('latency:  p50 %.2f ms, p99 %.2f ms, max %.2f ms' % (percentile(latencies, 0.50) * 1000,
+                                                                   percentile(latencies, 0.99) * 1000,
+                                                                   max(latencies) * 1000))
+    for failure in failures:
+        sys.stderr.write('failed: %s\n' % failure)
+    return 1 if failures or len(latencies) < args.clients * args.requests else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
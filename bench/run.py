@@ -0,0 +1,220 @@
+"""
+Run the Tiger benchmark suite and compare it against a stored baseline.
+
+Each program in bench/programs is a template: '$N' is replaced by each of the sizes listed in BENCHMARKS below. Every
+(benchmark, size) pair is run in each requested mode--CPython (src/main/tiger-interpreter.py) and the translated
+bin/tiger-interpreter--with '--repeat' so that the interpreter reports the time of each in-process iteration (i.e. the
+warmup curve). Wall time, iteration times, peak RSS and a checksum of the output are written as JSON.
+
+Usage: python bench/run.py [--mode cpython|binary] [--benchmark fib] [--interpreter-arg=--optimize] [--save-baseline]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIRECTORY = os.path.dirname(BENCH_DIRECTORY)
+PROGRAMS_DIRECTORY = os.path.join(BENCH_DIRECTORY, 'programs')
+
+# benchmark name (a file in bench/programs) and the sizes to substitute for $N
+BENCHMARKS = [
+    ('fib', [12, 15, 18]),
+    ('queens', [5, 6, 7]),
+    ('mergesort', [200, 500, 1000]),
+    ('sieve', [2000, 5000, 20000]),
+    ('subprimes', [50, 100, 200]),
+    ('strings', [10, 50, 200]),
+    ('arrays', [100, 500, 1000]),
+    ('recursion', [50, 100, 150]),
+    ('calls', [2000, 5000, 20000]),
+    ('conditions', [500, 2000, 5000]),
+]
+
+ITERATION_LINE = re.compile(r'^iteration (\d+): (\d+) us$')
+
+# seconds between samples of a running benchmark's peak RSS
+POLL_INTERVAL = 0.01
+
+# reported in place of an exit code when the iterations of a single run print different output
+INCONSISTENT_OUTPUT = -1000
+
+
+def instantiate(name, size, directory):
+    """Write a copy of the benchmark template with its size filled in and return the path to it"""
+    with open(os.path.join(PROGRAMS_DIRECTORY, name + '.tig'), 'r') as template:
+        source = template.read().replace('$N', str(size))
+    path = os.path.join(directory, '%s-%d.tig' % (name, size))
+    with open(path, 'w') as program:
+        program.write(source)
+    return path
+
+
+def commands(args):
+    """Map each available mode to the command prefix used to run a Tiger program in it"""
+    available = {}
+    if 'cpython' in args.mode:
+        available['cpython'] = [args.python, os.path.join(ROOT_DIRECTORY, 'src', 'main', 'tiger-interpreter.py')]
+    if 'binary' in args.mode:
+        if os.path.exists(args.binary):
+            available['binary'] = [args.binary]
+        else:
+            sys.stderr.write('Skipping binary mode: %s does not exist (see `make binaries`)\n' % args.binary)
+    for mode in available:
+        available[mode] = available[mode] + args.interpreter_args
+    return available
+
+
+def read_peak_rss(pid):
+    """Read the high-water RSS (in KB) of a running process from /proc; returns 0 if unavailable. This is preferred to
+    the ru_maxrss reported by wait4, which on Linux includes the RSS of this (much larger) runner at fork time"""
+    try:
+        with open('/proc/%d/status' % pid, 'r') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (IOError, OSError, ValueError):
+        pass
+    return 0
+
+
+def run(command, iterations):
+    """Run a single benchmark process; return its exit code, output, iteration times, wall time and peak RSS (KB)"""
+    environment = dict(os.environ, PYTHONPATH=ROOT_DIRECTORY)
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        start = time.time()
+        process = subprocess.Popen(command + ['--repeat', str(iterations)], stdout=stdout, stderr=stderr,
+                                   env=environment, cwd=ROOT_DIRECTORY)
+        peak_rss = 0
+        while True:
+            # wait4 (rather than Popen.wait) retrieves the resource usage of this child alone
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            peak_rss = max(peak_rss, read_peak_rss(process.pid))
+            time.sleep(POLL_INTERVAL)
+        wall_time = time.time() - start
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+
+        stdout.seek(0)
+        output = stdout.read()
+        stderr.seek(0)
+        errors = stderr.read().decode('utf-8', 'replace')
+
+    times = []
+    for line in errors.splitlines():
+        match = ITERATION_LINE.match(line)
+        if match:
+            times.append(int(match.group(2)) / 1000000.0)
+    return process.returncode, output, times, wall_time, peak_rss or usage.ru_maxrss
+
+
+def measure(args):
+    results = []
+    directory = tempfile.mkdtemp(prefix='tiger-bench-')
+    for mode, command in sorted(commands(args).items()):
+        for name, sizes in BENCHMARKS:
+            if args.benchmark and name not in args.benchmark:
+                continue
+            for size in sizes:
+                program = instantiate(name, size, directory)
+                code, output, times, wall_time, peak_rss = run(command + [program], args.iterations)
+                # every iteration prints the same output; checksum one copy so results do not depend on --iterations
+                single = output[:len(output) // args.iterations]
+                if single * args.iterations != output:
+                    single = output
+                    code = code or INCONSISTENT_OUTPUT
+                result = {
+                    'benchmark': name,
+                    'size': size,
+                    'mode': mode,
+                    'exit_code': code,
+                    'wall_time': wall_time,
+                    'iterations': times,
+                    'best': min(times) if times else None,
+                    'peak_rss_kb': peak_rss,
+                    'checksum': hashlib.sha1(single).hexdigest(),
+                }
+                results.append(result)
+                sys.stdout.write('%-8s %-10s %6d  exit=%d  wall=%.3fs  best=%s  rss=%dKB\n' % (
+                    mode, name, size, code, wall_time, '%.4fs' % result['best'] if times else 'n/a', peak_rss))
+                sys.stdout.flush()
+    return results
+
+
+def key(result):
+    return result['benchmark'], result['size'], result['mode']
+
+
+def compare(results, baseline, threshold):
+    """Return a list of human-readable problems: failures, checksum changes and slowdowns beyond the threshold"""
+    problems = []
+    expected = dict((key(result), result) for result in baseline)
+    for result in results:
+        label = '%s/%s/%d' % (result['mode'], result['benchmark'], result['size'])
+        if result['exit_code'] == INCONSISTENT_OUTPUT:
+            problems.append('%s: iterations printed different output' % label)
+            continue
+        elif result['exit_code'] != 0:
+            problems.append('%s: exited with code %d' % (label, result['exit_code']))
+            continue
+        previous = expected.get(key(result))
+        if previous is None:
+            continue
+        if previous['checksum'] != result['checksum']:
+            problems.append('%s: output checksum changed (%s -> %s)' % (label, previous['checksum'],
+                                                                        result['checksum']))
+        if previous['best'] and result['best'] and result['best'] > previous['best'] * (1 + threshold):
+            problems.append('%s: regressed from %.4fs to %.4fs (+%.0f%%)' % (
+                label, previous['best'], result['best'], (result['best'] / previous['best'] - 1) * 100))
+    return problems
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Run the Tiger benchmark suite')
+    parser.add_argument('--mode', action='append', choices=['cpython', 'binary'],
+                        help='interpreter(s) to measure; defaults to both')
+    parser.add_argument('--benchmark', action='append', help='only run the named benchmark(s)')
+    parser.add_argument('--python', default='python2',
+                        help='Python used for CPython mode (default: python2; the interpreter writes str to fds)')
+    parser.add_argument('--binary', default=os.path.join(ROOT_DIRECTORY, 'bin', 'tiger-interpreter'))
+    parser.add_argument('--interpreter-arg', action='append', default=[], dest='interpreter_args',
+                        help='pass an option to the interpreter, e.g. --interpreter-arg=--optimize')
+    parser.add_argument('--iterations', type=int, default=5, help='in-process iterations per run (default: 5)')
+    parser.add_argument('--output', default=os.path.join(BENCH_DIRECTORY, 'results.json'))
+    parser.add_argument('--baseline', default=os.path.join(BENCH_DIRECTORY, 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown of the best iteration flagged as a regression (default: 0.10)')
+    args = parser.parse_args(argv[1:])
+    args.mode = args.mode or ['cpython', 'binary']
+
+    results = measure(args)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print('Saved baseline to %s' % args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline found at %s; run with --save-baseline to create one' % args.baseline)
+        problems = compare(results, [], args.threshold)
+    else:
+        with open(args.baseline, 'r') as file:
+            problems = compare(results, json.load(file), args.threshold)
+
+    for problem in problems:
+        print('REGRESSION %s' % problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,207 @@
+"""
+Measure how the time and memory of each phase of the interpreter grow with the size of its input, using programs from
+generate.py. Each axis (a dimension of generate.generate) is scaled on its own, with the others at their defaults, and
+every phase--reading the file, tokenizing, parsing and evaluating--is timed (best of --repeat runs) and, under Python 3,
+its peak allocation measured with tracemalloc. The growth exponent of each phase is the slope of a least-squares fit of
+log(cost) against log(input bytes); the harness fails if any exponent exceeds its expected complexity (1, i.e. linear,
+for every phase) by more than --tolerance.
+
+The phases run in this process, so run it with the Python to measure:
+
+    python2 bench/scaling.py                      # all axes, an ASCII chart per axis
+    python3 bench/scaling.py --axis depth --output scaling.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+ROOT_DIRECTORY = os.path.dirname(BENCH_DIRECTORY)
+sys.path.insert(0, ROOT_DIRECTORY)
+
+from generate import generate  # noqa: E402
+from src.main.util import read_file, create_environment_with_natives, output  # noqa: E402
+from src.parser import Parser  # noqa: E402
+from src.tokenizer import Tokenizer  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# axis (a parameter of generate.generate) and the values it is scaled through; the other parameters keep the defaults
+# given here, so that the scaled dimension dominates the input
+AXES = [
+    ('size', [250, 500, 1000, 2000]),
+    ('depth', [25, 50, 100, 200]),
+    ('declarations', [250, 500, 1000, 2000]),
+    ('chain', [25, 50, 100, 200]),
+    ('strings', [25000, 50000, 100000, 200000]),
+]
+DEFAULTS = {'size': 20, 'depth': 2, 'declarations': 4, 'chain': 3, 'strings': 100}
+
+PHASES = ['read', 'tokenize', 'parse', 'evaluate']
+
+# the expected growth exponent of each phase with the input size
+EXPECTED = {'read': 1.0, 'tokenize': 1.0, 'parse': 1.0, 'evaluate': 1.0}
+
+# the parser and evaluator recurse on the nesting of expressions
+RECURSION_LIMIT = 100000
+
+# the shortest sample of a phase's time, in seconds
+MINIMUM_SAMPLE = 0.05
+
+CHART_WIDTH = 50
+
+
+def prepare(phase, source):
+    """The input of a phase, built before it is timed"""
+    if phase == 'evaluate':
+        return Parser(source).parse()
+    return source
+
+
+def run_phase(phase, path, input):
+    if phase == 'read':
+        read_file(path)
+    elif phase == 'tokenize':
+        Tokenizer(input).all()
+    elif phase == 'parse':
+        Parser(input).parse()
+    else:
+        output.capture()
+        try:
+            input.evaluate(create_environment_with_natives())
+        finally:
+            output.release()
+
+
+def time_phase(phase, path, input, loops):
+    start = time.time()
+    for _ in range(loops):
+        run_phase(phase, path, input)
+    return time.time() - start
+
+
+def measure_phase(phase, path, source, repeat):
+    """Return the best time (in seconds) and the peak allocation (in bytes, or None without tracemalloc) of a phase.
+    Fast phases are run in loops of at least MINIMUM_SAMPLE seconds so that timer resolution and noise do not skew the
+    growth exponents"""
+    input = prepare(phase, source)
+    loops = 1
+    while True:
+        elapsed = time_phase(phase, path, input, loops)
+        if elapsed >= MINIMUM_SAMPLE:
+            break
+        loops *= 2
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        best = min(best, time_phase(phase, path, input, loops) / loops)
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        run_phase(phase, path, input)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, peak
+
+
+def measure_axis(axis, values, repeat, directory):
+    points = []
+    for value in values:
+        parameters = dict(DEFAULTS)
+        parameters[axis] = value
+        source = generate(**parameters)
+        path = os.path.join(directory, '%s-%d.tig' % (axis, value))
+        with open(path, 'w') as file:
+            file.write(source)
+        point = {'axis': axis, 'value': value, 'bytes': len(source), 'time': {}, 'memory': {}}
+        for phase in PHASES:
+            point['time'][phase], point['memory'][phase] = measure_phase(phase, path, source, repeat)
+        points.append(point)
+        sys.stdout.write('%-12s %8d  %8d bytes  %s\n' % (axis, value, len(source), '  '.join(
+            ['%s=%.5fs' % (phase, point['time'][phase]) for phase in PHASES])))
+        sys.stdout.flush()
+    return points
+
+
+def exponent(xs, ys):
+    """The slope of the least-squares line through (log x, log y)"""
+    pairs = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y is not None and y > 0]
+    if len(pairs) < 2:
+        return None
+    mean_x = sum([x for x, _ in pairs]) / len(pairs)
+    mean_y = sum([y for _, y in pairs]) / len(pairs)
+    variance = sum([(x - mean_x) ** 2 for x, _ in pairs])
+    if variance == 0:
+        return None
+    return sum([(x - mean_x) * (y - mean_y) for x, y in pairs]) / variance
+
+
+def chart(points, phase):
+    """An ASCII chart of one phase's time against input size: bar lengths are proportional to time, so linear growth
+    doubles the bar whenever the input doubles"""
+    longest = max([point['time'][phase] for point in points]) or 1
+    lines = []
+    for point in points:
+        width = int(round(point['time'][phase] / longest * CHART_WIDTH))
+        memory = point['memory'][phase]
+        lines.append('  %-9s %9d B |%-*s| %.5fs%s' % (phase, point['bytes'], CHART_WIDTH, '#' * width,
+                                                     point['time'][phase],
+                                                     '  %d KB' % (memory // 1024) if memory is not None else ''))
+    return '\n'.join(lines)
+
+
+def analyze(axis, points, tolerance):
+    """Print the chart and the growth exponents of an axis; return the problems found"""
+    problems = []
+    sys.stdout.write('\n%s:\n' % axis)
+    xs = [point['bytes'] for point in points]
+    for phase in PHASES:
+        sys.stdout.write(chart(points, phase) + '\n')
+        for kind in ['time', 'memory']:
+            growth = exponent(xs, [point[kind][phase] for point in points])
+            if growth is None:
+                continue
+            sys.stdout.write('  %-9s %s grows as n^%.2f (expected n^%.2f)\n' % (phase, kind, growth, EXPECTED[phase]))
+            if growth > EXPECTED[phase] + tolerance:
+                problems.append('%s/%s: %s grows as n^%.2f, expected at most n^%.2f' % (
+                    axis, phase, kind, growth, EXPECTED[phase] + tolerance))
+    return problems
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Measure how each interpreter phase scales with its input')
+    parser.add_argument('--axis', action='append', choices=[name for name, _ in AXES],
+                        help='only scale the named axis (or axes); defaults to all')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each phase, keeping the best (default: 3)')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed excess of a growth exponent over the expected one (default: 0.5)')
+    parser.add_argument('--output', help='also write every measurement to this JSON file, e.g. for plotting')
+    args = parser.parse_args(argv[1:])
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), RECURSION_LIMIT))
+    directory = tempfile.mkdtemp(prefix='tiger-scaling-')
+    results = []
+    problems = []
+    for axis, values in AXES:
+        if args.axis and axis not in args.axis:
+            continue
+        points = measure_axis(axis, values, args.repeat, directory)
+        results.extend(points)
+        problems.extend(analyze(axis, points, args.tolerance))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    for problem in problems:
+        sys.stdout.write('Superlinear: %s\n' % problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,51 @@
+"""
+Opt-in allocation counting (tiger-interpreter --alloc-stats): the number of tokens, locations, values and environment
+levels created in each phase of a run, the peak number of live function frames and the maximum environment depth. The
+counting sites check a quasi-immutable flag, which traces fold to a constant: with counting disabled they cost nothing
+in JIT-compiled code and a single field read elsewhere. See profiler.allocation_report for the summary.
+"""
+
+PARSE = 0  # tokenizing and parsing, which the parser drives together
+OPTIMIZE = 1
+EVALUATE = 2
+PHASES = ['parse', 'optimize', 'evaluate']
+
+
+class AllocationStats:
+    _immutable_fields_ = ['enabled?']
+
+    def __init__(self):
+        self.enabled = False
+        self.phase = PARSE
+        self.counts = {}  # map of class names to the number of instances created in each phase
+        self.frames = 0  # live function frames
+        self.peak_frames = 0
+        self.max_depth = 0  # of the environment, in levels
+
+    def enable(self):
+        self.enabled = True
+
+    def allocated(self, name):
+        """Count an instance of class 'name'; callers check 'enabled' first, which is cheaper than a call"""
+        counts = self.counts.get(name, None)
+        if counts is None:
+            counts = [0] * len(PHASES)
+            self.counts[name] = counts
+        counts[self.phase] += 1
+
+    def enter_frame(self):
+        self.frames += 1
+        if self.frames > self.peak_frames:
+            self.peak_frames = self.frames
+
+    def exit_frame(self):
+        self.frames -= 1
+
+    def reached_depth(self, depth):
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+
+# the counters of this process
+stats = AllocationStats()
+
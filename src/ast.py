@@ -1,5 +1,8 @@
+from src.allocations import stats as allocations
+from src.counters import counters
 from src.environment import Environment
 from src.rpythonized_object import RPythonizedObject
+from src.visitor import to_string, tree_equals, tree_hash
 
 # Begin RPython setup; catch import errors so this can still run in CPython...
 try:
@@ -32,9 +35,23 @@ except ImportError:
     def we_are_jitted():
         return False
 
+try:
+    from rpython.rlib.objectmodel import compute_hash
+except ImportError:
+    compute_hash = hash
+
+try:
+    from rpython.rlib.jit import record_exact_class
+except ImportError:
+    def record_exact_class(value, cls):
+        pass
+
 
 def get_location(code):
-    return "%s" % code.to_string()
+    """Describe a green key concisely (e.g. 'queens.tig:18 For') for PYPYLOG; stringifying the whole subtree, as
+    to_string() would, is slow and unreadable for real programs"""
+    location = code.location.to_string() if code.location is not None else '<unknown>'
+    return "%s %s" % (location, code.__class__.__name__)
 
 
 jitdriver = JitDriver(greens=['code'], reds='auto', get_printable_location=get_location)
@@ -63,63 +80,39 @@ class InterpretationError(Exception):
 
 
 class Program(RPythonizedObject):
+    """A node of a parsed program. The fields holding a node's children are declared immutable so that traces, which
+    start from a constant node, constant-fold the tree; they are only written before evaluation starts (by the parser,
+    the optimization passes and the profiler)"""
+    location = None  # the source Location this node was parsed from, if any; set by the parser
+    share_table = None  # the sharing.NodeTable this node is canonical in, if any; shared nodes must not be modified
+    share_id = 0  # this node's id in its share_table
+    static_type = None  # the type_checker.TigerType of this expression, once the program has been type-checked
+    typed = False  # whether type_checker.specialize() proved this node's operands to be integers; see int_value()
+
     def evaluate(self, env=None):
         pass
         # TODO implement in sub-classes
 
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other)
-        # TODO implement in sub-classes
-
-
-def list_equals(list1, list2):
-    """Helper function for comparing two iterable sequences of expressions using .equals()"""
-    if len(list1) != len(list2):
-        return False
-    else:
-        for i in range(len(list1)):
-            if not list1[i].equals(list2[i]):
-                print("not equal: %s" % list1[i].to_string())
-                return False
-    return True
-
-
-def dict_equals(dict1, dict2):
-    """Helper function for comparing two iterable sequences of expressions using .equals()"""
-    if len(dict1) != len(dict2):
-        return False
-    else:
-        for i in dict1:
-            if not dict1[i].equals(dict2[i]):
-                return False
-    return True
-
-
-def nullable_equals(obj1, obj2):
-    if obj1 is None and obj2 is None:
-        return True
-    elif obj1 is not None and obj2 is not None:
-        return obj1.equals(obj2)
-    else:
-        return False
+    def evaluate_int(self, env=None, typed=False):
+        """Evaluate an expression known to produce an integer and return it unboxed, as a machine int; nodes computing
+        integers (literals, arithmetic, comparisons and ifs) override this so that an integer-valued sub-tree allocates
+        no IntegerValue, its value only being boxed where it is stored or passed (see BinaryOperation.evaluate). 'typed'
+        is the typed flag of the node using the integer: other nodes' values are narrowed by int_value()"""
+        return int_value(self.evaluate(env), typed).integer
 
+    def describe(self, out):
+        """Describe this node's text and children to a visitor.Description; printing, equality and hashing are built on
+        this (iteratively, see src/visitor.py) so sub-classes only implement describe()"""
+        out.text(self.__class__.__name__)
 
-def list_to_string(list):
-    stringified = []
-    for item in list:
-        stringified.append(item.to_string())
-    return '[%s]' % (', '.join(stringified))
-
-
-def dict_to_string(dict):
-    stringified = []
-    for key in dict:
-        stringified.append(key + '=' + dict[key].to_string())
-    return '{%s}' % (', '.join(stringified))
+    def to_string(self):
+        return to_string(self)
 
+    def equals(self, other):
+        return tree_equals(self, other)
 
-def nullable_to_string(obj):
-    return obj.to_string() if obj is not None else 'None'
+    def hash(self):
+        return tree_hash(self)
 
 
 class Exp(Program):
@@ -127,6 +120,8 @@ class Exp(Program):
 
 
 class Declaration(Program):
+    _immutable_fields_ = ['name']
+
     def __init__(self, name):
         self.name = name
 
@@ -140,7 +135,8 @@ class Type(Program):
 
 class Value(Exp):
     def __init__(self):
-        pass
+        if allocations.enabled:
+            allocations.allocated(self.__class__.__name__)
 
     def value(self):
         pass
@@ -159,11 +155,13 @@ class NilValue(Value):
     def value(self):
         return None
 
-    def to_string(self):
-        return '%s' % (self.__class__.__name__,)
+    def describe(self, out):
+        out.text(self.__class__.__name__)
 
 
 class IntegerValue(Value):
+    _immutable_fields_ = ['integer']
+
     def __init__(self, value):
         Value.__init__(self)
         assert isinstance(value, int)
@@ -172,147 +170,313 @@ class IntegerValue(Value):
     def value(self):
         return self.integer
 
+    def evaluate_int(self, env=None, typed=False):
+        return self.integer
+
     @staticmethod
     def from_string(number):
         assert isinstance(number, str)
         return IntegerValue(int(number))
 
-    def to_string(self):
-        return '%s(%d)' % (self.__class__.__name__, self.integer)
+    def describe(self, out):
+        out.text('%s(%d)' % (self.__class__.__name__, self.integer))
 
     def equals(self, other):
         return RPythonizedObject.equals(self, other) and self.integer == other.integer
 
 
 class StringValue(Value):
-    def __init__(self, value):
+    _immutable_fields_ = ['string', 'hash', 'table', 'id']
+
+    def __init__(self, value, table=None, id=0):
         Value.__init__(self)
         self.string = value
+        self.hash = compute_hash(value)
+        self.table = table  # the StringTable that interned this string, if any
+        self.id = id  # unique to each distinct string of that table
+
+    @staticmethod
+    def character(code):
+        """Return the shared single-character StringValue for a character code in [0, 256)"""
+        return characters.values[code]
 
     def value(self):
         return self.string
 
-    def to_string(self):
-        return '%s(%s)' % (self.__class__.__name__, self.string)
+    def describe(self, out):
+        out.text('%s(%s)' % (self.__class__.__name__, self.string))
 
     def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.string == other.string
+        if self is other:
+            return True
+        if not isinstance(other, StringValue):
+            return False
+        if self.table is not None and self.table is other.table:
+            return self.id == other.id
+        return self.hash == other.hash and self.string == other.string
+
+
+class StringTable:
+    """Interns the string literals of a program (each parser has its own table, see Parser.strings): every literal is a
+    node of its own, with its own location, but equal literals share their characters and an id, so that comparing them
+    takes a single integer comparison. The table lives as long as the program's literals do"""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []  # the distinct strings, by id
+
+    def intern(self, string):
+        id = self.ids.get(string, -1)
+        if id < 0:
+            id = len(self.strings)
+            self.ids[string] = id
+            self.strings.append(string)
+        return StringValue(self.strings[id], self, id)
+
+
+class CharacterTable:
+    """The shared single-character strings, e.g. for natives returning characters"""
+
+    def __init__(self):
+        table = StringTable()
+        self.values = [table.intern(chr(code)) for code in range(256)]
+
+
+characters = CharacterTable()
+
+
+class ArrayValue(Value):
+    def __init__(self, length, initial_value):
+        Value.__init__(self)
+        assert isinstance(length, int)
+        self.array = [initial_value] * length
+
+    def value(self):
+        return self.array
+
+    def describe(self, out):
+        out.text('%s(array=' % self.__class__.__name__)
+        out.children(self.array)
+        out.text(')')
+
+    def equals(self, other):
+        # Tiger arrays are compared by reference
+        return self is other
+
+    def get(self, index):
+        if index < 0 or index >= len(self.array):
+            raise InterpretationError('Array index %d out of bounds [0, %d)' % (index, len(self.array)))
+        return self.array[index]
+
+    def set(self, index, value):
+        if index < 0 or index >= len(self.array):
+            raise InterpretationError('Array index %d out of bounds [0, %d)' % (index, len(self.array)))
+        self.array[index] = value
+
+
+class RecordValue(Value):
+    def __init__(self, fields):
+        Value.__init__(self)
+        self.fields = fields
+
+    def value(self):
+        return self.fields
+
+    def describe(self, out):
+        out.text('%s(fields=' % self.__class__.__name__)
+        out.fields(self.fields)
+        out.text(')')
+
+    def equals(self, other):
+        # Tiger records are compared by reference
+        return self is other
+
+    def get(self, name):
+        if name not in self.fields:
+            raise InterpretationError('Unknown record field %s' % name)
+        return self.fields[name]
+
+    def set(self, name, value):
+        if name not in self.fields:
+            raise InterpretationError('Unknown record field %s' % name)
+        self.fields[name] = value
 
 
 class ArrayCreation(Exp):
+    _immutable_fields_ = ['type', 'inner', 'outer']
+
     def __init__(self, type, inner, outer):
         self.outer = outer
         self.inner = inner
         self.type = type
 
-    def to_string(self):
-        return '%s(outer=%s, inner=%s, type=%s)' % (
-            self.__class__.__name__, self.outer.to_string(), self.inner.to_string(), self.type.to_string())
+    def describe(self, out):
+        out.text('%s(outer=' % self.__class__.__name__)
+        out.child(self.outer)
+        out.text(', inner=')
+        out.child(self.inner)
+        out.text(', type=')
+        out.child(self.type)
+        out.text(')')
 
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.outer.equals(other.outer) and self.inner.equals(
-            other.inner) and self.type.equals(other.type)
+    def evaluate(self, env=None):
+        length = self.inner.evaluate_int(env)
+        initial_value = self.outer.evaluate(env)
+        env.limits.allocate(length)
+        return ArrayValue(length, initial_value)
 
 
 class RecordCreation(Exp):
+    _immutable_fields_ = ['type', 'fields']
+
     def __init__(self, type, fields):
         self.type = type
         self.fields = fields
 
-    def to_string(self):
-        return '%s(type=%s, fields=%s)' % (self.__class__.__name__, self.type.to_string(), dict_to_string(self.fields))
+    def describe(self, out):
+        out.text('%s(type=' % self.__class__.__name__)
+        out.child(self.type)
+        out.text(', fields=')
+        out.fields(self.fields)
+        out.text(')')
 
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.type.equals(other.type) and dict_equals(self.fields,
-                                                                                                      other.fields)
+    def evaluate(self, env=None):
+        fields = {}
+        for name in self.fields:
+            fields[name] = self.fields[name].evaluate(env)
+        env.limits.allocate(len(fields))
+        return RecordValue(fields)
 
 
 class ObjectCreation(Exp):
+    _immutable_fields_ = ['type']
+
     def __init__(self, type):
         self.type = type
 
-    def to_string(self):
-        return '%s(type=%s)' % (self.__class__.__name__, self.type.to_string())
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.type.equals(other.type)
+    def describe(self, out):
+        out.text('%s(type=' % self.__class__.__name__)
+        out.child(self.type)
+        out.text(')')
 
 
 class TypeId(Declaration):
     def __init__(self, name):
         Declaration.__init__(self, name)
 
-    def to_string(self):
-        return '%s(name=%s)' % (self.__class__.__name__, self.name)
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.name == other.name
+    def describe(self, out):
+        out.text('%s(name=%s)' % (self.__class__.__name__, self.name))
 
 
 class LValue(Exp):
+    _immutable_fields_ = ['name', 'next']
+    local = False  # whether type_checker.Specialization found this variable bound in the function reading it
+
     def __init__(self, name, next=None):
         self.name = name
         self.next = next
 
-    def to_string(self):
-        return '%s(name=%s, next=%s)' % (
-            self.__class__.__name__, self.name, nullable_to_string(self.next))
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.name == other.name \
-               and nullable_equals(self.next, other.next)
+    def describe(self, out):
+        out.text('%s(name=%s, next=' % (self.__class__.__name__, self.name))
+        out.child(self.next)
+        out.text(')')
 
     def evaluate(self, env=None):
         if not env:
             raise InterpretationError('No environment available at %s' % self.to_string())
-        return env.get(self.name)
-        # TODO handle self.next
+        value = env.get(self.name)
+        next = self.next
+        while next is not None:
+            value = next.get_from(value, env)
+            next = next.next
+        return value
+
+    def assign(self, value, env):
+        """Store 'value' at the location this lvalue names: a variable or, if 'next' is set, an array element or record
+        field"""
+        if self.next is None:
+            env.set(self.name, value)
+        else:
+            container = env.get(self.name)
+            next = self.next
+            while next.next is not None:
+                container = next.get_from(container, env)
+                next = next.next
+            next.set_in(container, value, env)
+
+    def get_from(self, container, env):
+        raise InterpretationError('Unable to index into %s' % container.to_string())
+
+    def set_in(self, container, value, env):
+        raise InterpretationError('Unable to index into %s' % container.to_string())
 
 
 class RecordLValue(LValue):
-    pass
+    def get_from(self, container, env):
+        if not isinstance(container, RecordValue):
+            raise InterpretationError('Expected a record when accessing field %s' % self.name)
+        return container.get(self.name)
+
+    def set_in(self, container, value, env):
+        if not isinstance(container, RecordValue):
+            raise InterpretationError('Expected a record when accessing field %s' % self.name)
+        container.set(self.name, value)
 
 
 class ArrayLValue(LValue):
+    _immutable_fields_ = ['exp']
+
     def __init__(self, exp, next=None):
         self.exp = exp
         self.next = next
 
-    def to_string(self):
-        return '%s(exp=%s, next=%s)' % (
-            self.__class__.__name__, self.exp.to_string(), nullable_to_string(self.next))
+    def describe(self, out):
+        out.text('%s(exp=' % self.__class__.__name__)
+        out.child(self.exp)
+        out.text(', next=')
+        out.child(self.next)
+        out.text(')')
 
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.exp.equals(other.exp) \
-               and nullable_equals(self.next, other.next)
+    def get_from(self, container, env):
+        index = self.exp.evaluate_int(env)
+        return self.array(container).get(index)
+
+    def set_in(self, container, value, env):
+        index = self.exp.evaluate_int(env)
+        self.array(container).set(index, value)
+
+    def get_at(self, container, index):
+        """Index into 'container' with the already evaluated 'index'"""
+        assert isinstance(index, IntegerValue)
+        return self.array(container).get(index.integer)
+
+    def set_at(self, container, index, value):
+        assert isinstance(index, IntegerValue)
+        self.array(container).set(index.integer, value)
+
+    def array(self, container):
+        if not isinstance(container, ArrayValue):
+            raise InterpretationError('Expected an array when indexing with %s' % self.exp.to_string())
+        return container
 
 
 class FunctionCall(Exp):
+    _immutable_fields_ = ['name', 'arguments[*]']
+
     def __init__(self, name, arguments):
         self.name = name
         assert (isinstance(arguments, list))
         self.arguments = arguments
 
-    def to_string(self):
-        return '%s(name=%s, args=%s)' % (self.__class__.__name__, self.name, list_to_string(self.arguments))
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.name == other.name \
-               and list_equals(self.arguments, other.arguments)
+    def describe(self, out):
+        out.text('%s(name=%s, args=' % (self.__class__.__name__, self.name))
+        out.children(self.arguments)
+        out.text(')')
 
     def evaluate(self, env=None):
-        # find declaration
-        declaration = env.get(self.name)
-        if not declaration:
-            raise InterpretationError('Could not find function %s' % self.name)
-
-        # check arguments
-        if len(self.arguments) != len(declaration.parameters):
-            raise InterpretationError('Incorrect number of arguments passed (%d); expected %d for function %s' % (
-                len(self.arguments), len(declaration.parameters), self.name))
+        declaration = self.enter(env)
 
         # evaluate arguments
-        env.push()
         value = None
         for i in range(len(self.arguments)):
             name = declaration.parameters[i].name
@@ -321,23 +485,54 @@ class FunctionCall(Exp):
             env.set(name, value)
 
         # evaluate body
-        result = None
         if isinstance(declaration, FunctionDeclaration):
-            result = declaration.body.evaluate(env)
+            result = declaration.parsed_body().evaluate(env)
             # TODO type-check result
-        elif isinstance(declaration, NativeFunctionDeclaration):
+        else:
+            result = self.call_native(declaration, value)
+
+        self.exit(env)
+        return result
+
+    def enter(self, env):
+        """Find and check the called function and push its frame; returns its declaration. The arguments are evaluated
+        and bound by the caller (evaluate() or the explicit-stack evaluator), which then calls exit()"""
+        declaration = env.get(self.name)
+        if not declaration:
+            raise InterpretationError('Could not find function %s' % self.name)
+
+        # check arguments
+        if len(self.arguments) != len(declaration.parameters):
+            raise InterpretationError('Incorrect number of arguments passed (%d); expected %d for function %s' % (
+                len(self.arguments), len(declaration.parameters), self.name))
+
+        env.limits.enter()
+        if counters.enabled:
+            counters.calls += 1
+        if allocations.enabled:
+            allocations.enter_frame()
+        env.push()
+        return declaration
+
+    def call_native(self, declaration, value):
+        """Call a native function with the value of its (single) argument"""
+        if isinstance(declaration, NativeFunctionDeclaration):
             # only one argument is allowed due to calling RPythonized functions with var-args
             if len(self.arguments) == 1:
                 result = declaration.function(value)
                 assert isinstance(result, Value) if result is not None else True
                 # TODO type-check result
+                return result
             else:
                 raise InterpretationError('Only one argument allowed in native functions: %s' % self.name)
         else:
             raise InterpretationError('Unknown function type: %s' % declaration.__class__.__name__)
 
+    def exit(self, env):
         env.pop()
-        return result
+        env.limits.exit()
+        if allocations.enabled:
+            allocations.exit_frame()
 
 
 class MethodCall(Exp):
@@ -347,114 +542,124 @@ class MethodCall(Exp):
         self.name = name
         self.args = args
 
-    def to_string(self):
-        return '%s(instance=%s, name=%s, args=%s)' % (
-            self.__class__.__name__, self.instance, self.name, list_to_string(self.args))
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.instance.equals(other.instance) and self.name.equals(
-            other.name) and list_equals(self.args, other.args)
+    def describe(self, out):
+        out.text('%s(instance=' % self.__class__.__name__)
+        out.child(self.instance)
+        out.text(', name=%s, args=' % self.name)
+        out.children(self.args)
+        out.text(')')
 
 
 class Assign(Exp):
+    _immutable_fields_ = ['lvalue', 'expression']
+
     def __init__(self, lvalue, expression):
         self.lvalue = lvalue
         self.expression = expression
 
-    def to_string(self):
-        return '%s(lvalue=%s, exp=%s)' % (self.__class__.__name__, self.lvalue.to_string(), self.expression.to_string())
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.lvalue.equals(other.lvalue) and self.expression.equals(
-            other.expression)
+    def describe(self, out):
+        out.text('%s(lvalue=' % self.__class__.__name__)
+        out.child(self.lvalue)
+        out.text(', exp=')
+        out.child(self.expression)
+        out.text(')')
 
     def evaluate(self, env=None):
-        # TODO handle other types of lvalues
         value = self.expression.evaluate(env)
-        env.set(self.lvalue.name, value)
+        self.lvalue.assign(value, env)
 
 
 class If(Exp):
+    _immutable_fields_ = ['condition', 'body_if_true', 'body_if_false', 'typed']
+
     def __init__(self, condition, body_if_true, body_if_false=None):
         self.condition = condition
         self.body_if_true = body_if_true
         self.body_if_false = body_if_false
 
-    def to_string(self):
-        return '%s(condition=%s, body_if_true=%s, body_if_false=%s)' % (
-            self.__class__.__name__, self.condition.to_string(), self.body_if_true.to_string(),
-            nullable_to_string(self.body_if_false))
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.condition.equals(other.condition) \
-               and self.body_if_true.equals(other.body_if_true) \
-               and nullable_equals(self.body_if_false, other.body_if_false)
+    def describe(self, out):
+        out.text('%s(condition=' % self.__class__.__name__)
+        out.child(self.condition)
+        out.text(', body_if_true=')
+        out.child(self.body_if_true)
+        out.text(', body_if_false=')
+        out.child(self.body_if_false)
+        out.text(')')
 
     def evaluate(self, env=None):
-        condition_value = self.condition.evaluate(env)
-        assert isinstance(condition_value, IntegerValue)
-        if condition_value.integer != 0:
+        if self.condition.evaluate_int(env, self.typed) != 0:
             result = self.body_if_true.evaluate(env)
         else:
             result = self.body_if_false.evaluate(env)
         return result
 
+    def evaluate_int(self, env=None, typed=False):
+        if self.condition.evaluate_int(env, self.typed) != 0:
+            return self.body_if_true.evaluate_int(env, typed)
+        else:
+            return self.body_if_false.evaluate_int(env, typed)
+
 
 class While(Exp):
+    _immutable_fields_ = ['condition', 'body', 'typed']
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
 
-    def to_string(self):
-        return '%s(condition=%s, body=%s)' % (
-            self.__class__.__name__, self.condition.to_string(), self.body.to_string())
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.condition.equals(other.condition) and self.body.equals(
-            other.body)
+    def describe(self, out):
+        out.text('%s(condition=' % self.__class__.__name__)
+        out.child(self.condition)
+        out.text(', body=')
+        out.child(self.body)
+        out.text(')')
 
     def evaluate(self, env=None):
-        condition_value = self.condition.evaluate(env)
-        assert isinstance(condition_value, IntegerValue)
         result = None
-        while condition_value.integer != 0:
+        while self.condition.evaluate_int(env, self.typed) != 0:
             result = self.body.evaluate(env)
             # TODO break
-            condition_value = self.condition.evaluate(env)
+            env.limits.step()
+            if counters.enabled:
+                counters.iterations += 1
             # TODO jitdriver.jit_merge_point(code=self)
         return result
 
 
 class For(Exp):
+    _immutable_fields_ = ['var', 'start', 'end', 'body']
+
     def __init__(self, var, start, end, body):
         self.var = var
         self.start = start
         self.end = end
         self.body = body
 
-    def to_string(self):
-        return '%s(var=%s, start=%s, end=%s, body=%s)' % (
-            self.__class__.__name__, self.var, self.start.to_string(), self.end.to_string(), self.body.to_string())
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.var == other.var and self.start.equals(
-            other.start) and self.end.equals(other.end) and self.body.equals(other.body)
+    def describe(self, out):
+        out.text('%s(var=%s, start=' % (self.__class__.__name__, self.var))
+        out.child(self.start)
+        out.text(', end=')
+        out.child(self.end)
+        out.text(', body=')
+        out.child(self.body)
+        out.text(')')
 
     def evaluate(self, env=None):
         # TODO remove env is None checks
         env.push()
-        start_value = self.start.evaluate(env)
-        assert isinstance(start_value, IntegerValue)
-        end_value = self.end.evaluate(env)
-        assert isinstance(end_value, IntegerValue)
-        iterator = start_value
-
-        for i in range(iterator.integer, end_value.integer + 1):
-            iterator.integer = i
-            env.set_current_level(self.var, iterator)
+        start = self.start.evaluate_int(env)
+        end = self.end.evaluate_int(env)
+
+        for i in range(start, end + 1):
+            # bind a new value each iteration: the start value may be a literal from the tree and the iterator may have
+            # been stored elsewhere by the body
+            env.set_current_level(self.var, IntegerValue(i))
             result = self.body.evaluate(env)
             # TODO break
             assert result is None
+            env.limits.step()
+            if counters.enabled:
+                counters.iterations += 1
             jitdriver.jit_merge_point(code=self)
 
         env.pop()
@@ -465,18 +670,18 @@ class Break(Exp):
 
 
 class Let(Exp):
+    _immutable_fields_ = ['declarations[*]', 'expressions[*]']
+
     def __init__(self, declarations, expressions):
         self.declarations = declarations
         self.expressions = expressions
 
-    def to_string(self):
-        return '%s(declarations=%s, expressions=%s)' % (
-            self.__class__.__name__, list_to_string(self.declarations), list_to_string(self.expressions))
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) \
-               and list_equals(self.declarations, other.declarations) \
-               and list_equals(self.expressions, other.expressions)
+    def describe(self, out):
+        out.text('%s(declarations=' % self.__class__.__name__)
+        out.children(self.declarations)
+        out.text(', expressions=')
+        out.children(self.expressions)
+        out.text(')')
 
     def evaluate(self, env=None):
         if not isinstance(env, Environment):
@@ -497,30 +702,32 @@ class Let(Exp):
 
 
 class TypeDeclaration(Declaration):
+    _immutable_fields_ = ['type']
+
     def __init__(self, name, type):
         Declaration.__init__(self, name)
         self.type = type
 
-    def to_string(self):
-        return '%s(name=%s, type=%s)' % (self.__class__.__name__, self.name, self.type.to_string())
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.name == other.name and self.type.equals(other.type)
+    def describe(self, out):
+        out.text('%s(name=%s, type=' % (self.__class__.__name__, self.name))
+        out.child(self.type)
+        out.text(')')
 
 
 class VariableDeclaration(Declaration):
+    _immutable_fields_ = ['type', 'exp']
+
     def __init__(self, name, type, exp):
         Declaration.__init__(self, name)
         self.type = type
         self.exp = exp
 
-    def to_string(self):
-        return '%s(name=%s, type=%s, exp=%s)' % (
-            self.__class__.__name__, self.name, nullable_to_string(self.type), self.exp.to_string())
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.name == other.name \
-               and nullable_equals(self.type, other.type) and self.exp.equals(other.exp)
+    def describe(self, out):
+        out.text('%s(name=%s, type=' % (self.__class__.__name__, self.name))
+        out.child(self.type)
+        out.text(', exp=')
+        out.child(self.exp)
+        out.text(')')
 
     def evaluate(self, env=None):
         value = self.exp.evaluate(env)
@@ -529,42 +736,60 @@ class VariableDeclaration(Declaration):
 
 
 class FunctionParameter(Declaration):
+    _immutable_fields_ = ['type']
+
     def __init__(self, name, type=None):
         self.name = name
         assert isinstance(type, TypeId) or type is None
         self.type = type
 
-    def to_string(self):
-        return '%s(name=%s, type=%s)' % (self.__class__.__name__, self.name, nullable_to_string(self.type))
+    def describe(self, out):
+        out.text('%s(name=%s, type=' % (self.__class__.__name__, self.name))
+        out.child(self.type)
+        out.text(')')
 
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.name == other.name \
-               and nullable_equals(self.type, other.type)
+
+class DeferredBody:
+    """The source of a function body whose parsing was skipped (see Parser's 'lazy'); parse() builds it"""
+
+    def parse(self):
+        raise NotImplementedError
 
 
 class FunctionDeclaration(Declaration):
-    def __init__(self, name, parameters, return_type, body):
+    # the body of a lazily parsed function is written once, on its first call
+    _immutable_fields_ = ['parameters[*]', 'return_type', 'body?', 'deferred?']
+
+    def __init__(self, name, parameters, return_type, body, deferred=None):
         Declaration.__init__(self, name)
         assert isinstance(parameters, list)
         self.parameters = parameters
         assert isinstance(return_type, TypeId) or return_type is None
         self.return_type = return_type
-        assert isinstance(body, Exp)
+        assert isinstance(body, Exp) or (body is None and deferred is not None)
         self.body = body
+        self.deferred = deferred  # a DeferredBody, while 'body' is not parsed yet
 
-    def to_string(self):
-        return '%s(name=%s, parameters=%s, return_type=%s, body=%s)' % (
-            self.__class__.__name__, self.name, list_to_string(self.parameters), nullable_to_string(self.return_type),
-            self.body.to_string())
+    def parsed_body(self):
+        """The body, parsed now if its parsing was deferred; parse errors in it surface here, on the first call"""
+        if self.deferred is not None:
+            self.body = self.deferred.parse()
+            self.deferred = None
+        return self.body
 
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.name == other.name \
-               and list_equals(self.parameters, other.parameters) \
-               and nullable_equals(self.return_type, other.return_type) \
-               and self.body.equals(other.body)
+    def describe(self, out):
+        out.text('%s(name=%s, parameters=' % (self.__class__.__name__, self.name))
+        out.children(self.parameters)
+        out.text(', return_type=')
+        out.child(self.return_type)
+        out.text(', body=')
+        out.child(self.body)
+        out.text(')')
 
 
 class NativeFunctionDeclaration(Declaration):
+    _immutable_fields_ = ['parameters[*]', 'return_type', 'function']
+
     def __init__(self, name, parameters=[], return_type=None, function=None):
         Declaration.__init__(self, name)
         assert isinstance(parameters, list)
@@ -573,48 +798,46 @@ class NativeFunctionDeclaration(Declaration):
         self.return_type = return_type
         self.function = function
 
-    def to_string(self):
-        return '%s(name=%s, parameters=%s, return_type=%s)' % (
-            self.__class__.__name__, self.name, list_to_string(self.parameters), nullable_to_string(self.return_type))
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.name == other.name \
-               and list_equals(self.parameters, other.parameters) \
-               and nullable_equals(self.return_type, other.return_type) \
-               and nullable_equals(self.function, other.function)
+    def describe(self, out):
+        out.text('%s(name=%s, parameters=' % (self.__class__.__name__, self.name))
+        out.children(self.parameters)
+        out.text(', return_type=')
+        out.child(self.return_type)
+        out.text(')')
 
 
 class ArrayType(Type):
+    _immutable_fields_ = ['type_name']
+
     def __init__(self, element_type):
         self.type_name = element_type
 
-    def to_string(self):
-        return '%s(type_name=%s)' % (self.__class__.__name__, self.type_name)
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.type_name == other.type_name
+    def describe(self, out):
+        out.text('%s(type_name=%s)' % (self.__class__.__name__, self.type_name))
 
 
 class RecordType(Type):
+    _immutable_fields_ = ['type_fields']
+
     def __init__(self, type_fields):
         self.type_fields = type_fields
 
-    def to_string(self):
-        return '%s(type_fields=%s)' % (self.__class__.__name__, dict_to_string(self.type_fields))
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and dict_equals(self.type_fields, other.type_fields)
+    def describe(self, out):
+        out.text('%s(type_fields=' % self.__class__.__name__)
+        out.fields(self.type_fields)
+        out.text(')')
 
 
 class Sequence(Exp):
+    _immutable_fields_ = ['expressions[*]']
+
     def __init__(self, expressions):
         self.expressions = expressions
 
-    def to_string(self):
-        return '%s(expressions=%s)' % (self.__class__.__name__, list_to_string(self.expressions))
-
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and list_equals(self.expressions, other.expressions)
+    def describe(self, out):
+        out.text('%s(expressions=' % self.__class__.__name__)
+        out.children(self.expressions)
+        out.text(')')
 
     def evaluate(self, env=None):
         value = None
@@ -624,100 +847,134 @@ class Sequence(Exp):
 
 
 class BinaryOperation(Exp):
+    _immutable_fields_ = ['left', 'right', 'typed']
+
     def __init__(self, left, right):
         self.left = left
         self.right = right
 
-    def equals(self, other):
-        return RPythonizedObject.equals(self, other) and self.left.equals(other.left) and self.right.equals(other.right)
+    def describe(self, out):
+        out.text('%s(left=' % self.__class__.__name__)
+        out.child(self.left)
+        out.text(', right=')
+        out.child(self.right)
+        out.text(')')
 
-    def to_string(self):
-        return '%s(left=%s, right=%s)' % (self.__class__.__name__, self.left.to_string(), self.right.to_string())
+    def evaluate(self, env=None):
+        return IntegerValue(self.evaluate_int(env))
+
+    def evaluate_int(self, env=None, typed=False):
+        return self.compute(self.left.evaluate_int(env, self.typed), self.right.evaluate_int(env, self.typed))
+
+    def apply(self, left, right):
+        """Combine the already evaluated values of both sides (see stack_evaluator.py)"""
+        return IntegerValue(self.compute(int_value(left, self.typed).integer, int_value(right, self.typed).integer))
+
+    def compute(self, left, right):
+        """Combine the integers of both sides; sub-classes implement the operator"""
+        raise NotImplementedError
 
-    # TODO inline
-    def evaluate_sides_to_value(self, env):
-        left_value = self.left.evaluate(env)
-        assert isinstance(left_value, Value)
-        right_value = self.right.evaluate(env)
-        assert isinstance(right_value, Value)
-        return left_value, right_value
 
-    # TODO inline
-    def evaluate_sides_to_int(self, env):
-        left_value = self.left.evaluate(env)
-        assert isinstance(left_value, IntegerValue)
-        right_value = self.right.evaluate(env)
-        assert isinstance(right_value, IntegerValue)
-        return left_value.integer, right_value.integer
+def int_value(value, typed):
+    """Narrow an evaluated value to an IntegerValue. Nodes of a type-checked program (see type_checker.specialize) know
+    this statically: recording the class lets the JIT drop its class guards rather than check on every evaluation"""
+    if typed:
+        record_exact_class(value, IntegerValue)
+    assert isinstance(value, IntegerValue)
+    return value
 
 
 class Multiply(BinaryOperation):
-    def evaluate(self, env=None):
-        (left_int, right_int) = self.evaluate_sides_to_int(env)
-        return IntegerValue(left_int * right_int)
+    def compute(self, left, right):
+        return left * right
 
 
 class Divide(BinaryOperation):
-    def evaluate(self, env=None):
-        (left_int, right_int) = self.evaluate_sides_to_int(env)
-        return IntegerValue(left_int // right_int)
+    def compute(self, left, right):
+        return left // right
 
 
 class Add(BinaryOperation):
-    def evaluate(self, env=None):
-        (left_int, right_int) = self.evaluate_sides_to_int(env)
-        return IntegerValue(left_int + right_int)
+    def compute(self, left, right):
+        return left + right
 
 
 class Subtract(BinaryOperation):
-    def evaluate(self, env=None):
-        (left_int, right_int) = self.evaluate_sides_to_int(env)
-        return IntegerValue(left_int - right_int)
+    def compute(self, left, right):
+        return left - right
 
 
 class GreaterThanOrEquals(BinaryOperation):
-    def evaluate(self, env=None):
-        (left_int, right_int) = self.evaluate_sides_to_int(env)
-        return IntegerValue(1) if left_int >= right_int else IntegerValue(0)
+    def compute(self, left, right):
+        return 1 if left >= right else 0
 
 
 class LessThanOrEquals(BinaryOperation):
-    def evaluate(self, env=None):
-        (left_int, right_int) = self.evaluate_sides_to_int(env)
-        return IntegerValue(1) if left_int <= right_int else IntegerValue(0)
+    def compute(self, left, right):
+        return 1 if left <= right else 0
 
 
-class Equals(BinaryOperation):
-    def evaluate(self, env=None):
-        (left, right) = self.evaluate_sides_to_value(env)
-        return IntegerValue(1) if left.equals(right) else IntegerValue(0)
+class Equality(BinaryOperation):
+    """Compares any values: only operands known to be integers (see type_checker.specialize) are compared unboxed"""
+    negated = False
 
+    def evaluate_int(self, env=None, typed=False):
+        if self.typed:
+            return self.compute(self.left.evaluate_int(env, True), self.right.evaluate_int(env, True))
+        return self.compare(self.left.evaluate(env), self.right.evaluate(env))
 
-class NotEquals(BinaryOperation):
-    def evaluate(self, env=None):
-        (left, right) = self.evaluate_sides_to_value(env)
-        return IntegerValue(1) if not left.equals(right) else IntegerValue(0)
+    def apply(self, left, right):
+        if self.typed:
+            return BinaryOperation.apply(self, left, right)
+        return IntegerValue(self.compare(left, right))
+
+    def compute(self, left, right):
+        return 1 if (left == right) != self.negated else 0
+
+    def compare(self, left, right):
+        assert isinstance(left, Value)
+        assert isinstance(right, Value)
+        return 1 if left.equals(right) != self.negated else 0
+
+
+class Equals(Equality):
+    pass
+
+
+class NotEquals(Equality):
+    negated = True
 
 
 class GreaterThan(BinaryOperation):
-    def evaluate(self, env=None):
-        (left_int, right_int) = self.evaluate_sides_to_int(env)
-        return IntegerValue(1) if left_int > right_int else IntegerValue(0)
+    def compute(self, left, right):
+        return 1 if left > right else 0
 
 
 class LessThan(BinaryOperation):
-    def evaluate(self, env=None):
-        (left_int, right_int) = self.evaluate_sides_to_int(env)
-        return IntegerValue(1) if left_int < right_int else IntegerValue(0)
+    def compute(self, left, right):
+        return 1 if left < right else 0
 
 
 class And(BinaryOperation):
-    def evaluate(self, env=None):
-        (left_int, right_int) = self.evaluate_sides_to_int(env)
-        return IntegerValue(1) if left_int and right_int else IntegerValue(0)
+    """Short-circuits: the right side is only evaluated if the left one is true (non-zero). In a condition, a chain of
+    ands and ors is evaluated by evaluate_int alone, so that no intermediate value is boxed"""
+
+    def evaluate_int(self, env=None, typed=False):
+        if self.left.evaluate_int(env, self.typed) == 0:
+            return 0
+        return 1 if self.right.evaluate_int(env, self.typed) != 0 else 0
+
+    def compute(self, left, right):
+        return 1 if left and right else 0
 
 
 class Or(BinaryOperation):
-    def evaluate(self, env=None):
-        (left_int, right_int) = self.evaluate_sides_to_int(env)
-        return IntegerValue(1) if left_int or right_int else IntegerValue(0)
+    """Short-circuits: the right side is only evaluated if the left one is false (zero)"""
+
+    def evaluate_int(self, env=None, typed=False):
+        if self.left.evaluate_int(env, self.typed) != 0:
+            return 1
+        return 1 if self.right.evaluate_int(env, self.typed) != 0 else 0
+
+    def compute(self, left, right):
+        return 1 if left or right else 0
@@ -0,0 +1,271 @@
+"""
+Tokenizing a large text in chunks, on forked workers (tiger-interpreter --tokenize-jobs N). A pre-scan splits the text
+at newlines outside of strings and comments, skipping both by the tokenizer's own rules (its escapes and its nested
+comments, see Tokenizer.__string and __comment), and counts the lines before each split. No token spans such a newline,
+so tokenizing each chunk on its own (see Tokenizer.seek) and concatenating the tokens gives exactly the tokens of
+Tokenizer.all(), locations included.
+
+Like --jobs (see src/main/jobs.py), the workers are forked processes since RPython cannot translate threads that run
+in parallel; each sends its tokens back encoded on a pipe while this process tokenizes the first chunk. A chunk that
+fails to tokenize is tokenized again here, so that the error raised is the one a sequential tokenizer raises.
+"""
+import os
+
+from src.tokenizer import Tokenizer, Location
+from src.tokens import NumberToken, IdentifierToken, KeywordToken, SymbolToken, StringToken
+
+# smaller texts are not worth forking for
+MINIMUM_CHUNK_SIZE = 64 * 1024
+READ_SIZE = 64 * 1024
+
+# the encoded form of a failed chunk; encoded tokens start with a line number (see encode)
+FAILED = '!'
+
+
+class Chunk:
+    """The text between 'start' and 'end', which the tokenizer reaches at 'line' and 'line_offset'"""
+
+    def __init__(self, start, end, line, line_offset):
+        self.start = start
+        self.end = end
+        self.line = line
+        self.line_offset = line_offset
+
+
+def split(text, count):
+    """Split 'text' in at most 'count' chunks of similar sizes; a string or comment that is not terminated ends the
+    splitting, leaving the rest of the text to the last chunk"""
+    length = len(text)
+    chunks = []
+    start = 0
+    line = 1
+    line_offset = 0
+    position = 0  # the text before 'position' has been scanned and 'position' is outside of strings and comments
+    lines = 1  # the line at 'position'
+    target = length // count  # the next split is at the first newline from here
+    quote = -1  # the next '"' and '/*' from 'position', found again once passed
+    comment = -1
+    while len(chunks) < count - 1:
+        if quote < position:
+            quote = find(text, '"', position)
+        if comment < position:
+            comment = find(text, '/*', position)
+        special = min(quote, comment)
+        newline = -1
+        if special > target:
+            newline = text.find('\n', max(position, target), special)
+        if newline >= 0 and newline + 1 < length:
+            lines += count_lines(text, position, newline + 1)
+            position = newline + 1
+            chunks.append(Chunk(start, position, line, line_offset))
+            # a tokenizer having read a newline is at offset 0 of the next line, then advances past the newline
+            start, line, line_offset = position, lines, 1
+            target = position + (length - position) // (count - len(chunks))
+            continue
+        lines += count_lines(text, position, special)
+        if special >= length:
+            break
+        if text[special] == '"':
+            position = skip_string(text, special)
+        else:
+            position = skip_comment(text, special)
+        if position < 0:
+            break
+    chunks.append(Chunk(start, length, line, line_offset))
+    return chunks
+
+
+def find(text, match, position):
+    """The offset of the next 'match' from 'position', or the length of the text"""
+    offset = text.find(match, position)
+    return offset if offset >= 0 else len(text)
+
+
+def count_lines(text, start, end):
+    """The newlines the tokenizer counts between 'start' and 'end' (see Tokenizer.is_eol)"""
+    return text.count('\n', start, end) + text.count('\r', start, end)
+
+
+def skip_string(text, start):
+    """The offset after the string starting at 'start' (as Tokenizer.__string leaves it), or -1 if it does not end; a
+    numeric escape also consumes the character after its digits"""
+    length = len(text)
+    offset = start
+    while True:
+        offset += 1
+        if offset >= length:
+            return -1
+        c = text[offset]
+        if c == '\\':
+            offset += 1
+            if offset >= length:
+                return -1
+            d = text[offset]
+            if d == 'x' or Tokenizer.is_number(d):
+                while offset + 1 < length and Tokenizer.is_number(text[offset + 1]):
+                    offset += 1
+                offset += 1
+        elif c == '"':
+            return offset + 1
+
+
+def skip_comment(text, start):
+    """The offset after the comment starting at 'start' (as Tokenizer.__comment leaves it), or -1 if it does not end"""
+    length = len(text)
+    offset = start + 1
+    level = 1
+    while level:
+        offset = text.find('/', offset + 1)
+        if offset < 0:
+            return -1
+        if text[offset - 1] == '*':
+            level -= 1
+        elif offset + 1 < length and text[offset + 1] == '*':
+            level += 1
+    return offset + 1
+
+
+def tokenize_chunk(text, chunk, file):
+    tokenizer = Tokenizer(text, file)
+    tokenizer.seek(chunk.start, chunk.end, chunk.line, chunk.line_offset)
+    return tokenizer.all()
+
+
+def tokenize_in_chunks(text, file=None, jobs=1):
+    """Return all of the tokens in the text, as Tokenizer.all() does, tokenizing its chunks on up to 'jobs' processes"""
+    count = min(jobs, len(text) // MINIMUM_CHUNK_SIZE)
+    if count < 2:
+        return Tokenizer(text, file).all()
+    chunks = split(text, count)
+    workers = []  # tokenizing chunks[1:], in order
+    collected = 0  # the workers read so far
+    try:
+        try:
+            for chunk in chunks[1:]:
+                workers.append(fork_worker(text, chunk, file))
+        except OSError:
+            pass  # tokenize the chunks left without a worker here
+        tokens = tokenize_chunk(text, chunks[0], file)
+        for index in range(1, len(chunks)):
+            data = FAILED
+            if index <= len(workers):
+                collected = index
+                data = read_worker(workers[index - 1])
+            if data == FAILED:
+                tokens.extend(tokenize_chunk(text, chunks[index], file))  # raises its error, if it had a worker
+            else:
+                decode(data, file, tokens)
+    finally:
+        # on an error, the workers not read yet are still running or waiting to be collected
+        for worker in workers[collected:]:
+            read_worker(worker)
+    return tokens
+
+
+class Worker:
+    def __init__(self, pid, output_fd):
+        self.pid = pid
+        self.output_fd = output_fd
+
+
+def fork_worker(text, chunk, file):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            try:
+                data = encode(tokenize_chunk(text, chunk, file))
+            except Exception:
+                data = FAILED
+            write_all(write_fd, data)
+        finally:
+            os._exit(0)  # never return into the parent's code
+    os.close(write_fd)
+    return Worker(pid, read_fd)
+
+
+def read_worker(worker):
+    """Read all that a worker sent, then collect it"""
+    parts = []
+    data = os.read(worker.output_fd, READ_SIZE)
+    while len(data) > 0:
+        parts.append(data if str is bytes else data.decode('latin-1'))  # str under Python 3 too, as in util.read_file
+        data = os.read(worker.output_fd, READ_SIZE)
+    os.close(worker.output_fd)
+    os.waitpid(worker.pid, 0)
+    result = ''.join(parts)
+    return result if len(result) > 0 else FAILED  # e.g. a worker killed before writing
+
+
+def write_all(fd, data):
+    if str is not bytes:
+        data = data.encode('latin-1')
+    while len(data) > 0:
+        written = os.write(fd, data)
+        data = data[written:]
+
+
+def kind_of(token):
+    if isinstance(token, NumberToken):
+        return 'N'
+    elif isinstance(token, IdentifierToken):
+        return 'I'
+    elif isinstance(token, KeywordToken):
+        return 'K'
+    elif isinstance(token, SymbolToken):
+        return 'S'
+    else:
+        assert isinstance(token, StringToken)
+        return 'T'
+
+
+def encode(tokens):
+    """Encode tokens, without their file, in three columns: the line of the first token followed by the offset and
+    length of each token, as comma-separated numbers; then, after a ':', the kind of each token (see kind_of), with a
+    newline before the kinds of each next line; then, after another ':', all of their values. Decoding then converts the
+    numbers with one split rather than finding each token's fields, in the process that has to wait for it"""
+    line = tokens[0].location.line if len(tokens) > 0 else 1
+    numbers = [str(line)]
+    kinds = []
+    values = []
+    for token in tokens:
+        location = token.location
+        if location.line > line:
+            kinds.append('\n' * (location.line - line))
+            line = location.line
+        kinds.append(kind_of(token))
+        numbers.append('%d,%d' % (location.offset, len(token.value)))
+        values.append(token.value)
+    return '%s:%s:%s' % (','.join(numbers), ''.join(kinds), ''.join(values))
+
+
+def decode(data, file, tokens):
+    """Append the tokens encoded in 'data' to 'tokens', located in 'file'"""
+    colon = data.find(':')
+    assert colon >= 0
+    second_colon = data.find(':', colon + 1)
+    assert second_colon >= 0
+    numbers = [int(number) for number in data[:colon].split(',')]
+    line = numbers[0]
+    index = 1  # of the offset of the next token in 'numbers'
+    position = second_colon + 1  # of the value of the next token
+    for kind in data[colon + 1:second_colon]:
+        if kind == '\n':
+            line += 1
+            continue
+        location = Location(numbers[index], line, file)
+        end = position + numbers[index + 1]
+        index += 2
+        value = data[position:end]
+        position = end
+        if kind == 'S':
+            tokens.append(SymbolToken(value, location))
+        elif kind == 'I':
+            tokens.append(IdentifierToken(value, location))
+        elif kind == 'K':
+            tokens.append(KeywordToken(value, location))
+        elif kind == 'N':
+            tokens.append(NumberToken(value, location))
+        else:
+            tokens.append(StringToken(value, location))
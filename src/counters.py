@@ -0,0 +1,21 @@
+"""
+Opt-in counters of the work done while evaluating (tiger-interpreter --stats): function calls and loop iterations. Like
+allocations.AllocationStats, the counting sites check a quasi-immutable flag, so they cost nothing in JIT-compiled code
+when counting is disabled. See main/stats.py for the report.
+"""
+
+
+class RunCounters:
+    _immutable_fields_ = ['enabled?']
+
+    def __init__(self):
+        self.enabled = False
+        self.calls = 0  # of Tiger and native functions
+        self.iterations = 0  # of while and for loop bodies
+
+    def enable(self):
+        self.enabled = True
+
+
+# the counters of this process
+counters = RunCounters()
@@ -1,33 +1,158 @@
+from src.allocations import stats as allocations
+
+try:
+    from rpython.rlib.jit import elidable, promote
+except ImportError:
+    def elidable(func):
+        return func
+
+
+    def promote(x):
+        return x
+
 VARIABLE = 0
 FUNCTION = 1
 TYPE = 2
 
 
+# limits are counted down from this when unlimited; a program cannot run 2^62 steps
+UNLIMITED = 1 << 62
+
+
+class LimitExceeded(Exception):
+    def __init__(self, reason):
+        self.reason = reason
+
+    def to_string(self):
+        return self.reason
+
+    def __str__(self):
+        return self.to_string()
+
+
+class Limits:
+    """
+    Bounds the execution of a program, for running untrusted code: steps (loop iterations and function calls), the depth
+    of nested function calls and the number of array elements and record fields allocated. A maximum of 0 is unlimited.
+    Each check is a decrement and a comparison of a field, cheap enough to stay inlined in JIT traces without adding
+    calls or merge points; use fresh() to get new counters for each run.
+    """
+    _immutable_fields_ = ['max_steps', 'max_depth', 'max_heap']
+
+    def __init__(self, max_steps=0, max_depth=0, max_heap=0):
+        self.max_steps = max_steps
+        self.max_depth = max_depth
+        self.max_heap = max_heap
+        self.steps = max_steps if max_steps > 0 else UNLIMITED  # remaining
+        self.depth = max_depth if max_depth > 0 else UNLIMITED  # remaining
+        self.heap = max_heap if max_heap > 0 else UNLIMITED  # remaining
+
+    def fresh(self):
+        return Limits(self.max_steps, self.max_depth, self.max_heap)
+
+    def step(self):
+        """Count a loop iteration"""
+        self.steps -= 1
+        if self.steps < 0:
+            raise LimitExceeded('Exceeded the limit of %d steps' % self.max_steps)
+
+    def enter(self):
+        """Count a function call"""
+        self.step()
+        self.depth -= 1
+        if self.depth < 0:
+            raise LimitExceeded('Exceeded the maximum call depth of %d' % self.max_depth)
+
+    def exit(self):
+        self.depth += 1
+
+    def allocate(self, size):
+        """Count the elements of a new array or the fields of a new record"""
+        self.heap -= size
+        if self.heap < 0:
+            raise LimitExceeded('Exceeded the limit of %d allocated elements' % self.max_heap)
+
+
+class Shape:
+    """
+    The names bound in an EnvironmentLevel, mapped to the slots holding their values. Shapes are immutable and shared: a
+    level binding a new name moves to the shape with that name added (see with_name), so levels binding the same names in
+    the same order--e.g. every call of a function--have the same shape.
+    """
+    _immutable_fields_ = ['slots', 'size']
+
+    def __init__(self, slots, size):
+        self.slots = slots  # map of names to slots
+        self.size = size
+        self.transitions = {}  # map of names to the shapes adding them; only a cache
+
+    @elidable
+    def find(self, name):
+        """The slot of 'name', or -1 if it is not bound"""
+        return self.slots.get(name, -1)
+
+    @elidable
+    def with_name(self, name):
+        shape = self.transitions.get(name, None)
+        if shape is None:
+            slots = {}
+            for bound in self.slots:
+                slots[bound] = self.slots[bound]
+            slots[name] = self.size
+            shape = Shape(slots, self.size + 1)
+            self.transitions[name] = shape
+        return shape
+
+
+EMPTY_SHAPE = Shape({}, 0)
+
+
 class EnvironmentLevel:
     def __init__(self):
-        self.bindings = {}  # map of names to indices
-        self.expressions = []  # indexed expressions
+        if allocations.enabled:
+            allocations.allocated(self.__class__.__name__)
+        self.shape = EMPTY_SHAPE
+        self.values = []  # indexed by the slots of the shape
+
+    def add(self, name, value):
+        self.shape = self.shape.with_name(name)
+        self.values.append(value)
+
+    def names(self):
+        names = [''] * self.shape.size
+        for name in self.shape.slots:
+            names[self.shape.slots[name]] = name
+        return names
 
 
 class Environment:
     """
     Holds a stack of EnvironmentLevels and a level index to the current one; push() and pop() modify this stack and index.
-    Each level contains a dictionary of names to expression index (diff. from level index) and a list of indexed expressions.
-    To find a name (see __locate__), inspect each dictionary at each level until the name is found and return the level and its expression index
+    Each level has a Shape mapping names to slots and a list of values in those slots. To find a name (see __locate__),
+    look it up in the promoted shape of the current level, which folds to a constant in JIT traces; scoping is dynamic, so
+    a name bound elsewhere may be any number of calls away. Rather than looking into each level, the environment keeps,
+    for each name, the indexes of the levels binding it (innermost last), which levels update as they bind names and are
+    popped; the name's slot is looked up in the promoted shape of the innermost of these levels
     """
 
-    def __init__(self):
+    def __init__(self, limits=None):
         self.level = 0
         self.stack = [EnvironmentLevel()]
+        self.bound = {}  # map of names to the indexes of the levels binding them, innermost last
+        self.limits = limits if limits is not None else Limits()
 
     def push(self):
         """Create a new environment level (i.e. frame)"""
         self.stack.append(EnvironmentLevel())
         self.level += 1
+        if allocations.enabled:
+            allocations.reached_depth(self.level)
 
     def pop(self):
         """Remove and forget the topmost environment level (i.e. frame)"""
-        self.stack.pop()
+        level = self.stack.pop()
+        for name in level.shape.slots:
+            self.bound[name].pop()
         self.level -= 1
         assert self.level >= 0
 
@@ -37,57 +162,72 @@ class Environment:
         level, index = self.__locate__(name)
         if not level:
             # location not found, add it to the current level
-            level = self.stack[self.level]
-            index = len(level.expressions)
-            level.bindings[name] = index
-            level.expressions.append(expression)
+            self.add(name, expression)
         else:
             # location found, modify it
-            level.expressions[index] = expression
+            level.values[index] = expression
 
     def set_current_level(self, name, expression):
         """Set 'name' to 'expression' only in the current level; if it exists, modify it; otherwise, add it"""
         level = self.stack[self.level]
-        if name in level.bindings:
+        index = promote(level.shape).find(name)
+        if index >= 0:
             # if it exists in the current level, overwrite it
-            index = level.bindings[name]
-            level.expressions[index] = expression
+            level.values[index] = expression
         else:
             # if not, add it
-            index = len(level.expressions)
-            level.bindings[name] = index
-            level.expressions.append(expression)
+            self.add(name, expression)
+
+    def add(self, name, expression):
+        """Bind 'name', which is not bound in the current level, to 'expression' there"""
+        self.stack[self.level].add(name, expression)
+        levels = self.bound.get(name, None)
+        if levels is None:
+            levels = []
+            self.bound[name] = levels
+        levels.append(self.level)
 
     def get(self, name):
-        """Retrieve 'name' from the environment stack by searching through all levels"""
+        """Retrieve 'name' from the innermost level binding it"""
         level, index = self.__locate__(name)
         if not level or index < 0:
             return None  # TODO throw?
         else:
-            return level.expressions[index]
+            return level.values[index]
 
     def unset(self, name):
-        """Unset 'name' only in the current level; will not search through the entire environment"""
+        """Unset 'name' only in the current level; will not search through the entire environment. Shapes only grow, so
+        the level is rebuilt without the name; returns the name's slot, or None if it was not bound"""
         level = self.stack[self.level]
-        return level.bindings.pop(name, None)
+        index = level.shape.find(name)
+        if index < 0:
+            return None
+        self.bound[name].pop()
+        names = level.names()
+        values = level.values
+        level.shape = EMPTY_SHAPE
+        level.values = []
+        for slot in range(len(names)):
+            if slot != index:
+                level.add(names[slot], values[slot])
+        return index
 
     def size(self):
         """Non-optimized onvenience method; count the number of unique names in the entire environment"""
         names = {}
         for level in self.stack:
-            for name in level.bindings:
+            for name in level.shape.slots:
                 names[name] = 1
         return len(names)
 
-    # TODO make elidable only if we can guarantee that push/pop have not changed
     def __locate__(self, name):
-        expression_index = -1
-        level_index = self.level
-        level = None
-        while expression_index < 0 <= level_index:
-            level = self.stack[level_index]
-            if name in level.bindings:
-                expression_index = level.bindings[name]
-            else:
-                level_index -= 1
-        return level if level_index >= 0 else None, expression_index
+        """Find the innermost level binding 'name' and its slot there, or None and -1 if no level binds it"""
+        level = self.stack[self.level]
+        index = promote(level.shape).find(name)
+        if index >= 0:
+            return level, index
+        levels = self.bound.get(name, None)
+        if levels is None or len(levels) == 0:
+            return None, -1
+        level = self.stack[levels[-1]]
+        return level, promote(level.shape).find(name)
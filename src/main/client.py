@@ -0,0 +1,90 @@
+"""
+Clients of tiger-interpreter --serve: Client talks to a running server over its Unix socket while LocalClient runs
+requests in this process, with the same Worker a server would use, so that tests need neither sockets nor processes.
+"""
+from src.main.protocol import FrameReader, ProtocolError, encode_frame, decode_exit, RUN, FILE, STOP, OUT, EXIT
+from src.main.server import Worker, READ_SIZE
+from src.main.sockets import connect_unix
+from src.main.util import Stream
+
+
+class Reply:
+    def __init__(self, code, output, message):
+        self.code = code
+        self.output = output
+        self.message = message
+
+
+class Client:
+    def __init__(self, path):
+        self.socket = connect_unix(path)
+        self.reader = FrameReader()
+        self.next_id = 0
+
+    def run(self, source, stream=None):
+        """Run Tiger source on the server; output is passed to 'stream' (if any) as it arrives and also returned in the
+        Reply"""
+        return self.request(RUN, source, stream)
+
+    def run_file(self, path, stream=None):
+        """Run a Tiger file, read by the server"""
+        return self.request(FILE, path, stream)
+
+    def stop(self):
+        self.socket.sendall(encode_frame(STOP, 0, ''))
+
+    def close(self):
+        self.socket.close()
+
+    def request(self, kind, payload, stream):
+        id = self.next_id
+        self.next_id += 1
+        self.socket.sendall(encode_frame(kind, id, payload))
+        output = []
+        while True:
+            frame = self.reader.next()
+            if frame is None:
+                data = self.socket.recv(READ_SIZE)
+                if len(data) == 0:
+                    raise ProtocolError('Server closed the connection')
+                self.reader.feed(data)
+            elif frame.id != id:
+                raise ProtocolError('Expected a reply to request %d but found %d' % (id, frame.id))
+            elif frame.kind == OUT:
+                output.append(frame.payload)
+                if stream is not None:
+                    stream.write(frame.payload)
+            elif frame.kind == EXIT:
+                code, message = decode_exit(frame.payload)
+                return Reply(code, ''.join(output), message)
+            else:
+                raise ProtocolError('Unexpected %s frame' % frame.kind)
+
+
+class CollectingStream(Stream):
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = []
+
+    def write(self, string):
+        self.buffer.append(string)
+        if self.stream is not None:
+            self.stream.write(string)
+
+
+class LocalClient:
+    """A stand-in for Client that runs requests in this process"""
+
+    def __init__(self, cache_size=16, limits=None):
+        self.worker = Worker(cache_size, limits)
+
+    def run(self, source, stream=None):
+        return self.request(RUN, source, stream)
+
+    def run_file(self, path, stream=None):
+        return self.request(FILE, path, stream)
+
+    def request(self, kind, payload, stream):
+        collecting = CollectingStream(stream)
+        code, message = self.worker.execute(kind, payload, collecting)
+        return Reply(code, ''.join(collecting.buffer), message)
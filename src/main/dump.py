@@ -0,0 +1,36 @@
+"""
+Serialization of parsed trees for tiger-parser. The text form is the one printed by Program.to_string(); the JSON form
+keeps the same information but is structured: each node is an object with its class name, the texts of its description
+and its children, so that interleaving the texts and the (printed) children gives back the text form.
+"""
+from src.main.util import quote_json
+from src.visitor import Piece, describe, write_tree
+
+
+def write_json(root, out):
+    """Write a tree as JSON piece by piece to 'out', iteratively (see visitor.write_tree)"""
+    stack = [Piece(None, root)]
+    while len(stack) > 0:
+        piece = stack.pop()
+        if piece.node is None:
+            out.write(piece.text)
+            continue
+        node = piece.node
+        description = describe(node)
+        texts = [quote_json(text) for text in description.texts]
+        out.write('{"node": %s, "texts": [%s], "children": [' % (quote_json(node.__class__.__name__),
+                                                                 ', '.join(texts)))
+        stack.append(Piece(']}', None))
+        for index in range(len(description.nodes) - 1, -1, -1):
+            stack.append(Piece(None, description.nodes[index]))
+            if index > 0:
+                stack.append(Piece(', ', None))
+
+
+def write_program(program, as_json, out):
+    """Write a program and a final newline in either form"""
+    if as_json:
+        write_json(program, out)
+    else:
+        write_tree(program, out)
+    out.write('\n')
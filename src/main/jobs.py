@@ -0,0 +1,99 @@
+"""
+tiger-interpreter --jobs N a.tig b.tig ...: run programs on a pool of N forked workers, the same workers that serve
+requests for --serve (see src/main/server.py). multiprocessing cannot be translated by RPython, so CPython forks too.
+Each program's output is printed whole and in the order the programs were given, as soon as it and every program before
+it have finished; a summary of results and of each worker's time follows on stderr.
+"""
+import time
+
+from src.main.protocol import Frame, decode_exit, FILE, OUT
+from src.main.runner import RunResult, SUCCESS, RUNTIME_ERROR, status_of
+from src.main.server import WorkerPool, write_all
+from src.main.sockets import poll_readable
+from src.main.util import STDOUT_FD, STDERR_FD
+
+
+class Job:
+    def __init__(self, file):
+        self.file = file
+        self.output = []
+        self.result = None  # the RunResult, once finished
+        self.started = 0.0
+
+
+class ParallelRun(WorkerPool):
+    def __init__(self, files, jobs, batch, limits=None, cache_size=16, output_fd=STDOUT_FD, summary_fd=STDERR_FD):
+        WorkerPool.__init__(self, min(jobs, max(len(files), 1)), cache_size, limits)
+        self.output_fd = output_fd  # where the programs' output (or JSON lines) is printed
+        self.summary_fd = summary_fd
+        self.jobs = [Job(file) for file in files]
+        self.batch = batch  # print a JSON line per program (as --batch does) rather than its output
+        self.next = 0  # the next job to hand to a worker
+        self.printed = 0  # the number of jobs printed so far
+        self.finished = 0
+
+    def run(self):
+        """Run every program and return the exit code of the first one to fail, if any"""
+        start = time.time()
+        self.start_workers()
+        self.assign()
+        while self.finished < len(self.jobs):
+            self.read_workers(poll_readable(self.worker_fds(), -1))
+            self.assign()
+        elapsed = time.time() - start
+        write_all(self.summary_fd, self.summary(elapsed))
+        self.stop_workers()
+        for job in self.jobs:
+            if job.result.code != SUCCESS:
+                return job.result.code
+        return SUCCESS
+
+    def assign(self):
+        """Hand the next programs to idle workers; one at a time, so that slow programs do not hold up the rest"""
+        for worker in self.workers:
+            if worker.current is None and len(worker.queue) == 0 and self.next < len(self.jobs):
+                job = self.jobs[self.next]
+                job.started = time.time()
+                worker.submit(Frame(FILE, self.next, job.file))
+                self.next += 1
+
+    def received(self, frame):
+        job = self.jobs[frame.id]
+        if frame.kind == OUT:
+            job.output.append(frame.payload)
+        else:
+            code, message = decode_exit(frame.payload)
+            self.complete(job, code, message)
+
+    def lost(self, frame, message):
+        self.complete(self.jobs[frame.id], RUNTIME_ERROR, message)
+
+    def complete(self, job, code, message):
+        job.result = RunResult(job.file, status_of(code), code, ''.join(job.output), time.time() - job.started,
+                               message if message else None)
+        self.finished += 1
+        while self.printed < len(self.jobs) and self.jobs[self.printed].result is not None:
+            self.emit(self.jobs[self.printed].result)
+            self.printed += 1
+
+    def emit(self, result):
+        if self.batch:
+            write_all(self.output_fd, result.to_json() + '\n')
+        elif len(result.output) > 0:
+            write_all(self.output_fd, result.output)
+
+    def summary(self, elapsed):
+        failed = 0
+        lines = []
+        for job in self.jobs:
+            result = job.result
+            if result.code != SUCCESS:
+                failed += 1
+                message = result.message if result.message is not None else ''
+                lines.append('failed: %s: %s (exit code %d) %s' % (job.file, result.status, result.code, message))
+        lines.insert(0, '%d programs: %d ok, %d failed in %d us with %d workers' % (
+            len(self.jobs), len(self.jobs) - failed, failed, int(elapsed * 1000000), len(self.workers)))
+        for index in range(len(self.workers)):
+            worker = self.workers[index]
+            lines.append('worker %d: %d programs in %d us' % (index + 1, worker.completed, int(worker.busy * 1000000)))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,172 @@
+from src.main.runner import read_manifest
+
+
+class OptionError(Exception):
+    def __init__(self, reason):
+        self.reason = reason
+
+    def to_string(self):
+        return self.reason
+
+    def __str__(self):
+        return self.to_string()
+
+
+class Options:
+    """Holds the command-line options of tiger-interpreter; kept as a plain class (rather than argparse) so that it can
+    be translated by RPython"""
+
+    def __init__(self):
+        self.files = []
+        self.repeat = 1
+        self.report_iterations = False
+        self.profile = False
+        self.profile_collapsed = None
+        self.batch = False
+        self.jobs = 0
+        self.serve = None
+        self.allow_stop = False
+        self.workers = 2
+        self.cache_size = 64
+        self.max_steps = 0
+        self.max_depth = 0
+        self.max_heap = 0
+        self.explicit_stack = False
+        self.max_stack = 0
+        self.share_nodes = False
+        self.lazy_bodies = False
+        self.tokenize_jobs = 1
+        self.optimize = False
+        self.type_check = False
+        self.alloc_stats = False
+        self.stats = None  # 'text' or 'json'
+        self.report_passes = False
+
+
+def parse_options(argv):
+    """Parse the arguments (skipping the program name in argv[0]) into Options; options taking a value accept both
+    '--name=value' and '--name value'"""
+    options = Options()
+    index = 1
+    while index < len(argv):
+        argument = argv[index]
+        index += 1
+
+        if not argument.startswith('--'):
+            options.files.append(argument)
+            continue
+
+        name = argument
+        value = None
+        split = argument.find('=')
+        if split >= 0:
+            name = argument[:split]
+            value = argument[split + 1:]
+
+        if name == '--repeat':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.repeat = parse_positive_int(name, value)
+            options.report_iterations = True
+        elif name == '--batch':
+            options.batch = True
+        elif name == '--manifest':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.batch = True
+            try:
+                options.files.extend(read_manifest(value))
+            except OSError:
+                raise OptionError('Unable to read manifest %s' % value)
+        elif name == '--jobs':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.jobs = parse_positive_int(name, value)
+        elif name == '--serve':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.serve = value
+        elif name == '--allow-stop':
+            options.allow_stop = True
+        elif name == '--workers':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.workers = parse_positive_int(name, value)
+        elif name == '--cache-size':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.cache_size = parse_positive_int(name, value)
+        elif name == '--max-steps':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.max_steps = parse_positive_int(name, value)
+        elif name == '--max-depth':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.max_depth = parse_positive_int(name, value)
+        elif name == '--max-heap':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.max_heap = parse_positive_int(name, value)
+        elif name == '--explicit-stack':
+            options.explicit_stack = True
+        elif name == '--max-stack':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.explicit_stack = True
+            options.max_stack = parse_positive_int(name, value)
+        elif name == '--share-nodes':
+            options.share_nodes = True
+        elif name == '--lazy-bodies':
+            options.lazy_bodies = True
+        elif name == '--eager-bodies':
+            # the default: parse (and so validate) every function body up front, even if --lazy-bodies came earlier
+            options.lazy_bodies = False
+        elif name == '--tokenize-jobs':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.tokenize_jobs = parse_positive_int(name, value)
+        elif name == '--optimize':
+            options.optimize = True
+        elif name == '--type-check':
+            options.type_check = True
+        elif name == '--report-passes':
+            options.optimize = True
+            options.report_passes = True
+        elif name == '--stats':
+            # the format is optional, so '--stats' alone never consumes the next argument
+            if value is None:
+                value = 'text'
+            if value != 'text' and value != 'json':
+                raise OptionError('Expected text or json for option %s but found %s' % (name, value))
+            options.stats = value
+        elif name == '--alloc-stats':
+            options.alloc_stats = True
+        elif name == '--profile':
+            options.profile = True
+        elif name == '--profile-collapsed':
+            if value is None:
+                value, index = next_value(argv, index, name)
+            options.profile = True
+            options.profile_collapsed = value
+        else:
+            raise OptionError('Unknown option %s' % name)
+
+    return options
+
+
+def next_value(argv, index, name):
+    """Consume the argument after an option that expects a value"""
+    if index >= len(argv):
+        raise OptionError('Expected a value for option %s' % name)
+    return argv[index], index + 1
+
+
+def parse_positive_int(name, value):
+    try:
+        number = int(value)
+    except ValueError:
+        raise OptionError('Expected an integer value for option %s but found %s' % (name, value))
+    if number < 1:
+        raise OptionError('Expected a positive value for option %s but found %d' % (name, number))
+    return number
@@ -0,0 +1,89 @@
+"""
+The framing used between tiger-interpreter --serve, its workers and its clients. Every message is a frame:
+
+    <kind> <id> <length>\\n<payload of length bytes>
+
+Clients send RUN (payload: Tiger source), FILE (payload: path to a Tiger file) or STOP (shut the server down; only
+accepted from servers started with --allow-stop, others answer with an EXIT frame), each with an id of their choosing. For every RUN or FILE the server answers with any number of OUT frames (the program's output,
+as it is printed) followed by one EXIT frame (payload: the exit code, optionally followed by a space and a message),
+all carrying the id of the request.
+"""
+
+RUN = 'RUN'
+FILE = 'FILE'
+STOP = 'STOP'
+OUT = 'OUT'
+EXIT = 'EXIT'
+
+
+class ProtocolError(Exception):
+    def __init__(self, reason):
+        self.reason = reason
+
+    def to_string(self):
+        return self.reason
+
+    def __str__(self):
+        return self.to_string()
+
+
+class Frame:
+    def __init__(self, kind, id, payload):
+        self.kind = kind
+        self.id = id
+        self.payload = payload
+
+
+def encode_frame(kind, id, payload):
+    return '%s %d %d\n%s' % (kind, id, len(payload), payload)
+
+
+def encode_exit(id, code, message):
+    payload = str(code)
+    if message:
+        payload += ' ' + message
+    return encode_frame(EXIT, id, payload)
+
+
+def decode_exit(payload):
+    """Split the payload of an EXIT frame into its exit code and message"""
+    split = payload.find(' ')
+    if split < 0:
+        return parse_int(payload), ''
+    return parse_int(payload[:split]), payload[split + 1:]
+
+
+def parse_int(string):
+    try:
+        return int(string)
+    except ValueError:
+        raise ProtocolError('Expected an integer but found %s' % string)
+
+
+class FrameReader:
+    """Splits the data received on a connection into frames"""
+
+    def __init__(self):
+        self.buffer = ''
+
+    def feed(self, data):
+        self.buffer += data
+
+    def next(self):
+        """Return the next complete frame, or None if more data is needed"""
+        newline = self.buffer.find('\n')
+        if newline < 0:
+            return None
+        header = self.buffer[:newline].split(' ')
+        if len(header) != 3:
+            raise ProtocolError('Malformed frame header: %s' % self.buffer[:newline])
+        id = parse_int(header[1])
+        length = parse_int(header[2])
+        if length < 0:
+            raise ProtocolError('Negative frame length %d' % length)
+        end = newline + 1 + length
+        if len(self.buffer) < end:
+            return None
+        payload = self.buffer[newline + 1:end]
+        self.buffer = self.buffer[end:]
+        return Frame(header[0], id, payload)
@@ -0,0 +1,101 @@
+import os
+import time
+
+from src.ast import InterpretationError
+from src.environment import LimitExceeded
+from src.main.util import read_file, create_environment_with_natives, output, quote_json
+from src.modules import loader
+from src.parser import Parser, ParseError
+from src.tokenizer import TokenError
+
+# exit codes shared by the entry points
+SUCCESS = 0
+USAGE_ERROR = 40
+PARSE_ERROR = 42
+RUNTIME_ERROR = 43
+READ_ERROR = 44
+LIMIT_EXCEEDED = 45
+TYPE_ERROR = 46
+
+STATUSES = {SUCCESS: 'ok', READ_ERROR: 'read-error', PARSE_ERROR: 'parse-error', RUNTIME_ERROR: 'runtime-error',
+            LIMIT_EXCEEDED: 'limit-exceeded', TYPE_ERROR: 'type-error'}
+
+
+def status_of(code):
+    return STATUSES.get(code, 'error')
+
+
+class RunResult:
+    """The outcome of running one Tiger program with its output captured"""
+
+    def __init__(self, file, status, code, output, elapsed, message=None):
+        self.file = file
+        self.status = status  # see STATUSES
+        self.code = code  # the exit code tiger-interpreter would have returned for this program alone
+        self.output = output
+        self.elapsed = elapsed  # in seconds, including reading and parsing
+        self.message = message
+
+    def to_json(self):
+        return '{"file": %s, "status": %s, "exit_code": %d, "time_us": %d, "message": %s, "output": %s}' % (
+            quote_json(self.file), quote_json(self.status), self.code, int(self.elapsed * 1000000),
+            quote_json(self.message) if self.message is not None else 'null', quote_json(self.output))
+
+
+def run_file(file, limits=None):
+    """Read, parse and evaluate a Tiger file in a fresh environment, capturing everything it prints; 'limits', if any,
+    bound its execution"""
+    start = time.time()
+    try:
+        source = read_file(file)
+    except OSError:
+        return RunResult(file, 'read-error', READ_ERROR, '', time.time() - start, 'Unable to read %s' % file)
+    return run_source(source, file, start, limits)
+
+
+def run_source(source, file, start, limits=None):
+    """Parse and evaluate Tiger source in a fresh environment, capturing everything it prints; 'start' is the time to
+    measure from"""
+    try:
+        program = Parser(source, file, loader=loader).parse()
+    except ParseError as e:
+        return RunResult(file, 'parse-error', PARSE_ERROR, '', time.time() - start, e.to_string())
+    except TokenError as e:
+        return RunResult(file, 'parse-error', PARSE_ERROR, '', time.time() - start, e.reason)
+    return run_program(program, file, start, limits)
+
+
+def run_program(program, file, start, limits=None):
+    """Evaluate a parsed program in a fresh environment, capturing everything it prints"""
+    output.capture()
+    status = 'ok'
+    code = SUCCESS
+    message = None
+    try:
+        result = program.evaluate(create_environment_with_natives(limits.fresh() if limits is not None else None))
+        if result:
+            output.write(result.to_string() + '\n')
+    except LimitExceeded as e:
+        status, code, message = 'limit-exceeded', LIMIT_EXCEEDED, e.to_string()
+    except InterpretationError as e:
+        status, code, message = 'runtime-error', RUNTIME_ERROR, e.to_string()
+    except Exception as e:
+        # isolate the remaining programs from failures of the interpreter itself
+        status, code, message = 'runtime-error', RUNTIME_ERROR, 'Internal error: %s' % e.__class__.__name__
+    captured = output.release()
+    return RunResult(file, status, code, captured, time.time() - start, message)
+
+
+def read_manifest(file):
+    """List the programs named in a manifest: one path per line, ignoring blank lines and lines starting with '#';
+    relative paths are resolved against the manifest's directory"""
+    directory = os.path.dirname(file)
+    files = []
+    for line in read_file(file).split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if not line.startswith('/') and directory:
+            line = directory + '/' + line
+        files.append(line)
+    return files
@@ -0,0 +1,526 @@
+"""
+tiger-interpreter --serve PATH: a long-running interpreter listening on a Unix socket (see src/main/protocol.py for the
+protocol). A single poll()-based event loop accepts clients and reads their requests; requests run in a pool of forked
+worker processes, each keeping an LRU cache of parsed programs and a warmed-up JIT. Requests are routed to workers by a
+hash of their content so that repeated programs hit the same worker's cache; output is streamed back as it is printed.
+"""
+import os
+import signal
+import time
+
+from src.ast import InterpretationError
+from src.main.protocol import Frame, FrameReader, ProtocolError, encode_frame, encode_exit, RUN, FILE, STOP, OUT, \
+    EXIT
+from src.environment import Limits, LimitExceeded
+from src.main.runner import SUCCESS, USAGE_ERROR, PARSE_ERROR, RUNTIME_ERROR, READ_ERROR, LIMIT_EXCEEDED
+from src.main.sockets import listen_unix, accept, poll_ready, set_nonblocking, send_some, SocketError
+from src.main.util import read_file, create_environment_with_natives, output, Stream, STDERR_FD
+from src.modules import loader
+from src.parser import Parser, ParseError
+from src.tokenizer import TokenError
+
+# bytes of output a worker collects before sending them as an OUT frame
+FLUSH_SIZE = 4096
+READ_SIZE = 65536
+BACKLOG = 64
+# bytes queued for a client that does not read its replies, after which it is disconnected
+MAX_QUEUED = 16 * 1024 * 1024
+
+
+class CacheEntry:
+    def __init__(self, key, program, modules):
+        self.key = key
+        self.program = program
+        self.modules = modules  # the modules the program imports
+        self.newer = None
+        self.older = None
+
+
+class ProgramCache:
+    """
+    A least-recently-used cache of parsed programs keyed by their source: the dictionary hashes the content and compares
+    it in full on lookup, so two different programs never share an entry. Entries form a doubly-linked list from the
+    most to the least recently used, which is evicted once the cache holds more than 'capacity' programs. A program is
+    only reused while the modules it imports are unchanged (see ModuleLoader.are_current). Imports are resolved relative
+    to the importing file, so a program that imports anything is keyed by its file as well as its source.
+    """
+
+    def __init__(self, capacity, loader=None):
+        self.capacity = capacity
+        self.loader = loader
+        self.entries = {}
+        self.newest = None
+        self.oldest = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source, file=None):
+        key = source
+        entry = self.entries.get(key, None)
+        if entry is None and file is not None:
+            key = file_key(source, file)
+            entry = self.entries.get(key, None)
+        if entry is not None and self.loader is not None and not self.loader.are_current(entry.modules):
+            self.unlink(entry)
+            del self.entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.unlink(entry)
+        self.push(entry)
+        return entry.program
+
+    def put(self, source, program, modules=None, file=None):
+        modules = modules if modules is not None else []
+        key = file_key(source, file) if len(modules) > 0 and file is not None else source
+        entry = self.entries.get(key, None)
+        if entry is not None:
+            self.unlink(entry)
+        entry = CacheEntry(key, program, modules)
+        self.entries[key] = entry
+        self.push(entry)
+        while len(self.entries) > self.capacity and self.oldest is not None:
+            evicted = self.oldest
+            self.unlink(evicted)
+            del self.entries[evicted.key]
+
+    def push(self, entry):
+        entry.older = self.newest
+        entry.newer = None
+        if self.newest is not None:
+            self.newest.newer = entry
+        self.newest = entry
+        if self.oldest is None:
+            self.oldest = entry
+
+    def unlink(self, entry):
+        if entry.newer is not None:
+            entry.newer.older = entry.older
+        else:
+            self.newest = entry.older
+        if entry.older is not None:
+            entry.older.newer = entry.newer
+        else:
+            self.oldest = entry.newer
+        entry.newer = None
+        entry.older = None
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def file_key(source, file):
+    """The cache key of a program importing modules; a file name cannot contain a NUL byte"""
+    return file + '\0' + source
+
+
+class Worker:
+    """Runs requests, one at a time, against its own cache of parsed programs; each run gets fresh 'limits'"""
+
+    def __init__(self, cache_size, limits=None):
+        self.cache = ProgramCache(cache_size, loader)
+        self.limits = limits if limits is not None else Limits()
+
+    def execute(self, kind, payload, stream):
+        """Run a RUN (payload: source) or FILE (payload: path) request, writing its output to 'stream'; returns the
+        exit code and an error message (empty on success)"""
+        if kind == FILE:
+            file = payload
+            try:
+                source = read_file(file)
+            except OSError:
+                return READ_ERROR, 'Unable to read %s' % file
+        elif kind == RUN:
+            file = '<request>'
+            source = payload
+        else:
+            return USAGE_ERROR, 'Unknown request %s' % kind
+
+        program = self.cache.get(source, file)
+        if program is None:
+            parser = Parser(source, file, loader=loader)
+            try:
+                program = parser.parse()
+            except ParseError as e:
+                return PARSE_ERROR, e.to_string()
+            except TokenError as e:
+                return PARSE_ERROR, e.reason
+            self.cache.put(source, program, parser.modules, file)
+
+        code = SUCCESS
+        message = ''
+        output.redirect(stream)
+        try:
+            result = program.evaluate(create_environment_with_natives(self.limits.fresh()))
+            if result:
+                output.write(result.to_string() + '\n')
+        except LimitExceeded as e:
+            code, message = LIMIT_EXCEEDED, e.to_string()
+        except InterpretationError as e:
+            code, message = RUNTIME_ERROR, e.to_string()
+        except Exception as e:
+            code, message = RUNTIME_ERROR, 'Internal error: %s' % e.__class__.__name__
+        output.redirect(None)
+        stream.flush()
+        return code, message
+
+
+class FrameStream(Stream):
+    """Sends a program's output to the server as OUT frames, a few kilobytes at a time"""
+
+    def __init__(self, fd, id):
+        self.fd = fd
+        self.id = id
+        self.buffer = []
+        self.size = 0
+
+    def write(self, string):
+        self.buffer.append(string)
+        self.size += len(string)
+        if self.size >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.size > 0:
+            write_all(self.fd, encode_frame(OUT, self.id, ''.join(self.buffer)))
+        self.buffer = []
+        self.size = 0
+
+
+def write_all(fd, data):
+    if str is not bytes:
+        data = data.encode('latin-1')  # frames are str under Python 3 too, as in sockets.Socket
+    while len(data) > 0:
+        written = os.write(fd, data)
+        data = data[written:]
+
+
+def read_some(fd):
+    data = os.read(fd, READ_SIZE)
+    return data if str is bytes else data.decode('latin-1')
+
+
+def run_worker(input_fd, output_fd, cache_size, limits):
+    """The body of a worker process: run the requests read from 'input_fd' until the server closes it"""
+    worker = Worker(cache_size, limits)
+    reader = FrameReader()
+    while True:
+        data = read_some(input_fd)
+        if len(data) == 0:
+            return
+        reader.feed(data)
+        frame = reader.next()
+        while frame is not None:
+            code, message = worker.execute(frame.kind, frame.payload, FrameStream(output_fd, frame.id))
+            write_all(output_fd, encode_exit(frame.id, code, message))
+            frame = reader.next()
+
+
+def content_hash(string):
+    """FNV-1a; unlike hash() it is the same in every process and run"""
+    hash = 2166136261
+    for c in string:
+        hash = ((hash ^ ord(c)) * 16777619) & 0xffffffff
+    return hash
+
+
+class WorkerProcess:
+    """The parent's side of a worker: a queue of requests, sent one at a time so that writing to the worker never
+    blocks the parent"""
+
+    def __init__(self, pid, input_fd, output_fd):
+        self.pid = pid
+        self.input_fd = input_fd  # the parent writes requests here
+        self.output_fd = output_fd  # and reads OUT and EXIT frames from here
+        self.reader = FrameReader()
+        self.queue = []
+        self.current = None  # the request being run, if any
+        self.started = 0.0
+        self.completed = 0  # number of requests run
+        self.busy = 0.0  # seconds spent running them
+
+    def submit(self, frame):
+        self.queue.append(frame)
+        self.dispatch()
+
+    def dispatch(self):
+        if self.current is None and len(self.queue) > 0:
+            self.current = self.queue.pop(0)
+            self.started = time.time()
+            write_all(self.input_fd, encode_frame(self.current.kind, self.current.id, self.current.payload))
+
+    def finish(self):
+        self.current = None
+        self.completed += 1
+        self.busy += time.time() - self.started
+        self.dispatch()
+
+
+class WorkerPool:
+    """
+    Forked worker processes (see run_worker) and the bookkeeping shared by the server and by --jobs; sub-classes decide
+    what to do with the frames the workers send back. A worker that dies is replaced, failing only the request it was
+    running.
+    """
+
+    def __init__(self, count, cache_size, limits):
+        self.count = count
+        self.cache_size = cache_size
+        self.limits = limits
+        self.workers = []
+
+    def start_workers(self):
+        for index in range(self.count):
+            self.workers.append(self.spawn())
+
+    def spawn(self):
+        requests_read, requests_write = os.pipe()
+        results_read, results_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.close_inherited()
+                os.close(requests_write)
+                os.close(results_read)
+                run_worker(requests_read, results_write, self.cache_size, self.limits)
+            finally:
+                os._exit(0)  # never return into the parent's code
+        os.close(requests_read)
+        os.close(results_write)
+        return WorkerProcess(pid, requests_write, results_read)
+
+    def close_inherited(self):
+        """Called in a new worker to close the parent's file descriptors: the worker only needs its own two pipes"""
+        for worker in self.workers:
+            os.close(worker.input_fd)
+            os.close(worker.output_fd)
+
+    def worker_fds(self):
+        return [worker.output_fd for worker in self.workers]
+
+    def read_workers(self, fds):
+        for fd in fds:
+            for index in range(len(self.workers)):
+                if self.workers[index].output_fd == fd:
+                    self.read_worker(index)
+
+    def read_worker(self, index):
+        worker = self.workers[index]
+        data = read_some(worker.output_fd)
+        if len(data) == 0:
+            self.replace_worker(index)
+            return
+        worker.reader.feed(data)
+        frame = worker.reader.next()
+        while frame is not None:
+            self.received(frame)
+            if frame.kind == EXIT:
+                worker.finish()
+            frame = worker.reader.next()
+
+    def received(self, frame):
+        """Handle an OUT or EXIT frame sent by a worker"""
+        raise NotImplementedError
+
+    def lost(self, frame, message):
+        """Handle a request whose worker died while running it"""
+        raise NotImplementedError
+
+    def replace_worker(self, index):
+        worker = self.workers[index]
+        os.close(worker.input_fd)
+        os.close(worker.output_fd)
+        os.waitpid(worker.pid, 0)
+        del self.workers[index]  # its fds are closed and may be reused by the replacement's pipes
+        replacement = self.spawn()
+        replacement.completed = worker.completed
+        replacement.busy = worker.busy
+        self.workers.insert(index, replacement)
+        if worker.current is not None:
+            replacement.completed += 1
+            replacement.busy += time.time() - worker.started
+            self.lost(worker.current, 'Worker %d exited' % worker.pid)
+        for frame in worker.queue:
+            replacement.submit(frame)
+
+    def stop_workers(self):
+        for worker in self.workers:
+            if worker.current is not None:
+                os.kill(worker.pid, signal.SIGKILL)  # nobody is left to read its output
+            os.close(worker.input_fd)  # an idle worker exits once it reads the end of its requests
+            os.waitpid(worker.pid, 0)
+            os.close(worker.output_fd)
+        self.workers = []
+
+
+class Connection:
+    """A client's socket, which never blocks the server: what it does not take at once is queued and sent by flush()
+    once poll reports the socket writable"""
+
+    def __init__(self, socket):
+        self.socket = socket
+        set_nonblocking(socket)
+        self.reader = FrameReader()
+        self.queue = []  # data not sent yet, oldest first
+        self.queued = 0  # bytes in the queue
+        self.closed = False
+
+    def send(self, data):
+        if self.closed:
+            return
+        self.queue.append(data)
+        self.queued += len(data)
+        if self.queued > MAX_QUEUED:
+            self.close()  # the client stopped reading
+        else:
+            self.flush()
+
+    def flush(self):
+        while len(self.queue) > 0 and not self.closed:
+            data = self.queue[0]
+            try:
+                sent = send_some(self.socket, data)
+            except SocketError:
+                self.close()
+                return
+            self.queued -= sent
+            if sent < len(data):
+                self.queue[0] = data[sent:]
+                return
+            self.queue.pop(0)
+
+    def is_writing(self):
+        return len(self.queue) > 0 and not self.closed
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.socket.close()
+
+
+class Pending:
+    """A request forwarded to a worker: where to send its results and the id the client gave it"""
+
+    def __init__(self, connection, id):
+        self.connection = connection
+        self.id = id
+
+
+class Server(WorkerPool):
+    """Any client able to connect to the socket can run programs, so the socket's permissions decide who is trusted; a
+    client can only shut the server down with STOP if it was started with 'allow_stop' (--allow-stop)"""
+
+    def __init__(self, path, workers, cache_size, limits=None, allow_stop=False):
+        WorkerPool.__init__(self, workers, cache_size, limits)
+        self.path = path
+        self.allow_stop = allow_stop
+        self.listener = None
+        self.connections = {}  # map of socket fds to Connections
+        self.pending = {}  # map of request ids (as sent to workers) to Pending
+        self.next_id = 0
+        self.running = False
+
+    def run(self):
+        """Serve requests until a client sends STOP (if allowed); returns the exit code"""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        try:
+            self.listener = listen_unix(self.path, BACKLOG)
+        except SocketError:
+            write_all(STDERR_FD, 'Unable to listen on %s\n' % self.path)
+            return USAGE_ERROR
+        self.start_workers()
+        write_all(STDERR_FD, 'Listening on %s with %d workers\n' % (self.path, self.count))
+        self.running = True
+        while self.running:
+            self.poll()
+        self.shutdown()
+        return SUCCESS
+
+    def close_inherited(self):
+        # closing the sockets too lets clients see their connections close when the server does
+        WorkerPool.close_inherited(self)
+        self.listener.close()
+        for fd in self.connections:
+            self.connections[fd].socket.close()
+
+    def poll(self):
+        for fd in self.connections.keys():
+            if self.connections[fd].closed:
+                del self.connections[fd]  # e.g. after failing to send; its fd may be reused by the next accept
+        readable = [self.listener.fileno()]
+        writable = []
+        for fd in self.connections:
+            readable.append(fd)
+            if self.connections[fd].is_writing():
+                writable.append(fd)
+        readable.extend(self.worker_fds())
+        ready, ready_to_write = poll_ready(readable, writable, -1)
+        for fd in ready_to_write:
+            if fd in self.connections:
+                self.connections[fd].flush()
+        for fd in ready:
+            if fd == self.listener.fileno():
+                connection = Connection(accept(self.listener))
+                self.connections[connection.socket.fileno()] = connection
+            elif fd in self.connections:
+                self.read_connection(fd, self.connections[fd])
+        self.read_workers(ready)
+
+    def read_connection(self, fd, connection):
+        try:
+            data = connection.socket.recv(READ_SIZE)
+        except SocketError:
+            data = ''
+        if len(data) == 0:
+            connection.close()
+            del self.connections[fd]
+            return
+        connection.reader.feed(data)
+        try:
+            frame = connection.reader.next()
+            while frame is not None:
+                self.request(connection, frame)
+                frame = connection.reader.next()
+        except ProtocolError as e:
+            connection.send(encode_exit(0, USAGE_ERROR, e.to_string()))
+            connection.close()
+            del self.connections[fd]
+
+    def request(self, connection, frame):
+        if frame.kind == STOP:
+            if self.allow_stop:
+                self.running = False
+            else:
+                connection.send(encode_exit(frame.id, USAGE_ERROR, 'STOP is only accepted with --allow-stop'))
+        elif frame.kind == RUN or frame.kind == FILE:
+            id = self.next_id
+            self.next_id += 1
+            self.pending[id] = Pending(connection, frame.id)
+            worker = self.workers[content_hash(frame.payload) % len(self.workers)]
+            worker.submit(Frame(frame.kind, id, frame.payload))
+        else:
+            connection.send(encode_exit(frame.id, USAGE_ERROR, 'Unknown request %s' % frame.kind))
+
+    def received(self, frame):
+        pending = self.pending.get(frame.id, None)
+        if pending is not None:
+            pending.connection.send(encode_frame(frame.kind, pending.id, frame.payload))
+            if frame.kind == EXIT:
+                del self.pending[frame.id]
+
+    def lost(self, frame, message):
+        pending = self.pending.get(frame.id, None)
+        if pending is not None:
+            pending.connection.send(encode_exit(pending.id, RUNTIME_ERROR, message))
+            del self.pending[frame.id]
+
+    def shutdown(self):
+        for fd in self.connections:
+            self.connections[fd].close()
+        self.connections = {}
+        self.stop_workers()
+        self.listener.close()
+        os.unlink(self.path)
@@ -0,0 +1,149 @@
+"""
+Unix sockets and polling for both the translated interpreter (rpython.rlib's rsocket and rpoll) and CPython (socket and
+select); either way sockets offer fileno(), recv(size), sendall(string) and close() over plain strings. A server sends
+without blocking (see set_nonblocking and send_some) and waits for its sockets to become writable with poll_ready.
+"""
+import errno
+
+try:
+    from rpython.rlib import rpoll, rsocket
+
+    SocketError = rsocket.SocketError
+
+    def listen_unix(path, backlog):
+        listener = rsocket.RSocket(rsocket.AF_UNIX, rsocket.SOCK_STREAM)
+        listener.bind(rsocket.UNIXAddress(path))
+        listener.listen(backlog)
+        return listener
+
+    def accept(listener):
+        fd, _ = listener.accept()
+        return rsocket.RSocket(rsocket.AF_UNIX, rsocket.SOCK_STREAM, fd=fd)
+
+    def connect_unix(path):
+        connection = rsocket.RSocket(rsocket.AF_UNIX, rsocket.SOCK_STREAM)
+        connection.connect(rsocket.UNIXAddress(path))
+        return connection
+
+    def poll_readable(fds, timeout):
+        """Wait up to 'timeout' milliseconds (forever if negative) and return the fds ready to read (or closed)"""
+        events = {}
+        for fd in fds:
+            events[fd] = rpoll.POLLIN
+        return [fd for fd, _ in rpoll.poll(events, timeout)]
+
+    def poll_ready(readable, writable, timeout):
+        """Like poll_readable, also waiting for the 'writable' fds; returns the fds ready to read and those ready to
+        write (or closed)"""
+        events = {}
+        for fd in readable:
+            events[fd] = rpoll.POLLIN
+        for fd in writable:
+            events[fd] = events.get(fd, 0) | rpoll.POLLOUT
+        ready = rpoll.poll(events, timeout)
+        failed = rpoll.POLLHUP | rpoll.POLLERR | rpoll.POLLNVAL
+        return split_ready(ready, readable, writable, rpoll.POLLIN | failed, rpoll.POLLOUT | failed)
+
+    def set_nonblocking(socket):
+        socket.setblocking(False)
+
+    def send_some(socket, data):
+        """Send as much of 'data' as the socket takes without blocking; returns the number of bytes sent"""
+        try:
+            return socket.send(data)
+        except rsocket.CSocketError as e:
+            if e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK:
+                return 0
+            raise
+
+except ImportError:
+    import select
+    import socket
+
+    SocketError = socket.error
+
+    class Socket(object):
+        """Wraps a CPython socket so that it sends and receives str under Python 3 too"""
+
+        def __init__(self, socket):
+            self.socket = socket
+
+        def fileno(self):
+            return self.socket.fileno()
+
+        def recv(self, size):
+            data = self.socket.recv(size)
+            return data if str is bytes else data.decode('latin-1')
+
+        def sendall(self, data):
+            self.socket.sendall(data if str is bytes else data.encode('latin-1'))
+
+        def send(self, data):
+            return self.socket.send(data if str is bytes else data.encode('latin-1'))
+
+        def setblocking(self, flag):
+            self.socket.setblocking(flag)
+
+        def close(self):
+            self.socket.close()
+
+    def listen_unix(path, backlog):
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(backlog)
+        return Socket(listener)
+
+    def accept(listener):
+        connection, _ = listener.socket.accept()
+        return Socket(connection)
+
+    def connect_unix(path):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(path)
+        return Socket(connection)
+
+    def poll_readable(fds, timeout):
+        """Wait up to 'timeout' milliseconds (forever if negative) and return the fds ready to read (or closed)"""
+        poller = select.poll()
+        for fd in fds:
+            poller.register(fd, select.POLLIN)
+        return [fd for fd, _ in poller.poll(timeout)]
+
+    def poll_ready(readable, writable, timeout):
+        """Like poll_readable, also waiting for the 'writable' fds; returns the fds ready to read and those ready to
+        write (or closed)"""
+        events = {}
+        for fd in readable:
+            events[fd] = select.POLLIN
+        for fd in writable:
+            events[fd] = events.get(fd, 0) | select.POLLOUT
+        poller = select.poll()
+        for fd in events:
+            poller.register(fd, events[fd])
+        failed = select.POLLHUP | select.POLLERR | select.POLLNVAL
+        return split_ready(poller.poll(timeout), readable, writable, select.POLLIN | failed, select.POLLOUT | failed)
+
+    def set_nonblocking(socket):
+        socket.setblocking(False)
+
+    def send_some(socket, data):
+        """Send as much of 'data' as the socket takes without blocking; returns the number of bytes sent"""
+        try:
+            return socket.send(data)
+        except SocketError as e:
+            if e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK:
+                return 0
+            raise
+
+
+def split_ready(ready, readable, writable, read_events, write_events):
+    """Sort the (fd, events) pairs returned by a poll into the fds ready to read and those ready to write; an fd that
+    was closed or failed is reported to whichever side waited for it"""
+    ready_to_read = []
+    ready_to_write = []
+    for fd, events in ready:
+        if events & read_events and fd in readable:
+            ready_to_read.append(fd)
+        if events & write_events and fd in writable:
+            ready_to_write.append(fd)
+    return ready_to_read, ready_to_write
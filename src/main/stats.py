@@ -0,0 +1,190 @@
+"""
+The report of tiger-interpreter --stats: the wall and CPU time of each phase of a run, the size of its input and output
+of parsing, the work counted while evaluating (see src/counters.py) and, in translated builds, the JIT's and the GC's
+own counters. The report is printed as text or, with --stats=json, as a single JSON object.
+"""
+import time
+
+from src.counters import counters
+from src.main.util import quote_json
+from src.profiler import pad
+
+try:
+    from time import clock as cpu_time
+except ImportError:
+    from time import process_time as cpu_time  # Python 3.8+
+
+try:
+    from rpython.rlib import jit_hooks, rgc
+    from rpython.rlib.jit import Counters
+    from rpython.rlib.objectmodel import we_are_translated
+    from rpython.memory.gc.hook import GcHooks
+except ImportError:
+    jit_hooks = None
+
+    def we_are_translated():
+        return False
+
+    class GcHooks(object):
+        """Stand-in for RPython's GC hooks, which are only called by a translated GC"""
+
+        def is_gc_minor_enabled(self):
+            return False
+
+        def is_gc_collect_step_enabled(self):
+            return False
+
+        def is_gc_collect_enabled(self):
+            return False
+
+
+class GcCounters(GcHooks):
+    """Counts the collections of a translated GC; installed by tiger-interpreter's get_gchooks()"""
+    _immutable_fields_ = ['enabled?']
+
+    def __init__(self):
+        GcHooks.__init__(self)
+        self.enabled = False
+        self.minor = 0
+        self.major = 0
+
+    def enable(self):
+        self.enabled = True
+
+    def is_gc_minor_enabled(self):
+        return self.enabled
+
+    def is_gc_collect_enabled(self):
+        return self.enabled
+
+    def on_gc_minor(self, duration, total_memory_used, pinned_objects):
+        self.minor += 1
+
+    def on_gc_collect(self, num_major_collects, arenas_count_before, arenas_count_after, arenas_bytes,
+                      rawmalloc_bytes_before, rawmalloc_bytes_after, pinned_objects):
+        self.major += 1
+
+
+# the GC hooks of this process
+gc_counters = GcCounters()
+
+
+class PhaseTime:
+    def __init__(self, name, wall, cpu):
+        self.name = name
+        self.wall = wall  # in seconds
+        self.cpu = cpu
+
+
+class Counter:
+    """A named value of the report, e.g. the number of tokens"""
+
+    def __init__(self, name, label, value):
+        self.name = name  # its JSON key
+        self.label = label  # its text
+        self.value = value
+
+
+class RunStats:
+    """Collects the measurements of a single run; time each phase between begin() and end(name)"""
+
+    def __init__(self):
+        self.phases = []
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.bytes_read = 0
+        self.tokens = 0
+        self.nodes = 0
+
+    def begin(self):
+        self.wall = time.time()
+        self.cpu = cpu_time()
+
+    def end(self, name):
+        self.phases.append(PhaseTime(name, time.time() - self.wall, cpu_time() - self.cpu))
+
+    def values(self):
+        return [Counter('bytes_read', 'Bytes read', self.bytes_read),
+                Counter('tokens', 'Tokens', self.tokens),
+                Counter('nodes', 'AST nodes', self.nodes),
+                Counter('calls', 'Function calls', counters.calls),
+                Counter('iterations', 'Loop iterations', counters.iterations)]
+
+    def report(self):
+        lines = ['Phases (in microseconds):', pad('wall', 12) + pad('cpu', 12) + '  phase']
+        for phase in self.phases:
+            lines.append(pad(str(microseconds(phase.wall)), 12) + pad(str(microseconds(phase.cpu)), 12) + '  ' +
+                         phase.name)
+        for counter in self.values():
+            lines.append('%s: %d' % (counter.label, counter.value))
+        jit = jit_counters()
+        if len(jit) > 0:
+            lines.append('JIT:')
+            for counter in jit:
+                lines.append('  %s: %d' % (counter.label, counter.value))
+        gc = gc_stats()
+        if len(gc) > 0:
+            lines.append('GC:')
+            for counter in gc:
+                lines.append('  %s: %d' % (counter.label, counter.value))
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self):
+        phases = []
+        for phase in self.phases:
+            phases.append('{"name": %s, "wall_us": %d, "cpu_us": %d}' % (quote_json(phase.name),
+                                                                         microseconds(phase.wall),
+                                                                         microseconds(phase.cpu)))
+        fields = ['"phases": [' + ', '.join(phases) + ']']
+        for counter in self.values():
+            fields.append('%s: %d' % (quote_json(counter.name), counter.value))
+        jit = jit_counters()
+        if len(jit) > 0:
+            fields.append('"jit": ' + json_object(jit))
+        gc = gc_stats()
+        if len(gc) > 0:
+            fields.append('"gc": ' + json_object(gc))
+        return '{' + ', '.join(fields) + '}\n'
+
+
+def jit_counters():
+    """The JIT's counters, if this is a translated build (they are only kept with stats_set_debug, see enable_runtime)"""
+    if jit_hooks is None or not we_are_translated():
+        return []
+    aborts = 0
+    for reason in [Counters.ABORT_TOO_LONG, Counters.ABORT_BRIDGE, Counters.ABORT_BAD_LOOP, Counters.ABORT_ESCAPE,
+                   Counters.ABORT_FORCE_QUASIIMMUT]:
+        aborts += jit_hooks.stats_get_counter_value(None, reason)
+    return [Counter('loops', 'Loops compiled', jit_hooks.stats_get_counter_value(None, Counters.TOTAL_COMPILED_LOOPS)),
+            Counter('bridges', 'Bridges compiled',
+                    jit_hooks.stats_get_counter_value(None, Counters.TOTAL_COMPILED_BRIDGES)),
+            Counter('aborts', 'Traces aborted', aborts),
+            Counter('tracing_us', 'Tracing (us)',
+                    microseconds(jit_hooks.stats_get_times_value(None, Counters.TRACING))),
+            Counter('backend_us', 'Backend (us)',
+                    microseconds(jit_hooks.stats_get_times_value(None, Counters.BACKEND)))]
+
+
+def gc_stats():
+    """The GC's collections and total pause time, if this is a translated build"""
+    if jit_hooks is None or not we_are_translated():
+        return []
+    return [Counter('minor_collections', 'Minor collections', gc_counters.minor),
+            Counter('major_collections', 'Major collections', gc_counters.major),
+            Counter('pause_ms', 'Pause time (ms)', rgc.get_stats(rgc.TOTAL_GC_TIME))]
+
+
+def enable_runtime():
+    """Start counting calls, loop iterations, JIT events and collections"""
+    counters.enable()
+    gc_counters.enable()
+    if jit_hooks is not None and we_are_translated():
+        jit_hooks.stats_set_debug(None, True)
+
+
+def json_object(values):
+    return '{' + ', '.join(['%s: %d' % (quote_json(counter.name), counter.value) for counter in values]) + '}'
+
+
+def microseconds(seconds):
+    return int(seconds * 1000000)
@@ -1,7 +1,24 @@
+import os
 import sys
+import time
 
-from src.main.util import read_file, create_environment_with_natives
+from src.allocations import stats as allocations, OPTIMIZE, EVALUATE
+from src.chunked_tokenizer import tokenize_in_chunks
+from src.environment import Limits, LimitExceeded
+from src.main.options import parse_options, OptionError
+from src.main.jobs import ParallelRun
+from src.main.server import Server
+from src.main.stats import RunStats, enable_runtime, gc_counters
+from src.main.runner import run_file, SUCCESS, USAGE_ERROR, PARSE_ERROR, LIMIT_EXCEEDED, TYPE_ERROR
+from src.main.util import read_file, create_environment_with_natives, native_functions, STDOUT_FD, STDERR_FD
+from src.modules import loader
 from src.parser import Parser, ParseError
+from src.passes.inline import size_of
+from src.passes.optimizer import optimize
+from src.profiler import Profiler, instrument, allocation_report
+from src.stack_evaluator import evaluate_with_stack
+from src.tokenizer import Tokenizer
+from src.type_checker import type_check, specialize
 
 
 def main(argv):
@@ -9,28 +26,152 @@ def main(argv):
 
     # check for arguments
     try:
-        file = argv[1]
-    except IndexError:
+        options = parse_options(argv)
+    except OptionError as e:
+        print("Invalid arguments: %s" % e.to_string())
+        return USAGE_ERROR
+    limits = Limits(options.max_steps, options.max_depth, options.max_heap)
+    if options.serve is not None:
+        return Server(options.serve, options.workers, options.cache_size, limits, options.allow_stop).run()
+    if options.jobs > 0:
+        return ParallelRun(options.files, options.jobs, options.batch, limits).run()
+    if options.batch:
+        return run_batch(options.files, limits)
+    if len(options.files) != 1:
         print("Expected one file name argument to be passed, e.g. ./tiger-interpreter program.tig")
-        return 40
+        return USAGE_ERROR
+    file = options.files[0]
 
-    program_contents = read_file(argv[1])
+    # count allocations from the start, i.e. including those of tokenizing and parsing
+    if options.alloc_stats:
+        allocations.enable()
+    stats = None
+    if options.stats is not None:
+        stats = RunStats()
+        enable_runtime()
+    code = run(file, options, limits, stats)
+    if options.alloc_stats:
+        os.write(STDERR_FD, allocation_report(allocations))
+    if stats is not None:
+        os.write(STDERR_FD, stats.to_json() if options.stats == 'json' else stats.report())
+    return code
 
-    # parse input program
+
+def run(file, options, limits, stats=None):
+    """Parse, check, optimize and evaluate a single program as the options request, timing each phase in 'stats' (a
+    RunStats), if any"""
+    if stats:
+        stats.begin()
+    program_contents = read_file(file)
+    if stats:
+        stats.end('read')
+        stats.bytes_read = len(program_contents)
+        stats.begin()
+
+    # with --tokenize-jobs, chunks of a large program are tokenized in parallel before parsing; otherwise the parser
+    # tokenizes as it goes, so with --stats tokenizing is timed by a separate pass (and is also part of 'parse')
+    tokens = None
+    if options.tokenize_jobs > 1:
+        tokens = tokenize_in_chunks(program_contents, file, options.tokenize_jobs)
+    if stats:
+        stats.tokens = len(tokens) if tokens is not None else len(Tokenizer(program_contents, file).all())
+        stats.end('tokenize')
+        stats.begin()
+
+    # parse input program; type checking, optimizing and profiling modify nodes in place and walk every function body, so
+    # they need a tree without shared nodes or skipped (lazily parsed) bodies
     try:
-        program = Parser(program_contents, argv[1]).parse()
+        share = options.share_nodes and not options.type_check and not options.optimize and not options.profile
+        lazy = options.lazy_bodies and not options.type_check and not options.optimize and not options.profile
+        program = Parser(program_contents, file, share, loader, lazy=lazy, tokens=tokens).parse()
     except ParseError as e:
         print("Parse failure: %s" % e.to_string())
-        return 42
+        return PARSE_ERROR
+    if stats:
+        stats.end('parse')
+        stats.nodes = size_of(program)
+
+    # check types before running anything; a well-typed program is specialized to skip its run-time class checks
+    if options.type_check:
+        if stats:
+            stats.begin()
+        errors = type_check(program)
+        if len(errors) > 0:
+            for error in errors:
+                print("Type error: %s" % error.to_string())
+            return TYPE_ERROR
+        specialize(program)
+        if stats:
+            stats.end('type-check')
+
+    if options.optimize:
+        allocations.phase = OPTIMIZE
+        if stats:
+            stats.begin()
+        report = [] if options.report_passes else None
+        program = optimize(program, report, native_functions())
+        if stats:
+            stats.end('passes')
+        if report is not None:
+            for line in report:
+                os.write(STDERR_FD, line + "\n")
+
+    # wrap the program's nodes to count and time their evaluation; without --profile the tree is left untouched
+    profiler = None
+    if options.profile:
+        profiler = Profiler()
+        program = instrument(program, profiler)
 
-    # evaluate the program
-    environment = create_environment_with_natives()
-    result = program.evaluate(environment)
+    # evaluate the program, repeatedly if requested so that JIT warmup can be observed; with --explicit-stack, the
+    # depth of the program's recursion is not limited by the host stack
+    allocations.phase = EVALUATE
+    if stats:
+        stats.begin()
+    result = None
+    for iteration in range(options.repeat):
+        start = time.time()
+        environment = create_environment_with_natives(limits.fresh())
+        try:
+            if options.explicit_stack:
+                result = evaluate_with_stack(program, environment, options.max_stack)
+            else:
+                result = program.evaluate(environment)
+        except LimitExceeded as e:
+            print("Limit exceeded: %s" % e.to_string())
+            return LIMIT_EXCEEDED
+        except ParseError as e:
+            # in the body of a function parsed lazily, on its first call
+            print("Parse failure: %s" % e.to_string())
+            return PARSE_ERROR
+        if options.report_iterations:
+            elapsed = int((time.time() - start) * 1000000)
+            os.write(STDERR_FD, "iteration %d: %d us\n" % (iteration + 1, elapsed))
+    if stats:
+        stats.end('evaluate')
+
+    if profiler:
+        profiler.finish()
+        os.write(STDERR_FD, profiler.report())
+        if options.profile_collapsed:
+            profiler.write_collapsed(options.profile_collapsed)
 
     # print the result and exit
     if result:
         print(result.to_string())
-    return 0
+    return SUCCESS
+
+
+def run_batch(files, limits):
+    """Run each program in a fresh environment but in this same process, so that later programs reuse the warmed-up
+    JIT; print one JSON line per program with its status, timing and captured output. Exits with the code of the first
+    failing program, if any"""
+    code = SUCCESS
+    for file in files:
+        result = run_file(file, limits)
+        os.write(STDOUT_FD, result.to_json() + "\n")
+        if code == SUCCESS:
+            code = result.code
+    return code
 
 
 if __name__ == "__main__":
@@ -40,3 +181,8 @@ if __name__ == "__main__":
 
 def target(*args):
     return main, None
+
+
+def get_gchooks():
+    """The GC hooks of the translated interpreter, which count collections for --stats"""
+    return gc_counters
@@ -1,30 +1,35 @@
 import sys
 
-from src.main.util import read_file
+from src.main.dump import write_program
+from src.main.util import read_file, BufferedWriter, STDOUT_FD
+from src.modules import loader
 from src.parser import Parser, ParseError
 
 
 def main(argv):
-    """Parse and print any Tiger program"""
+    """Parse and print any Tiger program, as text or (with --json) as JSON"""
 
     # check for arguments
-    try:
-        file = argv[1]
-    except IndexError:
-        print("Expected one file name argument to be passed, e.g. ./tiger-parser program.tig")
+    as_json = len(argv) > 1 and argv[1] == '--json'
+    arguments = argv[2:] if as_json else argv[1:]
+    if len(arguments) != 1:
+        print("Expected one file name argument to be passed, e.g. ./tiger-parser [--json] program.tig")
         return 40
+    file = arguments[0]
 
-    program_contents = read_file(argv[1])
+    program_contents = read_file(file)
 
     # parse input program
     try:
-        program = Parser(program_contents, argv[1]).parse()
+        program = Parser(program_contents, file, loader=loader).parse()
     except ParseError as e:
         print("Parse failure: %s" % e.to_string())
         return 42
 
-    # print the program
-    print(program.to_string())
+    # print the program as it is serialized rather than building the whole text first
+    out = BufferedWriter(STDOUT_FD)
+    write_program(program, as_json, out)
+    out.flush()
 
     return 0
 
@@ -22,7 +22,7 @@ def read_file(filename):
         read = os.read(fd, 4096)
         if len(read) == 0:
             break
-        text += read
+        text += read if str is bytes else read.decode('latin-1')  # str under Python 3 too, as in sockets.Socket
 
     os.close(fd)
     return text
@@ -39,17 +39,121 @@ STDOUT_FD = 1
 STDERR_FD = 2
 
 
+class Stream:
+    """Receives the output of a Tiger program as it is printed; see Output.redirect"""
+
+    def write(self, string):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+
+class BufferedWriter(Stream):
+    """Collects small writes (e.g. the pieces of visitor.write_tree) into blocks of about 'size' bytes before writing
+    them to a file descriptor; call flush() once done"""
+
+    def __init__(self, fd, size=65536):
+        self.fd = fd
+        self.size = size
+        self.pieces = []
+        self.length = 0
+
+    def write(self, string):
+        self.pieces.append(string)
+        self.length += len(string)
+        if self.length >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.length == 0:
+            return
+        block = ''.join(self.pieces)
+        self.pieces = []
+        self.length = 0
+        while len(block) > 0:
+            written = os.write(self.fd, block)
+            block = block[written:]
+
+
+class Output:
+    """Destination of everything a Tiger program prints: stdout, unless a caller (e.g. batch mode) is capturing the
+    output of a single program or redirecting it to a Stream (e.g. the server, sending it back to a client)"""
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.capturing = False
+        self.buffer = []
+        self.stream = None
+
+    def write(self, string):
+        if self.capturing:
+            self.buffer.append(string)
+        elif self.stream is not None:
+            self.stream.write(string)
+        else:
+            os.write(self.fd, string)
+
+    def redirect(self, stream):
+        """Send everything written to 'stream' until redirect(None) is called"""
+        self.stream = stream
+
+    def capture(self):
+        """Start collecting everything written instead of writing it to the file descriptor"""
+        self.capturing = True
+        self.buffer = []
+
+    def release(self):
+        """Stop capturing and return everything written since capture()"""
+        self.capturing = False
+        captured = ''.join(self.buffer)
+        self.buffer = []
+        return captured
+
+
+output = Output(STDOUT_FD)
+
+
 def tiger_print(value):
     if isinstance(value, IntegerValue):
-        os.write(STDOUT_FD, str(value.integer))
+        output.write(str(value.integer))
     elif isinstance(value, StringValue):
-        os.write(STDOUT_FD, value.string)
+        output.write(value.string)
     else:
         raise ValueError('Unknown value type %s' % value.__class__.__name__)
 
 
-def create_environment_with_natives():
-    environment = Environment()
-    environment.set('print', NativeFunctionDeclaration('print', [FunctionParameter('string', TypeId('string'))], None,
-                                                       tiger_print))
+HEX_DIGITS = '0123456789abcdef'
+
+
+def quote_json(string):
+    """Quote a string as a JSON string literal (the json module is not available to RPython)"""
+    quoted = ['"']
+    for c in string:
+        if c == '"':
+            quoted.append('\\"')
+        elif c == '\\':
+            quoted.append('\\\\')
+        elif c == '\n':
+            quoted.append('\\n')
+        elif c == '\r':
+            quoted.append('\\r')
+        elif c == '\t':
+            quoted.append('\\t')
+        elif ord(c) < 32 or ord(c) > 126:
+            quoted.append('\\u00' + HEX_DIGITS[ord(c) >> 4] + HEX_DIGITS[ord(c) & 15])
+        else:
+            quoted.append(c)
+    quoted.append('"')
+    return ''.join(quoted)
+
+
+def native_functions():
+    return [NativeFunctionDeclaration('print', [FunctionParameter('string', TypeId('string'))], None, tiger_print)]
+
+
+def create_environment_with_natives(limits=None):
+    environment = Environment(limits)
+    for native in native_functions():
+        environment.set(native.name, native)
     return environment
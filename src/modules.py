@@ -0,0 +1,93 @@
+"""
+Loading of imported files ('import "lib.tig"'). A module is a file of declarations that are spliced into the declarations
+of each importer; a ModuleLoader parses each module once per process and hands the same declarations to every later
+importer for as long as the file is unchanged, so a shared prelude is only parsed on its first import. Cached
+declarations are shared between programs and so, like shared nodes (see src/sharing.py), must not be modified in place.
+A module imported along several paths (e.g. by two modules that a program imports) is only spliced once; see
+parser.Splicing.
+"""
+import os
+
+from src.main.util import read_file
+from src.parser import Parser, ModuleError
+
+
+class Module:
+    def __init__(self, path, mtime, size, declarations, origins, imports):
+        self.path = path
+        self.mtime = mtime  # the modification time and size of the file when it was parsed, to detect changes
+        self.size = size
+        self.declarations = declarations
+        self.origins = origins  # the path of the module each declaration comes from, to splice each module once
+        self.imports = imports  # the Modules this one imports
+        self.paths = {path: True}  # the paths of this module and of all the modules it imports, transitively
+        for module in imports:
+            for imported in module.paths:
+                self.paths[imported] = True
+
+
+def resolve_path(path, importer):
+    """Imported paths are relative to the directory of the importing file"""
+    if path.startswith('/') or importer is None:
+        return path
+    slash = importer.rfind('/')
+    if slash < 0:
+        return path
+    return importer[:slash + 1] + path
+
+
+class ModuleLoader:
+    def __init__(self):
+        self.modules = {}  # map of resolved paths to Modules
+        self.parses = 0  # number of module files parsed, i.e. cache misses
+
+    def load(self, path, importers):
+        """Return the module imported as 'path' by the last of 'importers' (the chain of importing files, outermost
+        first), parsing it only if it is not cached or its file has changed"""
+        importer = importers[-1] if len(importers) > 0 else None
+        path = resolve_path(path, importer)
+        module = self.modules.get(path, None)
+        if module is None or not self.is_current(module):
+            module = self.parse(path, importers)
+        for file in importers:
+            if file in module.paths:
+                raise ModuleError('Import cycle: %s' % ' -> '.join(importers + [path]))
+        return module
+
+    def parse(self, path, importers):
+        if path in importers:
+            raise ModuleError('Import cycle: %s' % ' -> '.join(importers + [path]))
+        try:
+            stat = os.stat(path)
+            text = read_file(path)
+        except OSError:
+            raise ModuleError('Unable to read module %s' % path)
+        parser = Parser(text, path, False, self, importers + [path])
+        declarations = parser.parse_module()
+        module = Module(path, stat.st_mtime, stat.st_size, declarations, parser.origins, parser.modules)
+        self.modules[path] = module
+        self.parses += 1
+        return module
+
+    def is_current(self, module):
+        """Whether neither the module's file nor any of its imports have changed since they were parsed"""
+        try:
+            stat = os.stat(module.path)
+        except OSError:
+            return False
+        if stat.st_mtime != module.mtime or stat.st_size != module.size:
+            return False
+        for imported in module.imports:
+            if self.modules.get(imported.path, None) is not imported or not self.is_current(imported):
+                return False
+        return True
+
+    def are_current(self, modules):
+        for module in modules:
+            if not self.is_current(module):
+                return False
+        return True
+
+
+# the loader of this process, shared by every program it parses
+loader = ModuleLoader()
@@ -2,17 +2,27 @@ from src.ast import NilValue, IntegerValue, StringValue, ArrayCreation, TypeId,
     ObjectCreation, FunctionCall, RecordLValue, ArrayLValue, Assign, If, While, For, Break, Let, \
     TypeDeclaration, ArrayType, VariableDeclaration, FunctionDeclaration, RecordType, Sequence, Multiply, Divide, Add, \
     Subtract, GreaterThanOrEquals, LessThanOrEquals, Equals, NotEquals, GreaterThan, LessThan, \
-    And, Or, FunctionParameter
-from src.tokenizer import Tokenizer
+    And, Or, FunctionParameter, DeferredBody, StringTable
+from src.sharing import NodeTable
+from src.tokenizer import Tokenizer, TokenList
 from src.tokens import NumberToken, IdentifierToken, KeywordToken, SymbolToken, StringToken
 
 
+class ModuleError(Exception):
+    """Raised by a module loader when an import cannot be resolved; the parser reports it as a ParseError"""
+
+    def __init__(self, reason):
+        self.reason = reason
+
+
 class ParseError(Exception):
     def __init__(self, reason, token):
         self.reason = reason
         self.token = token
     
     def to_string(self):
+        if self.token is None:
+            return self.reason + " at end of input"
         return self.reason + " at token " + self.token.to_string()
         # TODO sub-class from RPythonizedObject?
     
@@ -44,6 +54,12 @@ PRECEDENCE = {
     '|': 1,
 }
 
+# tokens that close an enclosing construct or start the next declaration: a function body skipped by a lazy parser ends
+# before the first of these found outside any brackets or let
+BODY_OPENERS = ['let', '(', '[', '{']
+BODY_CLOSERS = ['end', ')', ']', '}']
+BODY_ENDS = ['function', 'var', 'type', 'import', 'in', 'primitive', 'class']
+
 OPERATORS = {
     '*': Multiply,
     '/': Divide,
@@ -60,19 +76,92 @@ OPERATORS = {
 }
 
 
+class SkippedBody(DeferredBody):
+    """The extent of a function body in the source, recorded by a lazy parser; parse() builds it with a parser of the
+    same settings"""
+
+    def __init__(self, parser, start, end, line, line_offset):
+        self.text = parser.tokenizer.text
+        self.file = parser.file
+        self.loader = parser.loader
+        self.importers = parser.importers
+        self.strings = parser.strings
+        self.start = start  # offset of the first character after the body's '='
+        self.end = end  # offset after the body's last token
+        self.line = line  # of 'start'
+        self.line_offset = line_offset
+        self.paths = parser.spliced_paths()  # the modules already spliced into the lets enclosing the body
+
+    def parse(self):
+        parser = Parser(self.text, self.file, False, self.loader, self.importers, True)
+        parser.strings = self.strings
+        parser.splicings.append(Splicing(self.paths))
+        parser.tokenizer.seek(self.start, self.end, self.line, self.line_offset)
+        return parser.parse_body()
+
+
+class Splicing:
+    """The declarations of a let or module being parsed, with the file each comes from, and the modules spliced in so
+    far. A module is spliced once into a let and the lets it encloses: in a diamond (two imports both importing a third
+    module), the third module's declarations come first with one import and are left out of the other"""
+
+    def __init__(self, paths=None):
+        self.declarations = []
+        self.origins = []  # the file of each declaration
+        self.paths = paths if paths is not None else {}  # the paths of the modules spliced in
+
+    def add(self, declaration, origin):
+        self.declarations.append(declaration)
+        self.origins.append(origin)
+
+
 class Parser:
-    def __init__(self, text, file=None):
-        self.tokenizer = Tokenizer(text, file)
+    def __init__(self, text, file=None, share=False, loader=None, importers=None, lazy=False, tokens=None):
+        """With 'share', structurally identical sub-trees are parsed into a single shared node (see src/sharing.py); a
+        shared node keeps the location of its first occurrence. Imports are resolved by 'loader' (see
+        src/modules.py); 'importers' are the files importing this one, outermost first, to detect import cycles. With
+        'lazy' (and not 'share'), function bodies are only scanned for their extent and are parsed on first call, so
+        that syntax errors in them surface then (see FunctionDeclaration.parsed_body). 'tokens', if any, are the tokens
+        of the text, already tokenized (e.g. by src/chunked_tokenizer.py); bodies are then parsed eagerly"""
+        self.tokenizer = Tokenizer(text, file) if tokens is None else TokenList(tokens, file)
+        self.nodes = NodeTable() if share else None
+        self.strings = StringTable()  # the string literals of this text
+        self.lazy = lazy and not share and tokens is None
+        self.file = file
+        self.loader = loader
+        self.importers = importers if importers is not None else ([file] if file is not None else [])
+        self.modules = []  # the modules imported by this text, in order
+        self.splicings = []  # the Splicings of the declarations being parsed, innermost last
+        self.origins = []  # after parse_module(), the file each of its declarations comes from
 
     def parse(self):
         return self.expression()
 
+    def parse_body(self):
+        """Parse a skipped function body: a single expression spanning the rest of the text"""
+        body = self.expression()
+        token = self.__peek()
+        if token is not None:
+            raise ExpectationError('the end of the function body', token)
+        return body
+
+    def parse_module(self):
+        """Parse a module: a file of declarations only, which are added to the declarations of its importer"""
+        splicing = Splicing()
+        self.splicings.append(splicing)
+        self.declarations(splicing)
+        self.splicings.pop()
+        token = self.__peek()
+        if token is not None:
+            raise ExpectationError('a declaration', token)
+        self.origins = splicing.origins
+        return splicing.declarations
+
     # recursive descent parse methods (organized alphabetically)
     def arguments(self):
         self.__expect(SymbolToken('('))
         args = []
-        token = self.__peek()
-        if token != SymbolToken(')'):
+        if not self.__accept(SymbolToken(')')):
             exp = self.expression()
             args.append(exp)
             while self.__accept_and_consume(SymbolToken(',')):
@@ -103,24 +192,24 @@ class Parser:
         if self.__accept_type(KeywordToken):
             token = self.__peek()
             if token.value == 'type':
-                return self.type_declaration()
+                return self.__locate(self.type_declaration(), token)
             elif token.value == 'var':
-                return self.variable_declaration()
+                return self.__locate(self.variable_declaration(), token)
             elif token.value == 'function':
-                return self.function_declaration()
-            elif token.value == 'import':
-                return self.import_declaration()
+                return self.__locate(self.function_declaration(), token)
             else:
                 raise ExpectationError('keyword in {type, var, function, import}', token)
         else:
             return None
 
-    def declarations(self):
-        declarations = []
+    def declarations(self, splicing):
+        """Parse declarations into 'splicing', which the caller keeps in self.splicings for as long as they are in
+        scope"""
         while self.is_declaration():
-            declaration = self.declaration()
-            declarations.append(declaration)
-        return declarations
+            if self.__accept(KeywordToken('import')):
+                self.import_declaration(splicing)
+            else:
+                splicing.add(self.declaration(), self.file)
 
     def expression(self):
         exp = self.expression_without_precedence()
@@ -140,18 +229,22 @@ class Parser:
         """See https://en.wikipedia.org/wiki/Operator-precedence_parser"""
         token = self.__peek()
         while self.is_operator(token) and self.precedence(token) >= precedence:
-            self.__next()  # consume operator
-            operation = token.value
+            operator = self.__next()  # consume operator
+            operation = operator.value
             inner_precedence = PRECEDENCE[token.value]
             right = self.expression_without_precedence()
             token = self.__peek()
             while self.is_operator(token) and self.precedence(token) >= inner_precedence:
                 right = self.expression_with_precedence(right, PRECEDENCE[token.value])
                 token = self.__peek()
-            left = self.operation(operation, left, right)
+            left = self.__locate(self.operation(operation, left, right), operator)
         return left
 
     def expression_without_precedence(self):
+        token = self.__peek()
+        return self.__locate(self.primary_expression(), token)
+
+    def primary_expression(self):
         if self.__accept(KeywordToken('nil')):
             return NilValue()
         elif self.__accept_type(NumberToken):
@@ -162,7 +255,7 @@ class Parser:
             return IntegerValue.from_string('-' + token.value)
         elif self.__accept_type(StringToken):
             token = self.__next()
-            return StringValue(token.value)
+            return self.strings.intern(token.value)
         elif self.__accept(SymbolToken('(')):
             return self.sequence()
         elif self.__accept_type(IdentifierToken):
@@ -214,9 +307,38 @@ class Parser:
         if self.__accept_and_consume(SymbolToken(':')):
             return_type = self.type()
         self.__expect(SymbolToken('='))
+        if self.lazy:
+            skipped = self.skip_body()
+            if skipped is not None:
+                return FunctionDeclaration(id, params, return_type, None, skipped)
         exp = self.expression()
         return FunctionDeclaration(id, params, return_type, exp)
 
+    def skip_body(self):
+        """Consume the tokens of a function body without building nodes, balancing brackets and lets, and return its
+        extent; returns None (for the body to be parsed now) if tokens past the '=' have already been peeked"""
+        tokenizer = self.tokenizer
+        if len(tokenizer.buffer) > 0:
+            return None
+        start, line, line_offset = tokenizer.offset, tokenizer.line, tokenizer.line_offset
+        depth = 0
+        while True:
+            end = tokenizer.offset
+            token = self.__peek()
+            if token is None:
+                break
+            if isinstance(token, KeywordToken) or isinstance(token, SymbolToken):
+                if token.value in BODY_OPENERS:
+                    depth += 1
+                elif token.value in BODY_CLOSERS:
+                    if depth == 0:
+                        break
+                    depth -= 1
+                elif depth == 0 and isinstance(token, KeywordToken) and token.value in BODY_ENDS:
+                    break
+            self.__next()
+        return SkippedBody(self, start, end, line, line_offset)
+
     def id(self):
         token = self.__expect_type(IdentifierToken)
         return token.value
@@ -247,8 +369,36 @@ class Parser:
             exp2 = self.expression()
         return If(condition, exp1, exp2)
 
-    def import_declaration(self):
-        raise NotImplementedError
+    def import_declaration(self, splicing):
+        """Import the declarations of another file, e.g. 'import "lib.tig"', in place of this declaration; those of
+        modules already spliced into 'splicing' or an enclosing let are left out (see Splicing)"""
+        self.__expect(KeywordToken('import'))
+        token = self.__expect_type(StringToken)
+        if self.loader is None:
+            raise ParseError('Unable to import %s without a module loader' % token.value, token)
+        try:
+            module = self.loader.load(token.value, self.importers)
+        except ModuleError as e:
+            raise ParseError(e.reason, token)
+        self.modules.append(module)
+        for index in range(len(module.declarations)):
+            if not self.is_spliced(module.origins[index]):
+                splicing.add(module.declarations[index], module.origins[index])
+        for path in module.paths:
+            splicing.paths[path] = True
+
+    def is_spliced(self, path):
+        for splicing in self.splicings:
+            if path in splicing.paths:
+                return True
+        return False
+
+    def spliced_paths(self):
+        paths = {}
+        for splicing in self.splicings:
+            for path in splicing.paths:
+                paths[path] = True
+        return paths
 
     def is_declaration(self):
         token = self.__peek()
@@ -259,14 +409,17 @@ class Parser:
 
     def let(self):
         self.__expect(KeywordToken('let'))
-        decs = self.declarations()
+        splicing = Splicing()
+        self.splicings.append(splicing)
+        self.declarations(splicing)
         self.__expect(KeywordToken('in'))
         if not self.__accept(KeywordToken('end')):
             exps = self.expressions()
         else:
             exps = []
         self.__expect(KeywordToken('end'))
-        return Let(decs, exps)
+        self.splicings.pop()
+        return Let(splicing.declarations, exps)
 
     def lvalue(self):
         id = self.id()
@@ -339,7 +492,7 @@ class Parser:
     def sequence(self):
         exps = []
         self.__expect(SymbolToken('('))
-        if self.__peek() != SymbolToken(')'):
+        if not self.__accept(SymbolToken(')')):
             exp = self.expression()
             exps.append(exp)
             while self.__accept_and_consume(SymbolToken(';')):
@@ -419,6 +572,15 @@ class Parser:
         """Consume and return the next token"""
         return self.tokenizer.next()
 
+    def __locate(self, node, token):
+        """Record the location of the token starting a node (unless an inner production already has) so that
+        evaluation can be mapped back to the source; when sharing, return the node's canonical equivalent"""
+        if node is not None and token is not None and node.location is None:
+            node.location = token.location
+        if node is not None and self.nodes is not None:
+            node = self.nodes.share(node)
+        return node
+
     def __accept(self, expected, token=None):
         """Check if the given token (or the next peeked token, if none is passed) is of a certain type or has a certain
         value"""
@@ -0,0 +1,209 @@
+"""
+Analyses shared by the optimization passes. Tiger functions are evaluated in the environment of their caller (see
+FunctionCall.evaluate), so a name used anywhere in a program may refer to a declaration anywhere else: references are
+therefore counted by name over whole trees rather than resolved to declarations.
+"""
+from src.ast import Value, LValue, ArrayLValue, RecordLValue, FunctionCall, TypeId, ArrayType, BinaryOperation, Divide, \
+    IntegerValue, Sequence, If, ArrayCreation, RecordCreation, Assign, For, Let, Declaration, FunctionDeclaration, \
+    FunctionParameter
+from src.visitor import Visitor
+
+
+class References(Visitor):
+    """Counts the names read, assigned, called or used as types in a tree; the names being declared are not counted"""
+
+    def __init__(self):
+        self.counts = {}  # map of names to number of references
+
+    def enter(self, node):
+        if isinstance(node, ArrayLValue) or isinstance(node, RecordLValue):
+            pass  # indexes and field names, not variables
+        elif isinstance(node, LValue):
+            self.count(node.name)
+        elif isinstance(node, FunctionCall):
+            self.count(node.name)
+        elif isinstance(node, TypeId):
+            self.count(node.name)
+        elif isinstance(node, ArrayType):
+            self.count(node.type_name)
+        return True
+
+    def count(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+
+def count_references(node):
+    references = References()
+    references.visit(node)
+    return references.counts
+
+
+class Purity(Visitor):
+    """Finds whether evaluating a tree can have an effect: print or assign, call a function, loop or fail. Operators are
+    assumed to be applied to operands of the right type"""
+
+    def __init__(self):
+        self.pure = True
+
+    def enter(self, node):
+        if not self.pure:
+            return False
+        if isinstance(node, Divide):
+            right = node.right
+            self.pure = isinstance(right, IntegerValue) and right.integer != 0
+        elif isinstance(node, LValue):
+            self.pure = node.next is None  # indexing an array or accessing a record field may fail
+        else:
+            self.pure = isinstance(node, Value) or isinstance(node, BinaryOperation) or isinstance(node, Sequence) or \
+                        isinstance(node, If) or isinstance(node, ArrayCreation) or isinstance(node, RecordCreation) or \
+                        isinstance(node, TypeId)
+        return self.pure
+
+
+def is_pure(node):
+    purity = Purity()
+    purity.visit(node)
+    return purity.pure
+
+
+class Bindings(Visitor):
+    """
+    Collects the names a tree may (re)bind in the environment it is evaluated in, by assigning or declaring them, and
+    the functions it calls. Assigning array elements or record fields does not rebind a name and the bodies of functions
+    declared in the tree are only evaluated when called. Unless 'with_locals' is set, names that are only bound in the
+    tree's own Let and For levels (which are discarded when they end) are left out.
+    """
+
+    def __init__(self, with_locals=True):
+        self.with_locals = with_locals
+        self.names = {}
+        self.calls = {}
+        self.scopes = []  # the names declared by each enclosing Let or For inside the tree
+
+    def enter(self, node):
+        if isinstance(node, Assign):
+            if node.lvalue.next is None:
+                self.bind(node.lvalue.name)
+        elif isinstance(node, FunctionCall):
+            self.calls[node.name] = True
+        elif isinstance(node, For):
+            self.scopes.append({node.var: True})
+            self.bind(node.var)
+        elif isinstance(node, Let):
+            self.scopes.append({})
+            for declaration in node.declarations:
+                self.scopes[-1][declaration.name] = True
+                self.bind(declaration.name)
+        elif isinstance(node, FunctionDeclaration):
+            self.bind(node.name)
+            return False
+        elif isinstance(node, Declaration) and not isinstance(node, TypeId) and \
+                not isinstance(node, FunctionParameter):
+            self.bind(node.name)  # declared outside of a Let: bound in the current level
+        return True
+
+    def leave(self, node):
+        if isinstance(node, For) or isinstance(node, Let):
+            self.scopes.pop()
+
+    def bind(self, name):
+        if not self.with_locals:
+            for scope in self.scopes:
+                if name in scope:
+                    return
+        self.names[name] = True
+
+
+class Declarations(Visitor):
+    """Collects the functions declared in a tree and counts the declarations of each name: of variables, functions,
+    types, parameters and loop variables"""
+
+    def __init__(self):
+        self.functions = []
+        self.counts = {}
+
+    def enter(self, node):
+        if isinstance(node, FunctionDeclaration):
+            self.functions.append(node)
+        if isinstance(node, For):
+            self.count(node.var)
+        elif isinstance(node, Declaration) and not isinstance(node, TypeId):
+            self.count(node.name)
+        return True
+
+    def count(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+
+class Effects:
+    """
+    The names that calling each function may rebind in its caller's environment: FunctionCall binds arguments with
+    Environment.set, which overwrites a variable of the same name in any caller, and a function's assignments to names
+    it does not declare rebind its callers' variables. Functions are matched by name, as they are resolved at run time;
+    'natives' are the native functions the program is evaluated with.
+    """
+
+    def __init__(self, program, natives=None):
+        self.functions = {}  # map of function names to maps of the names calling them may rebind
+        self.calls = {}  # map of function names to maps of the names of the functions they call
+        calls = self.calls
+        if natives is not None:
+            for native in natives:
+                self.functions[native.name] = {}
+                for parameter in native.parameters:
+                    self.functions[native.name][parameter.name] = True
+                calls[native.name] = {}
+        declarations = Declarations()
+        declarations.visit(program)
+        self.declarations = declarations
+        for function in declarations.functions:
+            if function.name not in self.functions:
+                self.functions[function.name] = {}
+                calls[function.name] = {}
+            bindings = Bindings(False)
+            bindings.visit(function.body)
+            for parameter in function.parameters:
+                self.functions[function.name][parameter.name] = True
+            for name in bindings.names:
+                self.functions[function.name][name] = True
+            for name in bindings.calls:
+                calls[function.name][name] = True
+        # include the effects of the functions called, transitively
+        changed = True
+        while changed:
+            changed = False
+            for name in calls:
+                for callee in calls[name]:
+                    for bound in self.functions.get(callee, {}):
+                        if bound not in self.functions[name]:
+                            self.functions[name][bound] = True
+                            changed = True
+
+    def reaches(self, caller, callee):
+        """Whether calling 'caller' may call 'callee', directly or not"""
+        seen = {}
+        pending = [caller]
+        while len(pending) > 0:
+            name = pending.pop()
+            for called in self.calls.get(name, {}):
+                if called == callee:
+                    return True
+                if called not in seen:
+                    seen[called] = True
+                    pending.append(called)
+        return False
+
+    def bound_names(self, node):
+        """The names that evaluating 'node' may bind, including through the functions it calls and in its own Let and
+        For levels"""
+        bindings = Bindings()
+        bindings.visit(node)
+        names = bindings.names
+        for callee in bindings.calls:
+            for name in self.functions.get(callee, {}):
+                names[name] = True
+        return names
+
+
+def describe_location(node):
+    return node.location.to_string() if node.location is not None else '<unknown>'
@@ -0,0 +1,75 @@
+"""
+Removes the declarations of a program that are never referenced, and the expressions whose values are discarded, as long
+as doing so cannot change what the program does: unused variables are only removed if their initializers are pure.
+"""
+from src.ast import Let, Sequence, VariableDeclaration, FunctionDeclaration, TypeDeclaration
+from src.passes.analysis import count_references, is_pure, describe_location
+from src.visitor import Visitor
+
+class DeadCode(Visitor):
+    """Removes dead code from each Let and Sequence after visiting its children (so inner blocks are cleaned first)"""
+
+    def __init__(self, references, report):
+        self.references = references  # map of names to references in the whole program, see analysis.References
+        self.report = report
+        self.removed = 0
+
+    def leave(self, node):
+        if isinstance(node, Let):
+            node.declarations = self.live_declarations(node.declarations)
+            node.expressions = self.live_expressions(node.expressions)
+        elif isinstance(node, Sequence):
+            node.expressions = self.live_expressions(node.expressions)
+
+    def live_declarations(self, declarations):
+        live = []
+        for declaration in declarations:
+            if self.is_dead(declaration):
+                self.remove(declaration, 'unused %s %s' % (kind_of(declaration), declaration.name))
+            else:
+                live.append(declaration)
+        return live
+
+    def is_dead(self, declaration):
+        if isinstance(declaration, VariableDeclaration):
+            if not is_pure(declaration.exp):
+                return False
+        elif not (isinstance(declaration, FunctionDeclaration) or isinstance(declaration, TypeDeclaration)):
+            return False
+        # references from inside the declaration itself (e.g. recursive calls) do not keep it alive
+        inside = count_references(declaration).get(declaration.name, 0)
+        return self.references.get(declaration.name, 0) == inside
+
+    def live_expressions(self, expressions):
+        """Keep the last expression, which is the value of the block, and any other expression with an effect"""
+        live = []
+        for index in range(len(expressions)):
+            expression = expressions[index]
+            if index < len(expressions) - 1 and is_pure(expression):
+                self.remove(expression, 'unused value %s' % expression.__class__.__name__)
+            else:
+                live.append(expression)
+        return live
+
+    def remove(self, node, what):
+        self.removed += 1
+        if self.report is not None:
+            self.report.append('%s: removed %s' % (describe_location(node), what))
+
+
+def kind_of(declaration):
+    if isinstance(declaration, VariableDeclaration):
+        return 'variable'
+    elif isinstance(declaration, FunctionDeclaration):
+        return 'function'
+    return 'type'
+
+
+def eliminate_dead_code(program, report=None):
+    """Remove dead code from 'program' in place, repeating until nothing else can be removed (removing a declaration may
+    leave the ones it referenced unused); what is removed is described in 'report', if a list is passed"""
+    while True:
+        dead_code = DeadCode(count_references(program), report)
+        dead_code.visit(program)
+        if dead_code.removed == 0:
+            return program
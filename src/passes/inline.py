@@ -0,0 +1,239 @@
+"""
+Inlining of small, non-recursive functions: a call 'f(a, b)' to 'function f(x, y) = body' is replaced by
+'let var x' := a var y' := b in body' end', where x' and y' are fresh names and body' is a copy of the body using them.
+This saves the environment push and pop, the arity check and the binding of arguments of the call.
+
+Functions are evaluated in their caller's environment (see FunctionCall.evaluate), which also decides when inlining is
+safe: the body's free variables resolve to the same bindings whether it is called or inlined and its locals are declared
+in their own Let levels either way, so only the parameters are renamed. That is only correct if nothing but the body
+refers to a parameter by name and nothing the body calls rebinds it (see analysis.Effects).
+"""
+from src.ast import Value, LValue, RecordLValue, ArrayLValue, FunctionCall, Assign, If, While, For, Break, Let, \
+    VariableDeclaration, TypeDeclaration, Sequence, BinaryOperation, ArrayCreation, RecordCreation
+from src.passes.analysis import Effects, count_references, describe_location
+from src.passes.rewrite import Rewriter, Names
+from src.visitor import Visitor
+
+INLINE_SIZE = 40  # the maximum number of nodes in the body of an inlined function
+INLINE_DEPTH = 3  # the maximum nesting of inlined bodies inside inlined bodies
+
+
+class Size(Visitor):
+    def __init__(self):
+        self.size = 0
+
+    def enter(self, node):
+        self.size += 1
+        return True
+
+
+def size_of(node):
+    size = Size()
+    size.visit(node)
+    return size.size
+
+
+def copy_tree(node, renames):
+    """Copy an inlined body, renaming the variables in 'renames'; returns None if the body contains nodes that are not
+    inlined (such as nested function declarations). Bodies are small, so this recurses"""
+    copy = None
+    if isinstance(node, Value):
+        return node  # literals are not modified
+    elif isinstance(node, LValue):
+        copy = copy_lvalue(node, renames)
+    elif isinstance(node, FunctionCall):
+        arguments = copy_list(node.arguments, renames)
+        if arguments is None:
+            return None
+        copy = FunctionCall(node.name, arguments)
+    elif isinstance(node, Assign):
+        lvalue = copy_lvalue(node.lvalue, renames)
+        expression = copy_tree(node.expression, renames)
+        if lvalue is None or expression is None:
+            return None
+        copy = Assign(lvalue, expression)
+    elif isinstance(node, If):
+        condition = copy_tree(node.condition, renames)
+        body_if_true = copy_tree(node.body_if_true, renames)
+        body_if_false = None
+        if node.body_if_false is not None:
+            body_if_false = copy_tree(node.body_if_false, renames)
+            if body_if_false is None:
+                return None
+        if condition is None or body_if_true is None:
+            return None
+        copy = If(condition, body_if_true, body_if_false)
+    elif isinstance(node, While):
+        condition = copy_tree(node.condition, renames)
+        body = copy_tree(node.body, renames)
+        if condition is None or body is None:
+            return None
+        copy = While(condition, body)
+    elif isinstance(node, For):
+        start = copy_tree(node.start, renames)
+        end = copy_tree(node.end, renames)
+        body = copy_tree(node.body, renames)
+        if start is None or end is None or body is None:
+            return None
+        copy = For(node.var, start, end, body)
+    elif isinstance(node, Break):
+        copy = Break()
+    elif isinstance(node, Let):
+        declarations = copy_list(node.declarations, renames)
+        expressions = copy_list(node.expressions, renames)
+        if declarations is None or expressions is None:
+            return None
+        copy = Let(declarations, expressions)
+    elif isinstance(node, VariableDeclaration):
+        exp = copy_tree(node.exp, renames)
+        if exp is None:
+            return None
+        copy = VariableDeclaration(node.name, node.type, exp)
+    elif isinstance(node, TypeDeclaration):
+        return node  # holds no expressions
+    elif isinstance(node, Sequence):
+        expressions = copy_list(node.expressions, renames)
+        if expressions is None:
+            return None
+        copy = Sequence(expressions)
+    elif isinstance(node, BinaryOperation):
+        left = copy_tree(node.left, renames)
+        right = copy_tree(node.right, renames)
+        if left is None or right is None:
+            return None
+        copy = node.__class__(left, right)
+    elif isinstance(node, ArrayCreation):
+        inner = copy_tree(node.inner, renames)
+        outer = copy_tree(node.outer, renames)
+        if inner is None or outer is None:
+            return None
+        copy = ArrayCreation(node.type, inner, outer)
+    elif isinstance(node, RecordCreation):
+        fields = {}
+        for name in node.fields:
+            field = copy_tree(node.fields[name], renames)
+            if field is None:
+                return None
+            fields[name] = field
+        copy = RecordCreation(node.type, fields)
+    if copy is not None:
+        copy.location = node.location
+    return copy
+
+
+def copy_list(nodes, renames):
+    copies = []
+    for node in nodes:
+        copy = copy_tree(node, renames)
+        if copy is None:
+            return None
+        copies.append(copy)
+    return copies
+
+
+def copy_lvalue(lvalue, renames):
+    next = None
+    if lvalue.next is not None:
+        next = copy_lvalue(lvalue.next, renames)
+        if next is None:
+            return None
+    if isinstance(lvalue, ArrayLValue):
+        exp = copy_tree(lvalue.exp, renames)
+        if exp is None:
+            return None
+        copy = ArrayLValue(exp, next)
+    elif isinstance(lvalue, RecordLValue):
+        copy = RecordLValue(lvalue.name, next)  # a field name, not a variable
+    else:
+        copy = LValue(renames.get(lvalue.name, lvalue.name), next)
+    copy.location = lvalue.location
+    return copy
+
+
+def inlinable_functions(program, natives):
+    """Map the names of the functions that can be inlined to their declarations"""
+    effects = Effects(program, natives)
+    counts = effects.declarations.counts
+    references = count_references(program)
+    functions = {}
+    for function in effects.declarations.functions:
+        name = function.name
+        if counts.get(name, 0) != 1 or is_native(natives, name) or effects.reaches(name, name):
+            continue  # calls may resolve to another declaration, or the function is recursive
+        if size_of(function.body) > INLINE_SIZE:
+            continue
+        inside = count_references(function.body)
+        safe = True
+        for parameter in function.parameters:
+            if counts.get(parameter.name, 0) != 1 or references.get(parameter.name, 0) != inside.get(parameter.name, 0):
+                safe = False  # the parameter's name is also used outside the body
+            for callee in effects.calls[name]:
+                if parameter.name in effects.functions.get(callee, {}):
+                    safe = False  # a call from the body rebinds the parameter
+        if safe:
+            functions[name] = function
+    return functions
+
+
+def is_native(natives, name):
+    if natives is not None:
+        for native in natives:
+            if native.name == name:
+                return True
+    return False
+
+
+class Inlining(Rewriter):
+    """Inlines calls to 'functions'; the bodies inlined are rewritten in turn, up to INLINE_DEPTH"""
+
+    def __init__(self, functions, names, report, depth=0):
+        self.functions = functions
+        self.names = names
+        self.report = report
+        self.depth = depth
+        self.inlined = None  # the last Let replacing a call, which has already been rewritten
+
+    def replace(self, node):
+        if isinstance(node, FunctionCall) and node.name in self.functions:
+            function = self.functions[node.name]
+            if len(node.arguments) == len(function.parameters):
+                inlined = self.inline(node, function)
+                if inlined is not None:
+                    return inlined
+        return node
+
+    def descend(self, node):
+        return node is not self.inlined
+
+    def inline(self, call, function):
+        renames = {}
+        for parameter in function.parameters:
+            renames[parameter.name] = self.names.next('$inline%d_' + parameter.name)
+        body = copy_tree(function.body, renames)
+        if body is None:
+            return None
+        declarations = []
+        for index in range(len(function.parameters)):
+            parameter = function.parameters[index]
+            declaration = VariableDeclaration(renames[parameter.name], parameter.type,
+                                              self.rewrite(call.arguments[index]))
+            declaration.location = call.location
+            declarations.append(declaration)
+        if self.depth + 1 < INLINE_DEPTH:
+            body = Inlining(self.functions, self.names, self.report, self.depth + 1).rewrite(body)
+        let = Let(declarations, [body])
+        let.location = call.location
+        if self.report is not None:
+            self.report.append('%s: inlined %s' % (describe_location(call), function.name))
+        self.inlined = let
+        return let
+
+
+def inline_functions(program, report=None, natives=None):
+    """Inline calls to small non-recursive functions in 'program' in place, returning the rewritten program; 'natives'
+    are the native functions it will be evaluated with. The declarations of inlined functions are left in place (see
+    dead_code for removing them)"""
+    functions = inlinable_functions(program, natives)
+    if len(functions) == 0:
+        return program
+    return Inlining(functions, Names(), report).rewrite(program)
@@ -0,0 +1,133 @@
+"""
+Loop-invariant code motion: arithmetic in the condition or body of a loop that cannot change while the loop runs (such as
+'N - 1' in 'for r := 0 to N - 1 do ... r + (N - 1)') is evaluated once before the loop, into a temporary variable, if the
+loop runs at all.
+"""
+from src.ast import While, For, If, Let, LValue, Sequence, VariableDeclaration, FunctionDeclaration, BinaryOperation, \
+    Divide, LessThanOrEquals, IntegerValue, StringValue, NilValue
+from src.passes.analysis import Effects, describe_location, is_pure
+from src.passes.inline import copy_tree
+from src.passes.rewrite import Rewriter, Names
+from src.visitor import Visitor
+
+TEMPORARY = '$invariant%d'
+
+
+class Invariance(Visitor):
+    """Finds whether an expression is arithmetic on literals and variables that are not in 'bound'"""
+
+    def __init__(self, bound):
+        self.bound = bound
+        self.invariant = True
+
+    def enter(self, node):
+        if not self.invariant:
+            return False
+        if isinstance(node, Divide):
+            right = node.right
+            self.invariant = isinstance(right, IntegerValue) and right.integer != 0
+        elif isinstance(node, LValue):
+            self.invariant = node.next is None and node.name not in self.bound
+        else:
+            self.invariant = isinstance(node, BinaryOperation) or isinstance(node, IntegerValue) or \
+                             isinstance(node, StringValue) or isinstance(node, NilValue)
+        return self.invariant
+
+
+class Hoisting(Rewriter):
+    """Replaces the largest invariant expressions in a loop with temporaries, collecting their declarations"""
+
+    def __init__(self, bound, names):
+        self.bound = bound
+        self.names = names
+        self.declarations = []
+
+    def replace(self, node):
+        if not isinstance(node, BinaryOperation):
+            return node
+        invariance = Invariance(self.bound)
+        invariance.visit(node)
+        if not invariance.invariant:
+            return node
+        name = self.names.next(TEMPORARY)
+        declaration = VariableDeclaration(name, None, node)
+        declaration.location = node.location
+        self.declarations.append(declaration)
+        temporary = LValue(name)
+        temporary.location = node.location
+        return temporary
+
+    def descend(self, node):
+        return not isinstance(node, FunctionDeclaration)
+
+
+class LoopInvariants(Rewriter):
+    """
+    Hoists invariants out of every loop, outer loops first: 'loop' becomes 'if <entry test> then let <temporaries> in loop
+    end else ()'. The entry test (a While's condition, or 'start <= end' for a For) keeps a loop that does not run from
+    evaluating invariants the original never evaluates, which may fail (e.g. reading a variable that is not bound yet);
+    it is evaluated once more than in the original, so loops whose entry test is not pure are left alone. The Let keeps
+    the temporaries from outliving the loop in the enclosing level.
+    """
+
+    def __init__(self, effects, report):
+        self.effects = effects
+        self.report = report
+        self.names = Names()
+        self.hoisted = 0
+
+    def replace(self, node):
+        if isinstance(node, While):
+            entry = self.copy_pure(node.condition)
+            if entry is None:
+                return node
+            hoisting = Hoisting(self.effects.bound_names(node), self.names)
+            node.condition = hoisting.rewrite(node.condition)
+            node.body = hoisting.rewrite(node.body)
+            return self.hoist(node, entry, hoisting.declarations)
+        elif isinstance(node, For):
+            start = self.copy_pure(node.start)
+            end = self.copy_pure(node.end)
+            if start is None or end is None:
+                return node
+            entry = LessThanOrEquals(start, end)
+            entry.location = node.location
+            bound = self.effects.bound_names(node.body)
+            bound[node.var] = True
+            hoisting = Hoisting(bound, self.names)
+            node.body = hoisting.rewrite(node.body)
+            return self.hoist(node, entry, hoisting.declarations)
+        return node
+
+    def copy_pure(self, node):
+        """A copy of 'node' to evaluate again as part of an entry test, or None if evaluating it twice may differ"""
+        if not is_pure(node):
+            return None
+        return copy_tree(node, {})
+
+    def hoist(self, loop, entry, declarations):
+        """Evaluate 'declarations' before 'loop' if 'entry' holds; the returned If is rewritten in turn, which visits
+        the loop again but finds nothing left to hoist from it and continues with its inner loops"""
+        if len(declarations) == 0:
+            return loop
+        for declaration in declarations:
+            self.hoisted += 1
+            if self.report is not None:
+                self.report.append('%s: hoisted %s out of %s' % (
+                    describe_location(declaration), declaration.exp.to_string(), loop.__class__.__name__))
+        let = Let(declarations, [loop])
+        let.location = loop.location
+        skip = Sequence([])
+        skip.location = loop.location
+        guarded = If(entry, let, skip)
+        guarded.location = loop.location
+        return guarded
+
+    def descend(self, node):
+        return True
+
+
+def hoist_loop_invariants(program, report=None, natives=None):
+    """Hoist invariant expressions out of the loops of 'program' in place, returning the rewritten program; 'natives'
+    are the native functions it will be evaluated with"""
+    return LoopInvariants(Effects(program, natives), report).rewrite(program)
@@ -0,0 +1,16 @@
+"""
+Runs the optimization passes over a parsed program. The passes modify the tree in place, so they must not be applied to
+a tree with shared nodes (see src/sharing.py).
+"""
+from src.passes.dead_code import eliminate_dead_code
+from src.passes.inline import inline_functions
+from src.passes.loops import hoist_loop_invariants
+
+
+def optimize(program, report=None, natives=None):
+    """Optimize 'program', returning the optimized tree; each pass describes what it changed in 'report', if a list is
+    passed. 'natives' are the native functions the program will be evaluated with"""
+    program = inline_functions(program, report, natives)
+    program = eliminate_dead_code(program, report)
+    program = hoist_loop_invariants(program, report, natives)
+    return program
@@ -0,0 +1,97 @@
+"""
+In-place rewriting of trees: the counterpart of visitor.Visitor for passes that replace nodes, which need to know the
+fields holding each node's children.
+"""
+from src.ast import ArrayCreation, RecordCreation, LValue, ArrayLValue, FunctionCall, Assign, If, While, For, Let, \
+    VariableDeclaration, FunctionDeclaration, Sequence, BinaryOperation
+
+
+class Names:
+    """Generates names for the variables introduced by passes; they contain a '$' so that they cannot clash with Tiger
+    identifiers"""
+
+    def __init__(self):
+        self.count = 0
+
+    def next(self, template):
+        """Fill the next number into 'template', e.g. '$invariant%d'"""
+        self.count += 1
+        return template % self.count
+
+
+class Rewriter:
+    """
+    Walks a tree top-down with an explicit stack, calling replace() on each node and storing the node it returns in
+    place of the original; the children of the returned node are then rewritten in turn, unless descend() returns False
+    for it. Sub-classes override both.
+    """
+
+    def replace(self, node):
+        return node
+
+    def descend(self, node):
+        return True
+
+    def rewrite(self, root):
+        """Rewrite 'root' and its descendants, returning the node that replaces 'root'"""
+        stack = []
+        root = self.child(root, stack)
+        while len(stack) > 0:
+            self.rewrite_children(stack.pop(), stack)
+        return root
+
+    def child(self, node, stack):
+        replacement = self.replace(node)
+        if self.descend(replacement):
+            stack.append(replacement)
+        return replacement
+
+    def children(self, nodes, stack):
+        return [self.child(node, stack) for node in nodes]
+
+    def rewrite_children(self, node, stack):
+        if isinstance(node, BinaryOperation):
+            node.left = self.child(node.left, stack)
+            node.right = self.child(node.right, stack)
+        elif isinstance(node, Sequence):
+            node.expressions = self.children(node.expressions, stack)
+        elif isinstance(node, Let):
+            node.declarations = self.children(node.declarations, stack)
+            node.expressions = self.children(node.expressions, stack)
+        elif isinstance(node, VariableDeclaration):
+            node.exp = self.child(node.exp, stack)
+        elif isinstance(node, FunctionDeclaration):
+            node.body = self.child(node.body, stack)
+        elif isinstance(node, FunctionCall):
+            node.arguments = self.children(node.arguments, stack)
+        elif isinstance(node, Assign):
+            self.rewrite_lvalue(node.lvalue, stack)
+            node.expression = self.child(node.expression, stack)
+        elif isinstance(node, LValue):
+            self.rewrite_lvalue(node, stack)
+        elif isinstance(node, If):
+            node.condition = self.child(node.condition, stack)
+            node.body_if_true = self.child(node.body_if_true, stack)
+            if node.body_if_false is not None:
+                node.body_if_false = self.child(node.body_if_false, stack)
+        elif isinstance(node, While):
+            node.condition = self.child(node.condition, stack)
+            node.body = self.child(node.body, stack)
+        elif isinstance(node, For):
+            node.start = self.child(node.start, stack)
+            node.end = self.child(node.end, stack)
+            node.body = self.child(node.body, stack)
+        elif isinstance(node, ArrayCreation):
+            node.inner = self.child(node.inner, stack)
+            node.outer = self.child(node.outer, stack)
+        elif isinstance(node, RecordCreation):
+            for name in node.fields:
+                node.fields[name] = self.child(node.fields[name], stack)
+
+    def rewrite_lvalue(self, lvalue, stack):
+        """The parts of an lvalue are not replaced themselves, only the index expressions of its array accesses"""
+        next = lvalue.next
+        while next is not None:
+            if isinstance(next, ArrayLValue):
+                next.exp = self.child(next.exp, stack)
+            next = next.next
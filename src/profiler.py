@@ -0,0 +1,292 @@
+import os
+import time
+
+from src.allocations import PHASES
+from src.ast import Exp, Value, ArrayCreation, RecordCreation, LValue, ArrayLValue, FunctionCall, Assign, If, While, \
+    For, Let, VariableDeclaration, FunctionDeclaration, Sequence, BinaryOperation
+
+try:
+    from rpython.rlib.listsort import make_timsort_class
+except ImportError:
+    def make_timsort_class(**kw):
+        class TimSort(object):
+            """Stand-in for RPython's TimSort in CPython: sub-classes define lt(a, b)"""
+
+            def __init__(self, list, listlength=None):
+                self.list = list
+
+            def lt(self, a, b):
+                return a < b
+
+            def sort(self):
+                items = self.list
+                for i in range(1, len(items)):
+                    item = items[i]
+                    j = i - 1
+                    while j >= 0 and self.lt(item, items[j]):
+                        items[j + 1] = items[j]
+                        j -= 1
+                    items[j + 1] = item
+
+        return TimSort
+
+TimSort = make_timsort_class()
+
+ROOT = 'main'
+
+
+class LocationStats:
+    def __init__(self, location):
+        self.location = location
+        self.count = 0
+
+
+class FunctionStats:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        self.active = 0  # number of frames of this function on the stack, to avoid double-counting recursion
+
+
+class Frame:
+    def __init__(self, stats, path, start):
+        self.stats = stats
+        self.path = path  # the collapsed call stack, e.g. 'main;readint;skipto'
+        self.start = start
+        self.children = 0.0  # time spent in callees
+
+
+class Profiler:
+    """
+    Counts node evaluations by source location and measures inclusive and exclusive time per Tiger function. Profiling
+    works by wrapping the nodes of a parsed program (see instrument()), so an uninstrumented program pays nothing.
+    """
+
+    def __init__(self):
+        self.wrappers = []  # every ProfiledExp created by instrument(), each counting its own evaluations
+        self.functions = {}  # map of function names to FunctionStats
+        self.stacks = {}  # map of collapsed call stacks to exclusive time
+        self.frames = [Frame(self.function_stats(ROOT), ROOT, time.time())]
+        self.functions[ROOT].calls = 1
+
+    def function_stats(self, name):
+        if name not in self.functions:
+            self.functions[name] = FunctionStats(name)
+        return self.functions[name]
+
+    def enter(self, name):
+        stats = self.function_stats(name)
+        stats.calls += 1
+        stats.active += 1
+        path = self.frames[-1].path + ';' + name
+        self.frames.append(Frame(stats, path, time.time()))
+
+    def exit(self):
+        frame = self.frames.pop()
+        elapsed = time.time() - frame.start
+        self.record(frame, elapsed)
+        self.frames[-1].children += elapsed
+
+    def finish(self):
+        """Close any frames left open (e.g. by an error) along with the root frame; call once, before reporting"""
+        while len(self.frames) > 1:
+            self.exit()
+        root = self.frames[0]
+        self.record(root, time.time() - root.start)
+
+    def record(self, frame, elapsed):
+        exclusive = elapsed - frame.children
+        frame.stats.active -= 1
+        if frame.stats.active <= 0:
+            frame.stats.inclusive += elapsed
+        frame.stats.exclusive += exclusive
+        self.stacks[frame.path] = self.stacks.get(frame.path, 0.0) + exclusive
+
+    def report(self, limit=20):
+        """Build a human-readable report of the hottest source locations and functions"""
+        by_location = {}
+        for wrapper in self.wrappers:
+            key = wrapper.location.to_string() if wrapper.location is not None else '<unknown>'
+            if key not in by_location:
+                by_location[key] = LocationStats(key)
+            by_location[key].count += wrapper.evaluations
+        locations = [stats for stats in by_location.values()]
+        LocationSort(locations).sort()
+        functions = [stats for stats in self.functions.values()]
+        FunctionSort(functions).sort()
+
+        lines = ['Hot spots (node evaluations by location):', pad('count', 12) + '  location']
+        for stats in locations[:limit]:
+            lines.append(pad(str(stats.count), 12) + '  ' + stats.location)
+        lines.append('Functions (by exclusive time):')
+        lines.append(pad('calls', 12) + pad('inclusive us', 16) + pad('exclusive us', 16) + '  function')
+        for stats in functions[:limit]:
+            lines.append(pad(str(stats.calls), 12) + pad(str(int(stats.inclusive * 1000000)), 16) +
+                         pad(str(int(stats.exclusive * 1000000)), 16) + '  ' + stats.name)
+        return '\n'.join(lines) + '\n'
+
+    def collapsed(self):
+        """Build flame-graph-compatible collapsed stacks ('main;f;g <exclusive microseconds>'), one per line"""
+        lines = []
+        for path in self.stacks:
+            lines.append('%s %d' % (path, int(self.stacks[path] * 1000000)))
+        return '\n'.join(lines) + '\n'
+
+    def write_collapsed(self, filename):
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.write(fd, self.collapsed())
+        os.close(fd)
+
+
+class LocationSort(TimSort):
+    def lt(self, a, b):
+        return a.count > b.count
+
+
+class FunctionSort(TimSort):
+    def lt(self, a, b):
+        return a.exclusive > b.exclusive
+
+
+class AllocationCounts:
+    def __init__(self, name, counts):
+        self.name = name
+        self.counts = counts  # per phase, see allocations.PHASES
+        self.total = 0
+        for count in counts:
+            self.total += count
+
+
+class AllocationSort(TimSort):
+    def lt(self, a, b):
+        return a.total > b.total or (a.total == b.total and a.name < b.name)
+
+
+def allocation_report(stats):
+    """Build a table of the instances of each class created in each phase (most allocated first) from the counters of
+    an allocations.AllocationStats, followed by the peak frame count and environment depth"""
+    rows = [AllocationCounts(name, stats.counts[name]) for name in stats.counts]
+    AllocationSort(rows).sort()
+    header = ''
+    for phase in PHASES:
+        header += pad(phase, 12)
+    lines = ['Allocations (instances created by phase):', header + pad('total', 12) + '  class']
+    for row in rows:
+        line = ''
+        for count in row.counts:
+            line += pad(str(count), 12)
+        lines.append(line + pad(str(row.total), 12) + '  ' + row.name)
+    lines.append('Peak live function frames: %d' % stats.peak_frames)
+    lines.append('Maximum environment depth: %d' % stats.max_depth)
+    return '\n'.join(lines) + '\n'
+
+
+def pad(string, width):
+    return ' ' * (width - len(string)) + string
+
+
+class ProfiledExp(Exp):
+    """Wraps an expression to count its evaluations"""
+
+    def __init__(self, exp, profiler):
+        self.exp = exp
+        self.profiler = profiler
+        self.location = exp.location
+        self.evaluations = 0
+        profiler.wrappers.append(self)
+
+    def describe(self, out):
+        self.exp.describe(out)
+
+    def to_string(self):
+        return self.exp.to_string()
+
+    def equals(self, other):
+        return self.exp.equals(other)
+
+    def evaluate(self, env=None):
+        self.evaluations += 1
+        return self.exp.evaluate(env)
+
+    def evaluate_int(self, env=None, typed=False):
+        self.evaluations += 1
+        return self.exp.evaluate_int(env, typed)
+
+
+class ProfiledFunctionCall(ProfiledExp):
+    """Wraps a function call to count it and to time the called function"""
+
+    def evaluate(self, env=None):
+        call = self.exp
+        assert isinstance(call, FunctionCall)
+        self.evaluations += 1
+        self.profiler.enter(call.name)
+        try:
+            result = call.evaluate(env)
+        finally:
+            self.profiler.exit()
+        return result
+
+    def evaluate_int(self, env=None, typed=False):
+        return Exp.evaluate_int(self, env, typed)  # through evaluate(), which times the call
+
+
+def instrument(node, profiler):
+    """Wrap every evaluated expression in 'node' (modifying it in place) so that its evaluation is recorded by the
+    profiler; returns the wrapped root"""
+    if isinstance(node, FunctionCall):
+        node.arguments = instrument_list(node.arguments, profiler)
+        return ProfiledFunctionCall(node, profiler)
+    elif isinstance(node, BinaryOperation):
+        node.left = instrument(node.left, profiler)
+        node.right = instrument(node.right, profiler)
+    elif isinstance(node, ArrayCreation):
+        node.inner = instrument(node.inner, profiler)
+        node.outer = instrument(node.outer, profiler)
+    elif isinstance(node, RecordCreation):
+        for name in node.fields:
+            node.fields[name] = instrument(node.fields[name], profiler)
+    elif isinstance(node, LValue):
+        instrument_lvalue(node, profiler)
+    elif isinstance(node, Assign):
+        instrument_lvalue(node.lvalue, profiler)
+        node.expression = instrument(node.expression, profiler)
+    elif isinstance(node, If):
+        node.condition = instrument(node.condition, profiler)
+        node.body_if_true = instrument(node.body_if_true, profiler)
+        if node.body_if_false is not None:
+            node.body_if_false = instrument(node.body_if_false, profiler)
+    elif isinstance(node, While):
+        node.condition = instrument(node.condition, profiler)
+        node.body = instrument(node.body, profiler)
+    elif isinstance(node, For):
+        node.start = instrument(node.start, profiler)
+        node.end = instrument(node.end, profiler)
+        node.body = instrument(node.body, profiler)
+    elif isinstance(node, Let):
+        for declaration in node.declarations:
+            # declarations are not wrapped (Let expects Declarations) but their contents are
+            if isinstance(declaration, VariableDeclaration):
+                declaration.exp = instrument(declaration.exp, profiler)
+            elif isinstance(declaration, FunctionDeclaration):
+                declaration.body = instrument(declaration.body, profiler)
+        node.expressions = instrument_list(node.expressions, profiler)
+    elif isinstance(node, Sequence):
+        node.expressions = instrument_list(node.expressions, profiler)
+    elif not isinstance(node, Exp) or isinstance(node, Value):
+        return node
+    return ProfiledExp(node, profiler)
+
+
+def instrument_list(nodes, profiler):
+    return [instrument(node, profiler) for node in nodes]
+
+
+def instrument_lvalue(lvalue, profiler):
+    next = lvalue.next
+    while next is not None:
+        if isinstance(next, ArrayLValue):
+            next.exp = instrument(next.exp, profiler)
+        next = next.next
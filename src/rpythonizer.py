@@ -11,11 +11,13 @@ def debug(str):
 
 
 def generate_functions(fields):
-    str = ('    def to_string(self):\n'
-           "        return '%s(" + ', '.join([f + '=%s' for f in fields]) + ")' % (self.__class__.__name__, " + ', '.join(['self.' + f + '.to_string()' for f in fields]) + ")\n"
-           "\n"
-           "    def equals(self, other):\n"
-           "        return RPythonizedObject.equals(self, other) and " + ' and '.join(['self.' + f + '.equals(other.' + f + ')' for f in fields]) + "\n")
+    # printing, equality and hashing are derived from describe() by the iterative traversals in src/visitor.py
+    str = ('    def describe(self, out):\n'
+           "        out.text('%s(' % self.__class__.__name__)\n")
+    for i, f in enumerate(fields):
+        str += "        out.text('" + (', ' if i else '') + f + "=')\n"
+        str += "        out.child(self." + f + ")\n"
+    str += "        out.text(')')\n"
     print(str)
 
 
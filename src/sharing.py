@@ -0,0 +1,42 @@
+"""
+Hash-consing of parsed trees: a NodeTable maps every sub-tree to a single canonical node so that structurally identical
+sub-trees (repeated constants, 'ord("0")', 'r + c', ...) are stored once and compare equal by identity. Shared nodes
+may appear at several places in a tree and so must not be modified in place (e.g. by profiler.instrument()).
+"""
+from src.visitor import describe
+
+
+class NodeTable:
+    """
+    Interns nodes bottom-up. A node is keyed by its own text and the ids of its (already interned) children, so that
+    interning costs only the size of the node's description rather than of its whole sub-tree. The table is owned by a
+    single Parser and is dropped with it: it never keeps a program's nodes alive for longer than its parse.
+    """
+
+    def __init__(self):
+        self.nodes = {}  # map of keys to canonical nodes
+        self.interned = 0  # number of distinct nodes
+        self.shared = 0  # number of nodes replaced by an existing one
+
+    def share(self, node):
+        """Return the canonical node structurally equal to 'node', making 'node' canonical if there is none yet"""
+        if node.share_table is self:
+            return node
+        description = describe(node)
+        parts = ['%d:%s' % (len(description.texts[0]), description.texts[0])]
+        for index in range(len(description.nodes)):
+            # children parsed as expressions are already interned; only the few others (e.g. declarations, types)
+            # recurse here
+            child = self.share(description.nodes[index])
+            text = description.texts[index + 1]
+            parts.append('#%d;%d:%s' % (child.share_id, len(text), text))
+        key = ''.join(parts)
+        canonical = self.nodes.get(key, None)
+        if canonical is not None:
+            self.shared += 1
+            return canonical
+        self.interned += 1
+        node.share_table = self
+        node.share_id = self.interned
+        self.nodes[key] = node
+        return node
@@ -0,0 +1,364 @@
+"""
+An evaluator that keeps its pending work on the heap rather than on the host stack (tiger-interpreter --explicit-stack).
+The recursive evaluate() methods of src/ast.py use several host frames per Tiger call, so deep but legitimate recursion
+overflows CPython's recursion limit or the translated binary's C stack; here each node being evaluated is a Frame on an
+explicit stack and each finished node leaves its value on a value stack, so the depth of a program's recursion is only
+bounded by memory or, optionally, by a maximum number of frames.
+
+The evaluator shares the semantics of the recursive walker: it uses the same helpers (BinaryOperation.apply,
+FunctionCall.enter and exit, ArrayLValue.get_at and set_at) and evaluates children in the same order. Nodes it does not
+know, e.g. those added by future passes, fall back to their recursive evaluate().
+"""
+from src.ast import Value, IntegerValue, ArrayValue, RecordValue, ArrayCreation, RecordCreation, LValue, ArrayLValue, \
+    FunctionCall, FunctionDeclaration, Assign, If, While, For, Let, VariableDeclaration, Sequence, BinaryOperation, \
+    And, Or, int_value
+from src.counters import counters
+from src.environment import LimitExceeded
+from src.profiler import ProfiledExp, ProfiledFunctionCall
+
+
+class Frame:
+    """A node being evaluated: 'stage' tells where to resume once the child it waits for has left its value"""
+
+    def __init__(self, node):
+        self.node = node
+        self.stage = 0
+        self.index = 0  # of the next child to evaluate (argument, declaration, expression or field), or a loop index
+        self.end = 0  # of a for loop
+        self.value = None  # the latest value kept for the result, or the value being assigned
+        self.container = None  # the array or record an lvalue has reached so far
+        self.cursor = None  # the next link of that lvalue
+        self.declaration = None  # of the function being called
+        self.names = None  # of the fields of a record being created, in evaluation order
+        self.fields = None  # the values of those fields evaluated so far
+
+
+class StackEvaluator:
+    """Evaluates nodes in 'env' with explicit stacks; 'max_frames' (0 for unlimited) bounds the frames pending at once"""
+
+    def __init__(self, env, max_frames=0):
+        self.env = env
+        self.max_frames = max_frames
+        self.frames = []
+        self.values = []
+
+    def evaluate(self, node):
+        bottom = len(self.frames)
+        self.push(node)
+        while len(self.frames) > bottom:
+            self.step(self.frames[-1])
+        return self.values.pop()
+
+    def push(self, node):
+        if self.max_frames > 0 and len(self.frames) >= self.max_frames:
+            raise LimitExceeded('Exceeded the limit of %d evaluation frames' % self.max_frames)
+        self.frames.append(Frame(node))
+
+    def finish(self, value):
+        """Leave the value of the frame on top and resume its parent"""
+        self.frames.pop()
+        self.values.append(value)
+
+    def replace(self, node):
+        """Evaluate 'node' in place of the frame on top (i.e. in tail position), which then has the same value"""
+        self.frames.pop()
+        self.push(node)
+
+    def step(self, frame):
+        node = frame.node
+        if isinstance(node, Value):
+            self.finish(node)
+        elif isinstance(node, And) or isinstance(node, Or):
+            self.short_circuit(frame, node)
+        elif isinstance(node, BinaryOperation):
+            self.binary_operation(frame, node)
+        elif isinstance(node, LValue):
+            self.lvalue(frame, node)
+        elif isinstance(node, FunctionCall):
+            self.function_call(frame, node)
+        elif isinstance(node, If):
+            self.if_(frame, node)
+        elif isinstance(node, Sequence):
+            self.sequence(frame, node)
+        elif isinstance(node, Let):
+            self.let(frame, node)
+        elif isinstance(node, Assign):
+            self.assign(frame, node)
+        elif isinstance(node, While):
+            self.while_(frame, node)
+        elif isinstance(node, For):
+            self.for_(frame, node)
+        elif isinstance(node, ArrayCreation):
+            self.array_creation(frame, node)
+        elif isinstance(node, RecordCreation):
+            self.record_creation(frame, node)
+        elif isinstance(node, ProfiledFunctionCall):
+            self.profiled_function_call(frame, node)
+        elif isinstance(node, ProfiledExp):
+            node.evaluations += 1
+            self.replace(node.exp)
+        else:
+            self.finish(node.evaluate(self.env))
+
+    def binary_operation(self, frame, node):
+        if frame.stage == 0:
+            frame.stage = 1
+            self.push(node.left)
+        elif frame.stage == 1:
+            frame.stage = 2
+            self.push(node.right)
+        else:
+            right = self.values.pop()
+            left = self.values.pop()
+            self.finish(node.apply(left, right))
+
+    def short_circuit(self, frame, node):
+        """Evaluate the right side of an And or Or only if the left one does not decide its value"""
+        if frame.stage == 0:
+            frame.stage = 1
+            self.push(node.left)
+            return
+        value = int_value(self.values.pop(), node.typed).integer
+        if frame.stage == 1 and (value != 0) == isinstance(node, And):
+            frame.stage = 2
+            self.push(node.right)
+        else:
+            self.finish(IntegerValue(1 if value != 0 else 0))
+
+    def lvalue(self, frame, node):
+        if frame.stage == 0:
+            frame.stage = 1
+            frame.container = self.env.get(node.name)
+            frame.cursor = node.next
+        else:
+            self.index_evaluated(frame)
+        if not self.follow(frame, False):
+            self.finish(frame.container)
+
+    def assign(self, frame, node):
+        lvalue = node.lvalue
+        if frame.stage == 0:
+            frame.stage = 1
+            self.push(node.expression)
+            return
+        elif frame.stage == 1:
+            frame.value = self.values.pop()
+            if lvalue.next is None:
+                self.env.set(lvalue.name, frame.value)
+                self.finish(None)
+                return
+            frame.stage = 2
+            frame.container = self.env.get(lvalue.name)
+            frame.cursor = lvalue.next
+        elif frame.stage == 2:
+            self.index_evaluated(frame)
+        else:
+            last = frame.cursor
+            assert isinstance(last, ArrayLValue)
+            last.set_at(frame.container, self.values.pop(), frame.value)
+            self.finish(None)
+            return
+
+        if self.follow(frame, True):
+            return
+        last = frame.cursor
+        if isinstance(last, ArrayLValue):
+            frame.stage = 3
+            self.push(last.exp)
+        else:
+            last.set_in(frame.container, frame.value, self.env)
+            self.finish(None)
+
+    def follow(self, frame, to_last):
+        """Follow the links of an lvalue (up to, with 'to_last', its last one) from frame.container; returns True if an
+        array index must be evaluated first, in which case index_evaluated() continues"""
+        link = frame.cursor
+        while link is not None and not (to_last and link.next is None):
+            if isinstance(link, ArrayLValue):
+                self.push(link.exp)
+                return True
+            frame.container = link.get_from(frame.container, self.env)
+            link = link.next
+            frame.cursor = link
+        return False
+
+    def index_evaluated(self, frame):
+        link = frame.cursor
+        assert isinstance(link, ArrayLValue)
+        frame.container = link.get_at(frame.container, self.values.pop())
+        frame.cursor = link.next
+
+    def function_call(self, frame, node):
+        env = self.env
+        if frame.stage == 0:
+            frame.stage = 1
+            frame.declaration = node.enter(env)
+        declaration = frame.declaration
+        if frame.stage == 1:
+            # bind each argument once evaluated; like FunctionCall.evaluate, arguments are evaluated in the new frame
+            if frame.index > 0:
+                frame.value = self.values.pop()
+                env.set(declaration.parameters[frame.index - 1].name, frame.value)
+            if frame.index < len(node.arguments):
+                frame.index += 1
+                self.push(node.arguments[frame.index - 1])
+                return
+            if isinstance(declaration, FunctionDeclaration):
+                frame.stage = 2
+                self.push(declaration.parsed_body())
+                return
+            result = node.call_native(declaration, frame.value)
+        else:
+            result = self.values.pop()
+        node.exit(env)
+        self.finish(result)
+
+    def if_(self, frame, node):
+        if frame.stage == 0:
+            frame.stage = 1
+            self.push(node.condition)
+            return
+        condition_value = int_value(self.values.pop(), node.typed)
+        self.replace(node.body_if_true if condition_value.integer != 0 else node.body_if_false)
+
+    def sequence(self, frame, node):
+        if frame.index > 0:
+            frame.value = self.values.pop()
+        if frame.index < len(node.expressions):
+            frame.index += 1
+            self.push(node.expressions[frame.index - 1])
+        else:
+            self.finish(frame.value)
+
+    def let(self, frame, node):
+        env = self.env
+        if frame.stage == 0:
+            frame.stage = 1
+            env.push()
+        elif frame.stage == 2:
+            # a variable's initial value has been evaluated
+            declaration = node.declarations[frame.index]
+            env.set_current_level(declaration.name, self.values.pop())
+            frame.index += 1
+            frame.stage = 1
+
+        if frame.stage == 1:
+            while frame.index < len(node.declarations):
+                declaration = node.declarations[frame.index]
+                if isinstance(declaration, VariableDeclaration):
+                    frame.stage = 2
+                    self.push(declaration.exp)
+                    return
+                declaration.evaluate(env)
+                frame.index += 1
+            frame.stage = 3
+            frame.index = 0
+        else:
+            frame.value = self.values.pop()
+
+        if frame.index < len(node.expressions):
+            frame.index += 1
+            self.push(node.expressions[frame.index - 1])
+        else:
+            env.pop()
+            self.finish(frame.value)
+
+    def while_(self, frame, node):
+        if frame.stage == 1:
+            condition_value = int_value(self.values.pop(), node.typed)
+            if condition_value.integer == 0:
+                self.finish(frame.value)
+                return
+            frame.stage = 2
+            self.push(node.body)
+            return
+        if frame.stage == 2:
+            frame.value = self.values.pop()
+            # TODO break
+            self.env.limits.step()
+            if counters.enabled:
+                counters.iterations += 1
+        frame.stage = 1
+        self.push(node.condition)
+
+    def for_(self, frame, node):
+        env = self.env
+        if frame.stage == 0:
+            frame.stage = 1
+            env.push()
+            self.push(node.start)
+            return
+        elif frame.stage == 1:
+            start_value = self.values.pop()
+            assert isinstance(start_value, IntegerValue)
+            frame.index = start_value.integer
+            frame.stage = 2
+            self.push(node.end)
+            return
+        elif frame.stage == 2:
+            end_value = self.values.pop()
+            assert isinstance(end_value, IntegerValue)
+            frame.end = end_value.integer
+        else:
+            result = self.values.pop()
+            # TODO break
+            assert result is None
+            env.limits.step()
+            if counters.enabled:
+                counters.iterations += 1
+            frame.index += 1
+
+        if frame.index > frame.end:
+            env.pop()
+            self.finish(None)
+        else:
+            frame.stage = 3
+            env.set_current_level(node.var, IntegerValue(frame.index))
+            self.push(node.body)
+
+    def array_creation(self, frame, node):
+        if frame.stage == 0:
+            frame.stage = 1
+            self.push(node.inner)
+        elif frame.stage == 1:
+            frame.stage = 2
+            self.push(node.outer)
+        else:
+            initial_value = self.values.pop()
+            length = self.values.pop()
+            assert isinstance(length, IntegerValue)
+            self.env.limits.allocate(length.integer)
+            self.finish(ArrayValue(length.integer, initial_value))
+
+    def record_creation(self, frame, node):
+        if frame.stage == 0:
+            frame.stage = 1
+            frame.names = [name for name in node.fields]
+            frame.fields = {}
+        names = frame.names
+        fields = frame.fields
+        if frame.index > 0:
+            fields[names[frame.index - 1]] = self.values.pop()
+        if frame.index < len(names):
+            frame.index += 1
+            self.push(node.fields[names[frame.index - 1]])
+        else:
+            self.env.limits.allocate(len(fields))
+            self.finish(RecordValue(fields))
+
+    def profiled_function_call(self, frame, node):
+        call = node.exp
+        assert isinstance(call, FunctionCall)
+        if frame.stage == 0:
+            frame.stage = 1
+            node.evaluations += 1
+            node.profiler.enter(call.name)
+            self.push(call)
+        else:
+            node.profiler.exit()
+            self.finish(self.values.pop())
+
+
+def evaluate_with_stack(program, env, max_frames=0):
+    """Evaluate 'program' in 'env' without recursing on the host stack"""
+    return StackEvaluator(env, max_frames).evaluate(program)
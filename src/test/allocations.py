@@ -0,0 +1,60 @@
+import unittest
+
+from src.allocations import stats, AllocationStats, PARSE, EVALUATE
+from src.ast import IntegerValue
+from src.main.util import create_environment_with_natives
+from src.parser import Parser
+from src.profiler import allocation_report
+
+
+class TestAllocations(unittest.TestCase):
+    def setUp(self):
+        stats.__init__()
+        stats.enable()
+
+    def tearDown(self):
+        stats.__init__()
+
+    def test_counts_by_phase(self):
+        program = Parser('let function f(n: int): int = if n = 0 then 0 else f(n - 1) in f(3) end').parse()
+        self.assertEqual(0, stats.counts['KeywordToken'][EVALUATE])
+        self.assertTrue(stats.counts['KeywordToken'][PARSE] > 0)
+        self.assertTrue(stats.counts['Location'][PARSE] > 0)
+        stats.phase = EVALUATE
+        program.evaluate(create_environment_with_natives())
+        self.assertEqual([0, 0, 1 + 1 + 4], stats.counts['EnvironmentLevel'])  # global, let and one per call
+        self.assertTrue(stats.counts['IntegerValue'][EVALUATE] > 0)
+        self.assertEqual(4, stats.peak_frames)
+        self.assertEqual(0, stats.frames)
+        self.assertEqual(5, stats.max_depth)
+
+    def test_unboxed_integers(self):
+        program = Parser('let var a := 3 in if a * 2 + 1 < 10 & a <> 4 then a - 1 else 0 end').parse()
+        env = create_environment_with_natives()
+        stats.phase = EVALUATE
+        result = program.evaluate(env)
+        self.assertEqual(1, stats.counts['IntegerValue'][EVALUATE])  # only the result is boxed
+        self.assertEqual(IntegerValue(2), result)
+
+    def test_disabled(self):
+        stats.__init__()
+        Parser('let var a := 1 in a + 1 end').parse().evaluate(create_environment_with_natives())
+        self.assertEqual({}, stats.counts)
+        self.assertEqual(0, stats.peak_frames)
+
+    def test_report(self):
+        counted = AllocationStats()
+        counted.counts = {'Location': [3, 0, 0], 'IntegerValue': [1, 0, 9], 'Token': [3, 0, 0]}
+        counted.peak_frames = 2
+        counted.max_depth = 3
+        self.assertEqual(['Allocations (instances created by phase):',
+                          '       parse    optimize    evaluate       total  class',
+                          '           1           0           9          10  IntegerValue',
+                          '           3           0           0           3  Location',
+                          '           3           0           0           3  Token',
+                          'Peak live function frames: 2',
+                          'Maximum environment depth: 3'], allocation_report(counted).splitlines())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from src.main.runner import run_source, status_of, RunResult, SUCCESS, PARSE_ERROR, RUNTIME_ERROR
+from src.main.util import quote_json, output
+
+
+class TestBatch(unittest.TestCase):
+    def test_captures_output(self):
+        result = run_source('(print("a"); print("b"))', 'test.tig', 0.0)
+        self.assertEqual('ok', result.status)
+        self.assertEqual(SUCCESS, result.code)
+        self.assertEqual('ab', result.output)
+        self.assertFalse(output.capturing)
+
+    def test_captures_result(self):
+        result = run_source('1 + 2', 'test.tig', 0.0)
+        self.assertEqual('IntegerValue(3)\n', result.output)
+
+    def test_parse_error(self):
+        result = run_source('let in', 'test.tig', 0.0)
+        self.assertEqual('parse-error', result.status)
+        self.assertEqual(PARSE_ERROR, result.code)
+        self.assertEqual('Unable to parse at end of input', result.message)
+
+    def test_runtime_error_is_isolated(self):
+        result = run_source('let type a = array of int var a := a[2] of 0 in (print("a"); a[5]) end', 'test.tig', 0.0)
+        self.assertEqual('runtime-error', result.status)
+        self.assertEqual(RUNTIME_ERROR, result.code)
+        self.assertEqual('a', result.output)
+        self.assertEqual('Array index 5 out of bounds [0, 2)', result.message)
+        self.assertFalse(output.capturing)
+
+    def test_json(self):
+        result = RunResult('a.tig', 'ok', SUCCESS, '1\n', 0.5)
+        self.assertEqual('{"file": "a.tig", "status": "ok", "exit_code": 0, "time_us": 500000, "message": null, '
+                         '"output": "1\\n"}', result.to_json())
+
+    def test_status_of(self):
+        self.assertEqual('parse-error', status_of(PARSE_ERROR))
+        self.assertEqual('error', status_of(1))
+
+    def test_quote_json(self):
+        self.assertEqual('"a\\"b\\\\c\\t\\u0001"', quote_json('a"b\\c\t\x01'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 
-from src.environment import Environment
+from src.environment import Environment, EMPTY_SHAPE
 
 
 class TestBinding(unittest.TestCase):
@@ -33,6 +33,37 @@ class TestBinding(unittest.TestCase):
         self.sut.pop()
         self.assertEqual(1, self.sut.get('a'))
 
+    def test_levels_binding_the_same_names_share_a_shape(self):
+        self.sut.push()
+        self.sut.set_current_level('a', 1)
+        self.sut.set_current_level('b', 2)
+        first = self.sut.stack[self.sut.level].shape
+        self.sut.pop()
+        self.sut.push()
+        self.sut.set_current_level('a', 3)
+        self.sut.set_current_level('b', 4)
+        self.assertIs(first, self.sut.stack[self.sut.level].shape)
+        self.assertEqual(1, first.find('b'))
+        self.assertEqual(-1, first.find('c'))
+        self.assertEqual(4, self.sut.get('b'))
+
+    def test_overwriting_keeps_the_shape(self):
+        self.sut.set_current_level('a', 1)
+        shape = self.sut.stack[0].shape
+        self.sut.set('a', 2)
+        self.sut.set_current_level('a', 3)
+        self.assertIs(shape, self.sut.stack[0].shape)
+        self.assertEqual(3, self.sut.get('a'))
+
+    def test_unset(self):
+        self.sut.set('a', 1)
+        self.sut.set('b', 2)
+        self.sut.set('c', 3)
+        self.assertEqual(1, self.sut.unset('b'))
+        self.assertEqual(None, self.sut.unset('b'))
+        self.assertEqual((1, None, 3), (self.sut.get('a'), self.sut.get('b'), self.sut.get('c')))
+        self.assertIs(EMPTY_SHAPE.with_name('a').with_name('c'), self.sut.stack[0].shape)
+
 
 if __name__ == '__main__':
     unittest.main()
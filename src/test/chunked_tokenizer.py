@@ -0,0 +1,93 @@
+import os
+import unittest
+
+from src.chunked_tokenizer import split, tokenize_chunk, tokenize_in_chunks, encode, decode, MINIMUM_CHUNK_SIZE
+from src.parser import Parser
+from src.test.util import list_test_files, read_file
+from src.tokenizer import Tokenizer, TokenError
+
+
+def describe(tokens):
+    return [(token.__class__.__name__, token.value, token.location.line, token.location.offset, token.location.file)
+            for token in tokens]
+
+
+def tokenize_chunks_here(text, count):
+    tokens = []
+    for chunk in split(text, count):
+        tokens.extend(tokenize_chunk(text, chunk, 'f.tig'))
+    return tokens
+
+
+class TestChunkedTokenizer(unittest.TestCase):
+    def assertSameTokens(self, text, count):
+        self.assertEqual(describe(Tokenizer(text, 'f.tig').all()), describe(tokenize_chunks_here(text, count)))
+
+    def test_split_at_newlines(self):
+        chunks = split('a\nb\nc\nd\n', 4)
+        self.assertEqual([(0, 4, 1, 0), (4, 6, 3, 1), (6, 8, 4, 1)],
+                         [(chunk.start, chunk.end, chunk.line, chunk.line_offset) for chunk in chunks])
+
+    def test_no_split_in_strings_or_comments(self):
+        text = 'a\n"x\ny\nz"\n/* 1\n /* 2\n */ 3\n */ b\n'
+        for count in range(2, 8):
+            for chunk in split(text, count)[1:]:
+                self.assertTrue(chunk.start in [2, 10, len(text)], chunk.start)
+            self.assertSameTokens(text, count)
+
+    def test_escapes_and_comment_quirks(self):
+        # a numeric escape consumes the character after its digits and '/*/' is a whole comment, as in Tokenizer
+        for text in ['"\\12"\n" + a\n', '"\\"\n" b\n', '/*/ a\n"\n" b\n', 'a */* c\n*/ d\ne\n',
+                     'a\r\nb\rc\n"\r\n"\nd\n']:
+            for count in range(2, 6):
+                self.assertSameTokens(text, count)
+
+    def test_unterminated_string(self):
+        chunks = split('a\nb\nc\nd\n"e\nf\n', 3)
+        self.assertEqual(2, len(chunks))
+        self.assertEqual(6, chunks[1].start)
+
+    def test_test_programs(self):
+        for path in list_test_files('print-tests'):
+            self.assertSameTokens(read_file(path), 5)
+
+    def test_encoding(self):
+        for text in ['let var s := "a,1:\\"b" in s <> "" end /* : */ 42', '\n\na\n"x\n\ny"\n\n\n:= 1\r\n2', '']:
+            tokens = Tokenizer(text, 'f.tig').all()
+            decoded = []
+            decode(encode(tokens), 'f.tig', decoded)
+            self.assertEqual(describe(tokens), describe(decoded))
+
+    def test_workers(self):
+        line = 'var a := "x, \\"y\\"\n" /* a\n comment */ + f(1, 2) <> b\n'
+        text = 'let ' + line * (3 * MINIMUM_CHUNK_SIZE // len(line)) + 'in a end\n'
+        self.assertEqual(describe(Tokenizer(text, 'f.tig').all()), describe(tokenize_in_chunks(text, 'f.tig', 3)))
+
+    def test_worker_error(self):
+        line = 'a := b + 1\n'
+        text = line * (MINIMUM_CHUNK_SIZE // len(line)) + 'a := #\n' + line * (MINIMUM_CHUNK_SIZE // len(line))
+        with self.assertRaises(TokenError) as sequential:
+            Tokenizer(text, 'f.tig').all()
+        with self.assertRaises(TokenError) as chunked:
+            tokenize_in_chunks(text, 'f.tig', 4)
+        self.assertEqual(sequential.exception.reason, chunked.exception.reason)
+        self.assertTrue(sequential.exception.location.equals(chunked.exception.location))
+
+    def test_error_in_first_chunk(self):
+        line = 'a := b + 1\n'
+        text = 'a := #\n' + line * (3 * MINIMUM_CHUNK_SIZE // len(line))
+        fds = len(os.listdir('/proc/self/fd'))
+        with self.assertRaises(TokenError):
+            tokenize_in_chunks(text, 'f.tig', 3)
+        self.assertEqual(fds, len(os.listdir('/proc/self/fd')))
+        with self.assertRaises(OSError):  # no child left to collect
+            os.waitpid(-1, os.WNOHANG)
+
+    def test_parse_tokens(self):
+        text = 'let function f(n: int): int = n + 1 in f(41) end'
+        parsed = Parser(text, None, tokens=Tokenizer(text).all()).parse()
+        self.assertTrue(Parser(text).parse().equals(parsed))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import unittest
+
+from src.main.dump import write_program
+from src.parser import Parser
+from src.test.util import list_test_files, parse_file
+from src.test.visitor import nested_adds, DEPTH
+from src.visitor import Collector
+
+
+def from_json(node):
+    """Rebuild the text form from the JSON form"""
+    pieces = [node['texts'][0]]
+    for index in range(len(node['children'])):
+        pieces.append(from_json(node['children'][index]))
+        pieces.append(node['texts'][index + 1])
+    return ''.join(pieces)
+
+
+def dump(program, as_json):
+    collector = Collector()
+    write_program(program, as_json, collector)
+    return collector.to_string()
+
+
+class TestDump(unittest.TestCase):
+    def test_text_is_to_string(self):
+        for path in list_test_files('print-tests'):
+            program = parse_file(path)
+            self.assertEqual(program.to_string() + '\n', dump(program, False))
+
+    def test_json_keeps_the_text(self):
+        program = Parser('let type r = {a: int} var s := "q\\"uote" in r {a = f(1, s)} end').parse()
+        dumped = json.loads(dump(program, True))
+        self.assertEqual('Let', dumped['node'])
+        self.assertEqual(['VariableDeclaration', 'RecordCreation'],
+                         [child['node'] for child in dumped['children'][1:]])
+        self.assertEqual(program.to_string(), from_json(dumped))
+
+    def test_deep_trees(self):
+        self.assertEqual(DEPTH, dump(nested_adds(DEPTH), True).count('"node": "Add"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,8 @@
 import unittest
 
+import src.ast
 from src.ast import *
-from src.environment import Environment
+from src.environment import Environment, Limits, LimitExceeded
 
 
 class TestEvaluating(unittest.TestCase):
@@ -33,6 +34,119 @@ class TestEvaluating(unittest.TestCase):
         self.assertEqual(IntegerValue(49), result)
         self.assertEqual(1, env.size())
 
+    def test_array_assignment(self):
+        program = Let([VariableDeclaration('a', None, ArrayCreation(TypeId('intArray'), IntegerValue(3), IntegerValue(0)))],
+                      [Assign(LValue('a', ArrayLValue(IntegerValue(1))), IntegerValue(42)),
+                       Add(LValue('a', ArrayLValue(IntegerValue(0))), LValue('a', ArrayLValue(IntegerValue(1))))])
+
+        result = program.evaluate(Environment())
+
+        self.assertEqual(IntegerValue(42), result)
+
+    def test_array_out_of_bounds(self):
+        program = Let([VariableDeclaration('a', None, ArrayCreation(TypeId('intArray'), IntegerValue(3), IntegerValue(0)))],
+                      [LValue('a', ArrayLValue(IntegerValue(3)))])
+
+        with self.assertRaises(InterpretationError):
+            program.evaluate(Environment())
+
+    def test_record_assignment(self):
+        program = Let([VariableDeclaration('r', None, RecordCreation(TypeId('point'), {'x': IntegerValue(1),
+                                                                                     'y': IntegerValue(2)}))],
+                      [Assign(LValue('r', RecordLValue('y')), IntegerValue(5)),
+                       Multiply(LValue('r', RecordLValue('x')), LValue('r', RecordLValue('y')))])
+
+        result = program.evaluate(Environment())
+
+        self.assertEqual(IntegerValue(5), result)
+
+    def test_nested_for_loops(self):
+        program = Let([VariableDeclaration('sum', None, IntegerValue(0))],
+                      [For('i', IntegerValue(1), IntegerValue(3),
+                           For('j', IntegerValue(1), IntegerValue(3),
+                               Assign(LValue('sum'), Add(LValue('sum'), Multiply(LValue('i'), LValue('j')))))),
+                       LValue('sum')])
+
+        result = program.evaluate(Environment())
+
+        self.assertEqual(IntegerValue(36), result)
+
+    def test_step_limit(self):
+        program = While(IntegerValue(1), Sequence([]))
+        with self.assertRaises(LimitExceeded):
+            program.evaluate(Environment(Limits(max_steps=100)))
+
+    def test_depth_limit(self):
+        decl = FunctionDeclaration('f', [], None, FunctionCall('f', []))
+        env = Environment(Limits(max_depth=50))
+        env.set(decl.name, decl)
+        with self.assertRaises(LimitExceeded):
+            FunctionCall('f', []).evaluate(env)
+        self.assertEqual(-1, env.limits.depth)
+
+    def test_heap_limit(self):
+        limits = Limits(max_heap=10)
+        ArrayCreation(TypeId('intArray'), IntegerValue(10), IntegerValue(0)).evaluate(Environment(limits))
+        with self.assertRaises(LimitExceeded):
+            RecordCreation(TypeId('point'), {'x': IntegerValue(0)}).evaluate(Environment(limits))
+        self.assertEqual(10, limits.fresh().heap)
+
+    def test_interned_strings(self):
+        table = StringTable()
+        a = table.intern('abc')
+        self.assertIsNot(a, table.intern('abc'))  # each literal is a node of its own, with its own location
+        self.assertIs(a.string, table.intern('abc').string)
+        self.assertEqual(a.id, table.intern('abc').id)
+        self.assertIs(StringValue.character(ord('x')), StringValue.character(ord('x')))
+        self.assertEqual(IntegerValue(1), Equals(a, table.intern('abc')).evaluate())
+        self.assertEqual(IntegerValue(0), Equals(a, table.intern('abd')).evaluate())
+
+    def test_interned_and_uninterned_strings(self):
+        table = StringTable()
+        self.assertEqual(IntegerValue(1), Equals(table.intern('abc'), StringValue('abc')).evaluate())
+        self.assertEqual(IntegerValue(1), Equals(table.intern('x'), StringValue.character(ord('x'))).evaluate())
+        self.assertEqual(IntegerValue(1), Equals(table.intern('abc'), StringTable().intern('abc')).evaluate())
+        self.assertEqual(IntegerValue(1), NotEquals(StringValue('abc'), StringValue('ab')).evaluate())
+
+    def test_evaluate_int(self):
+        env = Environment()
+        env.set('a', IntegerValue(6))
+        condition = If(LessThan(LValue('a'), IntegerValue(7)), Multiply(LValue('a'), IntegerValue(7)), IntegerValue(0))
+        self.assertEqual(42, condition.evaluate_int(env))
+        self.assertEqual(IntegerValue(42), condition.evaluate(env))
+        self.assertEqual(1, NotEquals(StringValue('abc'), StringValue('ab')).evaluate_int(env))
+        equals = Equals(LValue('a'), IntegerValue(6))
+        equals.typed = True
+        self.assertEqual(1, equals.evaluate_int(env))
+
+    def test_typed_reads_record_exact_class(self):
+        recorded = []
+        original = src.ast.record_exact_class
+        src.ast.record_exact_class = lambda value, cls: recorded.append(cls)
+        try:
+            env = Environment()
+            env.set('a', IntegerValue(6))
+            add = Add(LValue('a'), IntegerValue(1))
+            condition = If(LessThan(LValue('a'), IntegerValue(7)), add, LValue('a'))
+            self.assertEqual(7, condition.evaluate_int(env))
+            self.assertEqual([], recorded)
+            for node in [condition, condition.condition, add]:
+                node.typed = True
+            self.assertEqual(7, condition.evaluate_int(env))
+            self.assertEqual([IntegerValue, IntegerValue], recorded)  # 'a' in the condition and in the sum
+        finally:
+            src.ast.record_exact_class = original
+
+    def test_short_circuit(self):
+        env = Environment()
+        env.set('a', ArrayValue(1, IntegerValue(0)))
+        out_of_bounds = Equals(LValue('a', ArrayLValue(IntegerValue(5))), IntegerValue(0))
+        self.assertEqual(IntegerValue(0), And(IntegerValue(0), out_of_bounds).evaluate(env))
+        self.assertEqual(IntegerValue(1), Or(IntegerValue(2), out_of_bounds).evaluate(env))
+        self.assertEqual(1, And(IntegerValue(2), Or(IntegerValue(0), IntegerValue(3))).evaluate_int(env))
+        with self.assertRaises(InterpretationError):
+            And(IntegerValue(1), out_of_bounds).evaluate(env)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+from src.ast import get_location, IntegerValue
+from src.parser import Parser
+from src.tools.jitlog import parse, report
+
+LOG = """[1a2b3c] {jit-tracing
+debug_merge_point(0, 0, 'queens.tig:9 For')
+~~~ ABORTING TRACING ABORT_TOO_LONG
+[1a2b3d] jit-tracing}
+[1a2b40] {jit-log-opt-loop
+# Loop 0 (queens.tig:18 For) : loop with 5 ops
+[p0, i1]
++110: label(p0, i1, descr=TargetToken(140))
+debug_merge_point(0, 0, 'queens.tig:18 For')
++120: i2 = int_lt(i1, 8)
+guard_true(i2, descr=<Guard0x7f10>) [p0, i1]
++130: i3 = int_add(i1, 1)
++140: jump(p0, i3, descr=TargetToken(140))
+--end of the loop--
+[1a2b50] jit-log-opt-loop}
+[1a2b60] {jit-log-opt-bridge
+# bridge out of Guard 0x7f10 with 3 ops
+[p0, i1]
++37: guard_false(i1, descr=<Guard0x7f20>) [p0]
++50: jump(p0, i1, descr=TargetToken(140))
+--end of the loop--
+[1a2b70] jit-log-opt-bridge}
+[1a2b80] {jit-backend-counts
+entry 0:1
+TargetToken(140):800
+bridge 32528:7
+[1a2b90] jit-backend-counts}
+[1a2ba0] {jit-summary
+Tracing:      	2	0.001
+Total # of loops:	1
+Total # of bridges:	1
+[1a2bb0] jit-summary}
+"""
+
+
+class TestJitLog(unittest.TestCase):
+    def setUp(self):
+        self.log = parse(LOG.splitlines(True))
+
+    def test_loops_and_bridges(self):
+        stats = self.log.locations['queens.tig:18 For']
+        self.assertEqual(1, stats.loops)
+        self.assertEqual(1, stats.bridges)
+        self.assertEqual(2, stats.guards)
+        self.assertEqual(4.0, stats.operations_per_trace())
+
+    def test_guard_failures(self):
+        self.assertEqual(7, self.log.locations['queens.tig:18 For'].guard_failures)
+
+    def test_aborts(self):
+        self.assertEqual(1, self.log.locations['queens.tig:9 For'].aborts)
+        self.assertEqual([('queens.tig:9 For', 'ABORT_TOO_LONG')], self.log.aborts)
+
+    def test_summary(self):
+        self.assertEqual(('Total # of loops', '1'), self.log.summary[1])
+        self.assertIn('queens.tig:18 For', report(self.log))
+
+    def test_printable_location(self):
+        program = Parser('let var a := 0 in\n  for i := 1 to 9 do a := a + i\nend', 'sum.tig').parse()
+        self.assertEqual('sum.tig:2 For', get_location(program.expressions[0]))
+        self.assertEqual('<unknown> IntegerValue', get_location(IntegerValue(42)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import signal
+import tempfile
+import unittest
+
+from src.main.jobs import ParallelRun
+from src.main.runner import SUCCESS, RUNTIME_ERROR
+from src.main.sockets import poll_readable
+
+
+class TestParallelRun(unittest.TestCase):
+    """Runs programs on real forked workers, with the output and the summary written to temporary files"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def program(self, name, source):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as file:
+            file.write(source)
+        return path
+
+    def run_programs(self, files, jobs, batch=False):
+        """Return the exit code of the run, what it printed and its summary"""
+        output_path = os.path.join(self.directory, 'output')
+        summary_path = os.path.join(self.directory, 'summary')
+        output_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        summary_fd = os.open(summary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            code = ParallelRun(files, jobs, batch, output_fd=output_fd, summary_fd=summary_fd).run()
+        finally:
+            os.close(output_fd)
+            os.close(summary_fd)
+        with open(output_path) as output, open(summary_path) as summary:
+            return code, output.read(), summary.read()
+
+    def test_output_in_argument_order(self):
+        slow = self.program('slow.tig', 'let var i := 0 in (while i < 20000 do i := i + 1; print("slow\\n")) end')
+        fast = self.program('fast.tig', 'print("fast\\n")')
+        code, output, summary = self.run_programs([slow, fast, fast], 2)
+        self.assertEqual(SUCCESS, code)
+        self.assertEqual('slow\nfast\nfast\n', output)
+        self.assertTrue(summary.startswith('3 programs: 3 ok, 0 failed'), summary)
+
+    def test_failure_is_isolated(self):
+        first = self.program('first.tig', 'print("first\\n")')
+        failing = self.program('failing.tig', 'let type a = array of int var a := a[2] of 0 in (print("a"); a[5]) end')
+        last = self.program('last.tig', 'print("last\\n")')
+        code, output, summary = self.run_programs([first, failing, last], 2)
+        self.assertEqual(RUNTIME_ERROR, code)
+        self.assertEqual('first\nalast\n', output)
+        self.assertTrue(summary.startswith('3 programs: 2 ok, 1 failed'), summary)
+        self.assertTrue('failed: %s: runtime-error' % failing in summary, summary)
+
+    def test_batch_json_lines(self):
+        ok = self.program('ok.tig', 'print("a")')
+        bad = self.program('bad.tig', 'let in')
+        code, output, _ = self.run_programs([ok, bad], 2, batch=True)
+        lines = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual([(ok, 'ok', 'a'), (bad, 'parse-error', '')],
+                         [(line['file'], line['status'], line['output']) for line in lines])
+        self.assertNotEqual(SUCCESS, code)
+
+    def test_dead_worker_is_replaced(self):
+        endless = self.program('endless.tig', 'while 1 do ()')
+        after = self.program('after.tig', 'print("after\\n")')
+        run = ParallelRun([endless, after], 1, True, output_fd=os.open(os.devnull, os.O_WRONLY))
+        try:
+            run.start_workers()
+            run.assign()
+            dead = run.workers[0].pid
+            os.kill(dead, signal.SIGKILL)
+            while run.finished < len(run.jobs):
+                run.read_workers(poll_readable(run.worker_fds(), -1))
+                run.assign()
+            self.assertNotEqual(dead, run.workers[0].pid)
+            self.assertEqual((RUNTIME_ERROR, 'Worker %d exited' % dead),
+                             (run.jobs[0].result.code, run.jobs[0].result.message))
+            self.assertEqual((SUCCESS, 'after\n'), (run.jobs[1].result.code, run.jobs[1].result.output))
+            self.assertEqual(2, run.workers[0].completed)
+        finally:
+            run.stop_workers()
+            os.close(run.output_fd)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.main.server import ProgramCache
+from src.main.util import create_environment_with_natives, output
+from src.modules import ModuleLoader, resolve_path
+from src.parser import Parser, ParseError
+from src.type_checker import type_check
+
+
+class TestModules(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.loader = ModuleLoader()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as file:
+            file.write(text)
+        return path
+
+    def parse(self, text, name='main.tig'):
+        parser = Parser(text, os.path.join(self.directory, name), loader=self.loader)
+        return parser.parse(), parser
+
+    def run_program(self, program):
+        output.capture()
+        program.evaluate(create_environment_with_natives())
+        return output.release()
+
+    def test_resolve_path(self):
+        self.assertEqual('lib/a.tig', resolve_path('a.tig', 'lib/main.tig'))
+        self.assertEqual('/a.tig', resolve_path('/a.tig', 'lib/main.tig'))
+        self.assertEqual('a.tig', resolve_path('a.tig', 'main.tig'))
+
+    def test_import(self):
+        self.write('lib.tig', 'function double(n: int): int = n * 2\nimport "base.tig"')
+        self.write('base.tig', 'var base := 21')
+        program, parser = self.parse('let import "lib.tig" in print(double(base)) end')
+        self.assertEqual(['FunctionDeclaration', 'VariableDeclaration'],
+                         [d.__class__.__name__ for d in program.declarations])
+        self.assertEqual('42', self.run_program(program))
+        self.assertEqual([os.path.join(self.directory, 'lib.tig')], [m.path for m in parser.modules])
+
+    def test_modules_are_parsed_once(self):
+        self.write('lib.tig', 'var a := 1')
+        first, _ = self.parse('let import "lib.tig" in a end')
+        second, _ = self.parse('let import "lib.tig" in a + 1 end')
+        self.assertEqual(1, self.loader.parses)
+        self.assertIs(first.declarations[0], second.declarations[0])
+
+    def test_changed_modules_are_parsed_again(self):
+        path = self.write('lib.tig', 'var a := 1')
+        _, parser = self.parse('let import "lib.tig" in a end')
+        self.write('lib.tig', 'var a := 22')
+        self.assertFalse(self.loader.are_current(parser.modules))
+        program, _ = self.parse('let import "lib.tig" in print(a) end')
+        self.assertEqual('22', self.run_program(program))
+        self.assertEqual(2, self.loader.parses)
+        os.utime(path, (0, 0))
+        self.parse('let import "lib.tig" in a end')
+        self.assertEqual(3, self.loader.parses)
+
+    def test_diamond(self):
+        self.write('d.tig', 'var count := (print("d"); 1)\nfunction sq(n: int): int = n * n')
+        self.write('b.tig', 'import "d.tig"\nfunction b(): int = sq(2)')
+        self.write('c.tig', 'import "d.tig"\nfunction c(): int = sq(3) + count')
+        program, _ = self.parse('let import "b.tig" import "c.tig" in print(b() + c()) end')
+        self.assertEqual(['VariableDeclaration', 'FunctionDeclaration', 'FunctionDeclaration', 'FunctionDeclaration'],
+                         [d.__class__.__name__ for d in program.declarations])
+        self.assertEqual([], type_check(program))
+        self.assertEqual('d14', self.run_program(program))
+        # an enclosing let's imports are in scope; a sibling let imports the module again
+        program, _ = self.parse('let import "d.tig" in (let import "b.tig" in b() end; let import "c.tig" in c() end) '
+                                'end')
+        inner = program.expressions[0].expressions
+        self.assertEqual(['FunctionDeclaration'], [d.__class__.__name__ for d in inner[0].declarations])
+        self.assertEqual(['FunctionDeclaration'], [d.__class__.__name__ for d in inner[1].declarations])
+        program, _ = self.parse('(let import "b.tig" in b() end; let import "c.tig" in c() end)')
+        self.assertEqual(3, len(program.expressions[1].declarations))
+
+    def test_cycles(self):
+        self.write('a.tig', 'import "b.tig"')
+        self.write('b.tig', 'import "a.tig"')
+        with self.assertRaises(ParseError) as raised:
+            self.parse('let import "a.tig" in 1 end')
+        self.assertIn('Import cycle', raised.exception.reason)
+        self.write('c.tig', 'import "main.tig"')
+        with self.assertRaises(ParseError):
+            self.parse('let import "c.tig" in 1 end')
+
+    def test_errors(self):
+        with self.assertRaises(ParseError) as raised:
+            self.parse('let import "missing.tig" in 1 end')
+        self.assertIn('Unable to read module', raised.exception.reason)
+        self.write('expression.tig', '1 + 2')
+        with self.assertRaises(ParseError):
+            self.parse('let import "expression.tig" in 1 end')
+        with self.assertRaises(ParseError):
+            Parser('let import "lib.tig" in 1 end').parse()
+
+    def test_program_cache_checks_modules(self):
+        self.write('lib.tig', 'var a := 1')
+        program, parser = self.parse('let import "lib.tig" in a end')
+        cache = ProgramCache(2, self.loader)
+        cache.put('source', program, parser.modules)
+        self.assertIs(program, cache.get('source'))
+        self.write('lib.tig', 'var a := 333')
+        self.assertIsNone(cache.get('source'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+
+from src.main.options import parse_options, OptionError
+
+
+class TestOptions(unittest.TestCase):
+    def test_files(self):
+        options = parse_options(['tiger-interpreter', 'a.tig', 'b.tig'])
+        self.assertEqual(['a.tig', 'b.tig'], options.files)
+        self.assertEqual(1, options.repeat)
+        self.assertFalse(options.report_iterations)
+
+    def test_value_after_equals(self):
+        options = parse_options(['tiger-interpreter', '--repeat=3', 'a.tig'])
+        self.assertEqual(3, options.repeat)
+        self.assertTrue(options.report_iterations)
+
+    def test_value_as_next_argument(self):
+        options = parse_options(['tiger-interpreter', 'a.tig', '--repeat', '5'])
+        self.assertEqual(5, options.repeat)
+        self.assertEqual(['a.tig'], options.files)
+
+    def test_missing_value(self):
+        with self.assertRaises(OptionError):
+            parse_options(['tiger-interpreter', 'a.tig', '--repeat'])
+
+    def test_invalid_value(self):
+        with self.assertRaises(OptionError):
+            parse_options(['tiger-interpreter', '--repeat=many', 'a.tig'])
+        with self.assertRaises(OptionError):
+            parse_options(['tiger-interpreter', '--repeat=0', 'a.tig'])
+
+    def test_batch(self):
+        options = parse_options(['tiger-interpreter', '--batch', 'a.tig', 'b.tig'])
+        self.assertTrue(options.batch)
+        self.assertEqual(['a.tig', 'b.tig'], options.files)
+
+    def test_jobs(self):
+        options = parse_options(['tiger-interpreter', '--jobs', '4', 'a.tig', 'b.tig'])
+        self.assertEqual(4, options.jobs)
+        self.assertEqual(0, parse_options(['tiger-interpreter', 'a.tig']).jobs)
+        with self.assertRaises(OptionError):
+            parse_options(['tiger-interpreter', '--jobs=0', 'a.tig'])
+
+    def test_limits(self):
+        options = parse_options(['tiger-interpreter', '--max-steps=1000', '--max-depth', '10', 'a.tig'])
+        self.assertEqual((1000, 10, 0), (options.max_steps, options.max_depth, options.max_heap))
+
+    def test_share_nodes(self):
+        self.assertTrue(parse_options(['tiger-interpreter', '--share-nodes', 'a.tig']).share_nodes)
+        self.assertFalse(parse_options(['tiger-interpreter', 'a.tig']).share_nodes)
+
+    def test_optimize(self):
+        options = parse_options(['tiger-interpreter', '--optimize', 'a.tig'])
+        self.assertEqual((True, False), (options.optimize, options.report_passes))
+        options = parse_options(['tiger-interpreter', '--report-passes', 'a.tig'])
+        self.assertEqual((True, True), (options.optimize, options.report_passes))
+
+    def test_type_check(self):
+        self.assertTrue(parse_options(['tiger-interpreter', '--type-check', 'a.tig']).type_check)
+        self.assertFalse(parse_options(['tiger-interpreter', 'a.tig']).type_check)
+
+    def test_stats(self):
+        self.assertEqual('text', parse_options(['tiger-interpreter', '--stats', 'a.tig']).stats)
+        options = parse_options(['tiger-interpreter', '--stats=json', 'a.tig'])
+        self.assertEqual('json', options.stats)
+        self.assertEqual(['a.tig'], options.files)
+        self.assertIsNone(parse_options(['tiger-interpreter', 'a.tig']).stats)
+        with self.assertRaises(OptionError):
+            parse_options(['tiger-interpreter', '--stats=yaml', 'a.tig'])
+
+    def test_explicit_stack(self):
+        self.assertTrue(parse_options(['tiger-interpreter', '--explicit-stack', 'a.tig']).explicit_stack)
+        options = parse_options(['tiger-interpreter', '--max-stack', '1000', 'a.tig'])
+        self.assertTrue(options.explicit_stack)
+        self.assertEqual(1000, options.max_stack)
+
+    def test_lazy_bodies(self):
+        self.assertTrue(parse_options(['tiger-interpreter', '--lazy-bodies', 'a.tig']).lazy_bodies)
+        self.assertFalse(parse_options(['tiger-interpreter', '--lazy-bodies', '--eager-bodies', 'a.tig']).lazy_bodies)
+
+    def test_tokenize_jobs(self):
+        self.assertEqual(1, parse_options(['tiger-interpreter', 'a.tig']).tokenize_jobs)
+        self.assertEqual(4, parse_options(['tiger-interpreter', '--tokenize-jobs', '4', 'a.tig']).tokenize_jobs)
+        with self.assertRaises(OptionError):
+            parse_options(['tiger-interpreter', '--tokenize-jobs=0', 'a.tig'])
+
+    def test_alloc_stats(self):
+        self.assertTrue(parse_options(['tiger-interpreter', '--alloc-stats', 'a.tig']).alloc_stats)
+
+    def test_missing_manifest(self):
+        with self.assertRaises(OptionError):
+            parse_options(['tiger-interpreter', '--manifest', '/nonexistent/manifest'])
+
+    def test_unknown_option(self):
+        with self.assertRaises(OptionError):
+            parse_options(['tiger-interpreter', '--fast', 'a.tig'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -224,6 +224,50 @@ class TestParsing(unittest.TestCase):
     def test_equality_of_lvalues(self):
         self.assertEqual(LValue('a'), LValue('a'))
 
+    def test_locations(self):
+        program = Parser('let var a := 1\nin\n  a + f(a)\nend', 'test.tig').parse()
+        self.assertEqual('test.tig:1', program.location.to_string())
+        self.assertEqual('test.tig:1', program.declarations[0].location.to_string())
+        addition = program.expressions[0]
+        self.assertEqual('test.tig:3', addition.location.to_string())
+        self.assertEqual(3, addition.right.location.line)
+
+    def test_string_literals_are_interned(self):
+        program = Parser('if "a" = "a" then\n"b" else\n"a"', 'test.tig').parse()
+        left, right, other = program.condition.left, program.condition.right, program.body_if_false
+        self.assertIsNot(left, other)
+        self.assertEqual((left.table, left.id), (other.table, other.id))
+        self.assertIs(left.string, right.string)
+        self.assertNotEqual(left.id, program.body_if_true.id)
+        self.assertEqual('test.tig:3', other.location.to_string())
+
+    def test_lazy_function_bodies(self):
+        text = 'let function f(a: int): int = let var b := (a + 1) in b * 2 end\n' \
+               '    function g() = h(1, 2)\n' \
+               '    var c := 3\n' \
+               'in f(c) end'
+        lazy = Parser(text, 'test.tig', lazy=True).parse()
+        f, g = lazy.declarations[0], lazy.declarations[1]
+        self.assertIsNone(f.body)
+        self.assertIsNone(g.body)
+        self.assertEqual(VariableDeclaration('c', None, IntegerValue(3)), lazy.declarations[2])
+        eager = Parser(text, 'test.tig').parse()
+        self.assertEqual(eager.declarations[0].body, f.parsed_body())
+        self.assertEqual(eager.declarations[1].body, g.parsed_body())
+        self.assertIs(f.body, f.parsed_body())
+        self.assertEqual('test.tig:2', g.body.location.to_string())
+
+    def test_lazy_function_body_errors(self):
+        program = Parser('let function f() = (if 1 then) function g() = 1 in g() end', lazy=True).parse()
+        self.assertEqual(IntegerValue(1), program.declarations[1].parsed_body())
+        with self.assertRaises(ParseError):
+            program.declarations[0].parsed_body()
+        self.assertParseFails('let function f() = (if 1 then) in 1 end')
+
+    def test_lazy_modules(self):
+        declarations = Parser('function f() = 1 function g(a: int) = f() + a', lazy=True).parse_module()
+        self.assertEqual(Add(FunctionCall('f', []), LValue('a')), declarations[1].parsed_body())
+
 
 if __name__ == '__main__':
     unittest.main()
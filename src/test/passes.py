@@ -0,0 +1,237 @@
+import unittest
+
+from src.ast import Sequence, VariableDeclaration, For, While, If, Let, FunctionCall, IntegerValue
+from src.main.util import create_environment_with_natives, native_functions, output
+from src.parser import Parser
+from src.passes.analysis import count_references, is_pure, Effects
+from src.passes.dead_code import eliminate_dead_code
+from src.passes.inline import inline_functions, inlinable_functions, INLINE_DEPTH
+from src.passes.loops import hoist_loop_invariants
+from src.passes.optimizer import optimize
+
+
+def parse(source):
+    return Parser(source).parse()
+
+
+def evaluate(program):
+    return program.evaluate(create_environment_with_natives())
+
+
+class TestAnalysis(unittest.TestCase):
+    def test_count_references(self):
+        counts = count_references(parse('let type t = array of int var a : t := t[1] of 0 in a[0] := f(a) end'))
+        self.assertEqual({'t': 2, 'int': 1, 'a': 2, 'f': 1}, counts)
+
+    def test_is_pure(self):
+        self.assertTrue(is_pure(parse('(1 + a * 2; "s"; if a then b else c)')))
+        self.assertTrue(is_pure(parse('a / 2')))
+        self.assertFalse(is_pure(parse('a / b')))
+        self.assertFalse(is_pure(parse('a[1]')))
+        self.assertFalse(is_pure(parse('a := 1')))
+        self.assertFalse(is_pure(parse('1 + f(2)')))
+        self.assertFalse(is_pure(parse('while 1 do 2')))
+
+
+class TestDeadCode(unittest.TestCase):
+    def assertEliminatesTo(self, source, expected_source, expected_report=None):
+        report = []
+        program = eliminate_dead_code(parse(source), report)
+        self.assertEqual(parse(expected_source), program)
+        if expected_report is not None:
+            self.assertEqual(expected_report, report)
+
+    def test_unused_declarations(self):
+        self.assertEliminatesTo('let type t = int var a := 1 function f() = 2 var b := 3 in b end',
+                                'let var b := 3 in b end',
+                                ['<code string>:1: removed unused type t', '<code string>:1: removed unused variable a',
+                                 '<code string>:1: removed unused function f'])
+
+    def test_impure_initializers_are_kept(self):
+        self.assertEliminatesTo('let var a := print("x") var b := c[1] in 0 end',
+                                'let var a := print("x") var b := c[1] in 0 end')
+
+    def test_recursive_functions(self):
+        self.assertEliminatesTo('let function f(n: int): int = f(n - 1) in 0 end', 'let in 0 end')
+        self.assertEliminatesTo('let function f(n: int): int = f(n - 1) in f(1) end',
+                                'let function f(n: int): int = f(n - 1) in f(1) end')
+
+    def test_declarations_used_only_by_dead_code(self):
+        self.assertEliminatesTo('let type t = array of int var a : t := t[2] of 0 var b := a in 0 end', 'let in 0 end')
+
+    def test_discarded_values(self):
+        self.assertEliminatesTo('(1; a; print("x"); a + 1; 2)', '(print("x"); 2)')
+        self.assertEliminatesTo('let var a := 1 in a; a := 2; a end', 'let var a := 1 in a := 2; a end')
+
+    def test_references_from_called_functions(self):
+        # functions see the variables of their callers, so 'a' is used by 'f' even though it is declared elsewhere
+        source = 'let function f(): int = a in let var a := 42 in f() end end'
+        program = eliminate_dead_code(parse(source))
+        self.assertEqual(parse(source), program)
+        self.assertEqual(42, evaluate(program).integer)
+
+
+class TestEffects(unittest.TestCase):
+    def test_calls_rebind_parameters_and_assigned_names(self):
+        effects = Effects(parse('let function f(a: int) = (b := a; c[0] := 1; g()) function g() = d := 1 '
+                                'function h() = let var e := 1 in e := 2 end in 0 end'), native_functions())
+        self.assertEqual(['a', 'b', 'd'], sorted(effects.functions['f'].keys()))
+        self.assertEqual(['d'], sorted(effects.functions['g'].keys()))
+        self.assertEqual([], sorted(effects.functions['h'].keys()))
+        self.assertEqual(['string'], sorted(effects.functions['print'].keys()))
+
+    def test_bound_names(self):
+        effects = Effects(parse('let function f() = x := 1 in 0 end'))
+        bound = effects.bound_names(parse('(a := 1; f(); let var b := 2 in b end; for i := 1 to 2 do ())'))
+        self.assertEqual(['a', 'b', 'i', 'x'], sorted(bound.keys()))
+
+
+class TestLoopInvariants(unittest.TestCase):
+    def hoist(self, source):
+        report = []
+        program = hoist_loop_invariants(parse(source), report, native_functions())
+        return program, report
+
+    def guarded(self, program):
+        """The entry test, the declarations of the temporaries and the loop of a loop with hoisted invariants"""
+        self.assertIsInstance(program, If)
+        self.assertEqual(Sequence([]), program.body_if_false)
+        let = program.body_if_true
+        self.assertIsInstance(let, Let)
+        self.assertEqual(1, len(let.expressions))
+        return program.condition, let.declarations, let.expressions[0]
+
+    def test_hoists_out_of_for_body(self):
+        program, report = self.hoist('for i := 0 to 9 do a[i + (n - 1)] := n * 2')
+        entry, declarations, loop = self.guarded(program)
+        self.assertEqual(parse('0 <= 9'), entry)
+        self.assertEqual([VariableDeclaration('$invariant1', None, parse('n * 2')),
+                          VariableDeclaration('$invariant2', None, parse('n - 1'))], declarations)
+        self.assertEqual(parse('for i := 0 to 9 do a[i + (XX2)] := XX1').to_string().replace('XX', '$invariant'),
+                         loop.to_string())
+        self.assertEqual(2, len(report))
+
+    def test_hoists_out_of_while_condition(self):
+        program, report = self.hoist('while d <= n - 1 do d := d + 1')
+        entry, declarations, loop = self.guarded(program)
+        self.assertEqual(parse('d <= n - 1'), entry)
+        self.assertEqual([VariableDeclaration('$invariant1', None, parse('n - 1'))], declarations)
+        self.assertIsInstance(loop, While)
+
+    def test_impure_entry_tests(self):
+        for source in ['while f() < n - 1 do d := d + 1',
+                       'for i := 0 to f() do a := n * 2']:
+            program, report = self.hoist('let function f(): int = 1 in %s end' % source)
+            self.assertEqual([], report, source)
+
+    def test_loops_that_do_not_run(self):
+        # 'limit' is not bound: the original never reads it, so neither may the hoisted invariant
+        for loop in ['while i < k do (print(limit * 2); i := i + 1)', 'for j := 1 to k do print(limit * 2)']:
+            source = 'let var i := 0 function show(k: int) = %s in show(0) end' % loop
+            output.capture()
+            evaluate(hoist_loop_invariants(parse(source), None, native_functions()))
+            self.assertEqual('', output.release(), loop)
+
+    def test_temporaries_end_with_the_loop(self):
+        env = create_environment_with_natives()
+        env.set('n', IntegerValue(2))
+        env.set('a', IntegerValue(0))
+        hoist_loop_invariants(parse('for i := 0 to 2 do a := n * 2'), None, native_functions()).evaluate(env)
+        self.assertEqual(IntegerValue(4), env.get('a'))
+        self.assertIsNone(env.get('$invariant1'))
+
+    def test_keeps_variant_expressions(self):
+        for source in ['for i := 0 to 9 do a := i * 2',
+                       'while d < 10 do (d := d + 1; b := d - 1)',
+                       'while d < 10 do (f(); b := n - 1; d := d + 1)',
+                       'for i := 0 to 9 do let var k := 1 in print(k + 1) end',
+                       'while a < 10 do a := a + b[1]',
+                       'while a < 10 do a := a + 1 / b']:
+            program, report = self.hoist('let function f() = n := 2 in %s end' % source)
+            self.assertEqual([], report, source)
+
+    def test_calls_rebinding_parameters(self):
+        # calling f binds its parameter 'n' with Environment.set, overwriting the caller's 'n'
+        program, report = self.hoist('let function f(n: int) = () in while a < 10 do (f(a); a := a + n - 1) end')
+        self.assertEqual([], report)
+
+    def test_inner_loops(self):
+        program, report = self.hoist('for i := 0 to 9 do for j := 0 to 9 do a := a + (n - 1) + (i * 2)')
+        _, _, outer = self.guarded(program)
+        _, _, inner = self.guarded(outer.body)
+        self.assertIsInstance(inner, For)
+        self.assertEqual(2, len(report))
+
+    def test_evaluates_the_same(self):
+        source = '''let var n := 5 var total := 0 var d := 0 in
+                      for i := 0 to n - 1 do for j := 0 to n * 2 do total := total + i * (n + 1) + j;
+                      while d < n - 1 do d := d + 1;
+                      print(total); print(d)
+                    end'''
+        output.capture()
+        evaluate(parse(source))
+        expected = output.release()
+        output.capture()
+        evaluate(hoist_loop_invariants(parse(source), None, native_functions()))
+        self.assertEqual(expected, output.release())
+
+
+class TestInlining(unittest.TestCase):
+    def inlinable(self, source):
+        return sorted(inlinable_functions(parse(source), native_functions()).keys())
+
+    def test_inlines_with_fresh_parameter_names(self):
+        report = []
+        program = inline_functions(parse('let function sq(x: int): int = x * x in sq(3) end'), report,
+                                   native_functions())
+        inlined = program.expressions[0]
+        self.assertIsInstance(inlined, Let)
+        self.assertEqual('$inline1_x', inlined.declarations[0].name)
+        self.assertEqual(parse('let var QQx: int := 3 in QQx * QQx end').to_string().replace('QQ', '$inline1_'),
+                         inlined.to_string())
+        self.assertEqual(['<code string>:1: inlined sq'], report)
+
+    def test_recursive_functions_are_not_inlined(self):
+        self.assertEqual([], self.inlinable('let function f(n: int): int = f(n) in 0 end'))
+        self.assertEqual([], self.inlinable('let function f(a: int): int = g(a) function g(b: int): int = f(b) in 0 end'))
+
+    def test_parameters_used_elsewhere_are_not_renamed(self):
+        # 'g' reads 'a' from the environment of its caller 'f'
+        self.assertEqual(['g'], self.inlinable('let function g(): int = a function f(a: int): int = g() in 0 end'))
+        # another declaration of the same name may be overwritten when 'f' binds its parameter
+        self.assertEqual([], self.inlinable('let var a := 1 function f(a: int): int = a in 0 end'))
+        # print binds its parameter 'string', overwriting f's
+        self.assertEqual([], self.inlinable('let function f(string: int) = print(string) in 0 end'))
+
+    def test_ambiguous_and_large_functions_are_not_inlined(self):
+        self.assertEqual([], self.inlinable('(let function f(): int = 1 in 0 end; let function f(): int = 2 in 0 end)'))
+        self.assertEqual([], self.inlinable('let function f(): int = %s in 0 end' % ' + '.join(['1'] * 30)))
+
+    def test_depth_limit(self):
+        source = 'let %s in f0() end' % ' '.join(['function f%d(): int = f%d()' % (i, i + 1) for i in range(5)] +
+                                                ['function f5(): int = 42'])
+        program = inline_functions(parse(source), None, native_functions())
+        node = program.expressions[0]
+        for depth in range(INLINE_DEPTH):
+            self.assertIsInstance(node, Let)
+            node = node.expressions[0]
+        self.assertIsInstance(node, FunctionCall)
+        self.assertEqual(42, evaluate(program).integer)
+
+    def test_evaluates_the_same(self):
+        source = '''let function isdigit(c: int): int = if c >= 48 then (if c <= 57 then 1 else 0) else 0
+                        function max(a: int, b: int): int = if a > b then a else b
+                        var count := 0 var best := 0 in
+                      for i := 40 to 60 do (count := count + isdigit(i); best := max(best, i * 2));
+                      print(count); print(best)
+                    end'''
+        output.capture()
+        evaluate(parse(source))
+        expected = output.release()
+        output.capture()
+        evaluate(optimize(parse(source), None, native_functions()))
+        self.assertEqual(expected, output.release())
+
+
+if __name__ == '__main__':
+    unittest.main()
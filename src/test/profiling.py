@@ -0,0 +1,46 @@
+import unittest
+
+from src.ast import IntegerValue
+from src.main.util import create_environment_with_natives
+from src.parser import Parser
+from src.profiler import Profiler, instrument
+
+
+class TestProfiling(unittest.TestCase):
+    PROGRAM = """let
+  function double(n : int) : int =
+    n + n
+in
+  double(1) + double(2)
+end"""
+
+    def profile(self, text):
+        profiler = Profiler()
+        program = instrument(Parser(text, 'test.tig').parse(), profiler)
+        result = program.evaluate(create_environment_with_natives())
+        profiler.finish()
+        return profiler, result
+
+    def test_result_unchanged(self):
+        _, result = self.profile(self.PROGRAM)
+        self.assertEqual(IntegerValue(6), result)
+
+    def test_counts_by_location(self):
+        profiler, _ = self.profile(self.PROGRAM)
+        report = profiler.report()
+        self.assertIn('           6  test.tig:3', report)  # the addition and its two operands, evaluated twice
+        self.assertIn('           3  test.tig:5', report)  # the addition and both calls
+
+    def test_function_calls(self):
+        profiler, _ = self.profile(self.PROGRAM)
+        self.assertEqual(2, profiler.functions['double'].calls)
+        self.assertTrue(profiler.functions['main'].inclusive >= profiler.functions['double'].inclusive)
+
+    def test_collapsed_stacks(self):
+        profiler, _ = self.profile(self.PROGRAM)
+        stacks = [line.split(' ')[0] for line in profiler.collapsed().splitlines()]
+        self.assertEqual(['main', 'main;double'], sorted(stacks))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import os
+import shutil
+import signal
+import tempfile
+import time
+import unittest
+
+from src.main.client import Client, LocalClient
+from src.main.protocol import FrameReader, ProtocolError, encode_frame, encode_exit, decode_exit, RUN, STOP
+from src.environment import Limits
+from src.main.runner import SUCCESS, USAGE_ERROR, PARSE_ERROR, RUNTIME_ERROR, LIMIT_EXCEEDED
+from src.main.server import ProgramCache, Server, content_hash
+from src.main.util import Stream
+
+
+class ListStream(Stream):
+    def __init__(self):
+        self.writes = []
+
+    def write(self, string):
+        self.writes.append(string)
+
+
+class TestProtocol(unittest.TestCase):
+    def test_frames_split_across_reads(self):
+        reader = FrameReader()
+        data = encode_frame('RUN', 3, 'print("a\\n")') + encode_exit(4, 43, 'Out of bounds')
+        reader.feed(data[:5])
+        self.assertIsNone(reader.next())
+        reader.feed(data[5:])
+        first = reader.next()
+        self.assertEqual(('RUN', 3, 'print("a\\n")'), (first.kind, first.id, first.payload))
+        second = reader.next()
+        self.assertEqual((43, 'Out of bounds'), decode_exit(second.payload))
+        self.assertIsNone(reader.next())
+
+    def test_malformed_header(self):
+        reader = FrameReader()
+        reader.feed('RUN x 3\nabc')
+        with self.assertRaises(ProtocolError):
+            reader.next()
+
+
+class TestProgramCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = ProgramCache(2)
+        cache.put('a', 'program a')
+        cache.put('b', 'program b')
+        self.assertEqual('program a', cache.get('a'))
+        cache.put('c', 'program c')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('program a', cache.get('a'))
+        self.assertEqual('program c', cache.get('c'))
+        self.assertEqual(2, len(cache))
+        self.assertEqual((3, 1), (cache.hits, cache.misses))
+
+    def test_content_hash_is_stable(self):
+        self.assertEqual(content_hash('1 + 2'), content_hash('1 ' + '+ 2'))
+        self.assertEqual(0x811c9dc5, content_hash(''))
+
+
+class TestLocalClient(unittest.TestCase):
+    def test_run(self):
+        stream = ListStream()
+        reply = LocalClient().run('(print("a"); print("b"); 42)', stream)
+        self.assertEqual(SUCCESS, reply.code)
+        self.assertEqual('abIntegerValue(42)\n', reply.output)
+        self.assertEqual(['a', 'b', 'IntegerValue(42)\n'], stream.writes)
+
+    def test_reuses_parsed_programs(self):
+        client = LocalClient()
+        client.run('print("a")')
+        reply = client.run('print("a")')
+        self.assertEqual('a', reply.output)
+        self.assertEqual((1, 1), (client.worker.cache.hits, client.worker.cache.misses))
+
+    def test_imports_are_relative_to_each_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            mains = []
+            for name, value in [('a', '1'), ('b', '2')]:
+                os.mkdir(os.path.join(directory, name))
+                with open(os.path.join(directory, name, 'lib.tig'), 'w') as lib:
+                    lib.write('var x := "%s"' % value)
+                main = os.path.join(directory, name, 'main.tig')
+                with open(main, 'w') as program:
+                    program.write('let import "lib.tig" in print(x) end')
+                mains.append(main)
+            client = LocalClient()
+            self.assertEqual(['1', '2', '1', '2'], [client.run_file(main).output for main in mains + mains])
+            self.assertEqual((2, 2), (client.worker.cache.hits, client.worker.cache.misses))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_errors(self):
+        client = LocalClient()
+        self.assertEqual(PARSE_ERROR, client.run('let in').code)
+        reply = client.run('let type a = array of int var a := a[1] of 0 in a[1] end')
+        self.assertEqual(RUNTIME_ERROR, reply.code)
+        self.assertEqual('Array index 1 out of bounds [0, 1)', reply.message)
+        self.assertEqual('a', client.run('print("a")').output)
+
+    def test_limits_apply_to_every_run(self):
+        client = LocalClient(limits=Limits(max_steps=1000))
+        self.assertEqual(LIMIT_EXCEEDED, client.run('while 1 do ()').code)
+        self.assertEqual(SUCCESS, client.run('for i := 1 to 900 do ()').code)
+        self.assertEqual(SUCCESS, client.run('for i := 1 to 900 do ()').code)
+
+
+class TestServer(unittest.TestCase):
+    """Runs a real server, forked, on a socket in a temporary directory"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tiger.sock')
+        self.pid = 0
+
+    def tearDown(self):
+        if self.pid:
+            os.kill(self.pid, signal.SIGKILL)  # its workers exit once their requests' pipe closes
+            os.waitpid(self.pid, 0)
+        shutil.rmtree(self.directory)
+
+    def start(self, allow_stop=False):
+        self.pid = os.fork()
+        if self.pid == 0:
+            try:
+                null = os.open(os.devnull, os.O_WRONLY)
+                os.dup2(null, 2)
+                Server(self.path, 1, 4, allow_stop=allow_stop).run()
+            finally:
+                os._exit(0)
+        while True:  # the socket exists once bound, but only accepts connections once listening
+            try:
+                Client(self.path).close()
+                return
+            except (OSError, IOError):
+                if os.waitpid(self.pid, os.WNOHANG)[0] != 0:
+                    self.pid = 0
+                    self.fail('The server exited')
+                time.sleep(0.01)
+
+    def client(self):
+        client = Client(self.path)
+        client.socket.socket.settimeout(30)  # rather than hang if the server is stuck
+        return client
+
+    def test_client_not_reading_does_not_block_others(self):
+        self.start()
+        stalled = self.client()
+        line = 'x' * 1000
+        stalled.socket.sendall(encode_frame(RUN, 0, 'for i := 1 to 4000 do print("%s")' % line))
+        other = self.client()
+        reply = other.run('print("b")')
+        self.assertEqual((SUCCESS, 'b'), (reply.code, reply.output))
+        reader = FrameReader()
+        received = 0
+        while True:
+            frame = reader.next()
+            if frame is None:
+                reader.feed(stalled.socket.recv(65536))
+            elif frame.kind == 'EXIT':
+                break
+            else:
+                received += len(frame.payload)
+        self.assertEqual(4000 * len(line), received)
+
+    def test_stop_needs_allow_stop(self):
+        self.start()
+        client = self.client()
+        reply = client.request(STOP, '', None)
+        self.assertEqual(USAGE_ERROR, reply.code)
+        self.assertEqual('a', client.run('print("a")').output)
+
+    def test_stop(self):
+        self.start(allow_stop=True)
+        client = self.client()
+        client.stop()
+        _, status = os.waitpid(self.pid, 0)
+        self.pid = 0
+        self.assertEqual(0, status)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from src.ast import Add, IntegerValue, LValue, FunctionCall
+from src.main.util import create_environment_with_natives
+from src.parser import Parser
+
+
+def parse(source, share=True):
+    parser = Parser(source, None, share)
+    return parser.parse(), parser.nodes
+
+
+class TestSharing(unittest.TestCase):
+    def test_identical_sub_trees_are_shared(self):
+        program, nodes = parse('(r + c; r + c; ord("0"); ord("0"))')
+        expressions = program.expressions
+        self.assertIs(expressions[0], expressions[1])
+        self.assertIs(expressions[2], expressions[3])
+        self.assertEqual(LValue('r'), expressions[0].left)
+        self.assertEqual(5, nodes.shared)  # r, c, r + c, "0" and ord("0")
+
+    def test_leaves_are_shared_across_parents(self):
+        program, nodes = parse('(a + 1; b + 1)')
+        self.assertIsNot(program.expressions[0], program.expressions[1])
+        self.assertIs(program.expressions[0].right, program.expressions[1].right)
+
+    def test_different_trees_are_not_shared(self):
+        program, nodes = parse('(1 + 2; 2 + 1; "1"; 1)')
+        expressions = program.expressions
+        self.assertIsNot(expressions[0], expressions[1])
+        self.assertIsNot(expressions[2], expressions[3])
+        self.assertEqual(3, nodes.shared)  # only the integer leaves
+
+    def test_shared_tree_equals_unshared_tree(self):
+        source = 'let var a := 1 in (a + 1) * (a + 1) end'
+        shared, nodes = parse(source)
+        unshared, none = parse(source, False)
+        self.assertIsNone(none)
+        self.assertEqual(unshared, shared)
+        self.assertEqual(unshared.hash(), shared.hash())
+        self.assertEqual(Add(LValue('a'), IntegerValue(1)), shared.expressions[0].left.expressions[0])
+
+    def test_shared_program_evaluates(self):
+        source = 'let var a := 0 in (for i := 1 to 3 do a := a + i; for i := 1 to 3 do a := a + i; a) end'
+        program, nodes = parse(source)
+        self.assertTrue(nodes.shared > 0)
+        self.assertEqual(IntegerValue(12), program.evaluate(create_environment_with_natives()))
+
+    def test_shared_nodes_keep_first_location(self):
+        program, nodes = parse('(f(1);\nf(1))')
+        call = program.expressions[1]
+        self.assertIsInstance(call, FunctionCall)
+        self.assertEqual(1, call.location.line)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import unittest
+
+from src.ast import *
+from src.environment import Environment, LimitExceeded
+from src.main.util import create_environment_with_natives, output
+from src.parser import Parser
+from src.profiler import Profiler, instrument
+from src.stack_evaluator import evaluate_with_stack
+
+PRINT_TESTS_DIRECTORY = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'print-tests')
+
+
+class TestStackEvaluator(unittest.TestCase):
+    def evaluate(self, code):
+        return evaluate_with_stack(Parser(code).parse(), create_environment_with_natives())
+
+    def run_both(self, program):
+        """Return what the recursive and the explicit-stack evaluators print and return, or None if the recursive one
+        fails"""
+        results = []
+        for evaluate in [lambda env: program.evaluate(env), lambda env: evaluate_with_stack(program, env)]:
+            output.capture()
+            try:
+                value = evaluate(create_environment_with_natives())
+            except Exception:
+                output.release()
+                return None
+            results.append((output.release(), value.to_string() if value is not None else None))
+        return results
+
+    def test_print_tests(self):
+        compared = 0
+        for name in sorted(os.listdir(PRINT_TESTS_DIRECTORY)):
+            if not name.endswith('.tig'):
+                continue
+            with open(os.path.join(PRINT_TESTS_DIRECTORY, name)) as file:
+                results = self.run_both(Parser(file.read(), name).parse())
+            if results is not None:
+                compared += 1
+                self.assertEqual(results[0], results[1], name)
+        self.assertTrue(compared > 10)
+
+    def test_expressions(self):
+        self.assertEqual(IntegerValue(7), self.evaluate('1 + 2 * 3'))
+        self.assertEqual(IntegerValue(1), self.evaluate('let var s := "a" in s = "a" end'))
+        self.assertEqual(IntegerValue(10), self.evaluate('let var a := 0 in (for i := 1 to 4 do a := a + i); a end'))
+        self.assertEqual(IntegerValue(16), self.evaluate('let var a := 1 in while a < 10 do a := a * 2; a end'))
+        self.assertEqual(IntegerValue(2), self.evaluate('if 1 > 2 then 1 else 2'))
+
+    def test_short_circuit(self):
+        counted = 'let var n := 0 function f(v: int): int = (n := n + 1; v) in (%s; n) end'
+        self.assertEqual(IntegerValue(0), self.evaluate(counted % '0 & f(1)'))
+        self.assertEqual(IntegerValue(0), self.evaluate(counted % '1 | f(1)'))
+        self.assertEqual(IntegerValue(2), self.evaluate(counted % '(1 & f(1)) + (0 | f(0))'))
+        self.assertEqual(IntegerValue(1), self.evaluate('2 & 3'))
+        self.assertEqual(IntegerValue(0), self.evaluate('0 | 0'))
+
+    def test_lvalues(self):
+        program = Let([VariableDeclaration('a', None, ArrayCreation(TypeId('intArray'), IntegerValue(3),
+                                                                    IntegerValue(0))),
+                       VariableDeclaration('r', None, RecordCreation(TypeId('rec'), {'x': IntegerValue(1),
+                                                                                     'y': LValue('a')}))],
+                      [Assign(LValue('a', ArrayLValue(Add(IntegerValue(1), IntegerValue(1)))), IntegerValue(42)),
+                       Assign(LValue('r', RecordLValue('x')), IntegerValue(5)),
+                       Assign(LValue('r', RecordLValue('y', ArrayLValue(IntegerValue(0)))), IntegerValue(3)),
+                       Add(Add(LValue('a', ArrayLValue(IntegerValue(2))), LValue('r', RecordLValue('x'))),
+                           LValue('r', RecordLValue('y', ArrayLValue(IntegerValue(0)))))])
+        self.assertEqual(IntegerValue(50), evaluate_with_stack(program, Environment()))
+
+    def test_native_function_call(self):
+        decl = NativeFunctionDeclaration('square', [FunctionParameter('a', TypeId('int'))], TypeId('int'),
+                                         lambda a: IntegerValue(a.integer * a.integer))
+        env = Environment()
+        env.set(decl.name, decl)
+        self.assertEqual(IntegerValue(49), evaluate_with_stack(FunctionCall('square', [IntegerValue(7)]), env))
+
+    def test_deep_recursion(self):
+        program = Parser('let function down(n: int): int = if n = 0 then 0 else (let var k := n in 1 + down(k - 1) '
+                         'end) in down(300) end').parse()
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(len_of_stack() + 100)
+        try:
+            self.assertEqual(IntegerValue(300), evaluate_with_stack(program, create_environment_with_natives()))
+            with self.assertRaises(RuntimeError):  # RecursionError, under Python 3
+                program.evaluate(create_environment_with_natives())
+        finally:
+            sys.setrecursionlimit(limit)
+
+    def test_recursive_sum(self):
+        # 20000 calls deep: finding the function and 'n' must not cost a look into each level of the calls below
+        with open(os.path.join(PRINT_TESTS_DIRECTORY, 'recursiveSum.tig')) as file:
+            program = Parser(file.read(), 'recursiveSum.tig').parse()
+        output.capture()
+        try:
+            evaluate_with_stack(program, create_environment_with_natives())
+        finally:
+            printed = output.release()
+        self.assertEqual('20000', printed)
+
+    def test_max_frames(self):
+        program = Parser('let function f(n: int): int = if n = 0 then 0 else f(n - 1) in f(100) end').parse()
+        with self.assertRaises(LimitExceeded):
+            evaluate_with_stack(program, create_environment_with_natives(), 50)
+        self.assertEqual(IntegerValue(0), evaluate_with_stack(program, create_environment_with_natives(), 1000))
+
+    def test_profiled(self):
+        code = 'let function f(n: int): int = if n = 0 then 0 else f(n - 1) in f(5) end'
+        recursive = Profiler()
+        instrument(Parser(code).parse(), recursive).evaluate(create_environment_with_natives())
+        stack = Profiler()
+        evaluate_with_stack(instrument(Parser(code).parse(), stack), create_environment_with_natives())
+        self.assertEqual([wrapper.evaluations for wrapper in recursive.wrappers],
+                         [wrapper.evaluations for wrapper in stack.wrappers])
+        self.assertEqual(6, stack.functions['f'].calls)
+
+
+def len_of_stack():
+    frame = sys._getframe()
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import unittest
+
+from src.counters import counters
+from src.main.stats import RunStats, PhaseTime
+from src.main.util import create_environment_with_natives
+from src.parser import Parser
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        counters.__init__()
+        counters.enable()
+
+    def tearDown(self):
+        counters.__init__()
+
+    def test_counters(self):
+        program = Parser('let function f(n: int): int = n + 1 var a := 0 in '
+                         '(for i := 1 to 3 do a := f(a)); (while a < 5 do a := f(a)); a end').parse()
+        self.assertEqual(5, program.evaluate(create_environment_with_natives()).integer)
+        self.assertEqual(5, counters.calls)
+        self.assertEqual(5, counters.iterations)
+
+    def test_disabled(self):
+        counters.__init__()
+        Parser('let function f(n: int): int = n var a := 0 in for i := 1 to 3 do a := f(i) end').parse().evaluate(
+            create_environment_with_natives())
+        self.assertEqual(0, counters.calls)
+        self.assertEqual(0, counters.iterations)
+
+    def measured(self):
+        stats = RunStats()
+        stats.phases = [PhaseTime('read', 0.000012, 0.00001), PhaseTime('parse', 0.5, 0.25)]
+        stats.bytes_read = 100
+        stats.tokens = 20
+        stats.nodes = 10
+        counters.calls = 3
+        return stats
+
+    def test_report(self):
+        self.assertEqual(['Phases (in microseconds):',
+                          '        wall         cpu  phase',
+                          '          12          10  read',
+                          '      500000      250000  parse',
+                          'Bytes read: 100',
+                          'Tokens: 20',
+                          'AST nodes: 10',
+                          'Function calls: 3',
+                          'Loop iterations: 0'], self.measured().report().splitlines())
+
+    def test_json(self):
+        self.assertEqual({'phases': [{'name': 'read', 'wall_us': 12, 'cpu_us': 10},
+                                     {'name': 'parse', 'wall_us': 500000, 'cpu_us': 250000}],
+                          'bytes_read': 100, 'tokens': 20, 'nodes': 10, 'calls': 3, 'iterations': 0},
+                         json.loads(self.measured().to_json()))
+
+    def test_phases(self):
+        stats = RunStats()
+        stats.begin()
+        stats.end('read')
+        self.assertEqual(['read'], [phase.name for phase in stats.phases])
+        self.assertTrue(stats.phases[0].wall >= 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+
+from src.ast import Let, TypeDeclaration, RecordType, TypeId, VariableDeclaration, NilValue, Equals, LValue
+from src.main.util import create_environment_with_natives
+from src.parser import Parser
+from src.test.util import parse_file, list_test_files
+from src.type_checker import type_check, specialize, INT, STRING, UNIT
+from src.visitor import Visitor
+
+
+def parse(source):
+    return Parser(source).parse()
+
+
+def errors_of(source):
+    return [error.reason for error in type_check(parse(source))]
+
+
+class Typed(Visitor):
+    def __init__(self):
+        self.typed = []
+
+    def enter(self, node):
+        if node.typed:
+            self.typed.append(node.__class__.__name__)
+        return True
+
+
+class TestTypeChecker(unittest.TestCase):
+    def assertWellTyped(self, source):
+        self.assertEqual([], errors_of(source))
+
+    def test_annotates_expressions(self):
+        program = parse('let var a := 1 var s := "s" in (a + 2; s; print(s)) end')
+        self.assertEqual([], type_check(program))
+        sequence = program.expressions[0]
+        self.assertEqual([INT, STRING, UNIT], [e.static_type for e in sequence.expressions])
+        self.assertIs(UNIT, program.static_type)
+
+    def test_records_and_arrays(self):
+        self.assertWellTyped('let type r = {a: int, b: string} var x := r {a = 1, b = "b"} in x.a + 1 end')
+        self.assertWellTyped('let type t = array of int var a := t [3] of 0 in a[1] := a[0] + 1 end')
+        self.assertEqual(['Record r has no field c', 'Missing field a of record r'],
+                         errors_of('let type r = {a: int} in r {c = 1} end'))
+        self.assertEqual(['array initializer: expected int but found string'],
+                         errors_of('let type t = array of int in t [3] of "s" end'))
+
+    def test_nil(self):
+        declarations = [TypeDeclaration('r', RecordType({'a': TypeId('int')})),
+                        VariableDeclaration('x', TypeId('r'), NilValue())]
+        self.assertEqual([], type_check(Let(declarations, [Equals(LValue('x'), NilValue())])))
+        self.assertEqual(['Equals: unable to compare nil with nil'],
+                         [e.reason for e in type_check(Equals(NilValue(), NilValue()))])
+        self.assertEqual(['Variable y is initialized with nil but has no record type'],
+                         [e.reason for e in type_check(Let([VariableDeclaration('y', None, NilValue())], []))])
+
+    def test_types_are_nominal(self):
+        self.assertEqual(['variable b: expected u but found t'],
+                         errors_of('let type t = {a: int} type u = {a: int} var a := t {a = 1} var b : u := a in 0 '
+                                   'end'))
+        self.assertWellTyped('let type t = {a: int} type u = t var a := t {a = 1} var b : u := a in 0 end')
+
+    def test_recursive_declarations(self):
+        self.assertWellTyped('let type list = {head: int, tail: list} function second(l: list): int = l.tail.head '
+                             'in 0 end')
+        self.assertWellTyped('let function even(n: int): int = if n = 0 then 1 else odd(n - 1) '
+                             'function odd(n: int): int = if n = 0 then 0 else even(n - 1) in even(4) end')
+        self.assertEqual(['Undeclared function odd'],
+                         errors_of('let function even(n: int): int = if n = 0 then 1 else odd(n - 1) var a := 1 '
+                                   'function odd(n: int): int = even(n - 1) in even(4) end'))
+        self.assertEqual(['Type a is declared in a cycle of aliases', 'Type b is declared in a cycle of aliases'],
+                         errors_of('let type a = b type b = a in 0 end'))
+
+    def test_functions(self):
+        self.assertEqual(['argument 1 of f: expected int but found string'],
+                         errors_of('let function f(a: int): int = a in f("s") end'))
+        self.assertEqual(['body of f: expected unit but found int'], errors_of('let function f(a: int) = a in 0 end'))
+        self.assertEqual(['argument 1 of print: expected int or string but found unit'], errors_of('print(())'))
+
+    def test_operations(self):
+        self.assertEqual(['Add: expected int but found string'], errors_of('1 + "s"'))
+        self.assertEqual(['LessThan: expected int but found string', 'LessThan: expected int but found string'],
+                         errors_of('"a" < "b"'))
+        self.assertWellTyped('"a" = "b"')
+        self.assertEqual(['Equals: unable to compare int with string'], errors_of('1 = "b"'))
+
+    def test_scopes(self):
+        self.assertEqual(['Undeclared variable b'], errors_of('(let var b := 1 in b end; b)'))
+        self.assertEqual(['Unable to assign to loop variable i'], errors_of('for i := 1 to 3 do i := 2'))
+        self.assertEqual(['Branches of if have different types: int and string'], errors_of('if 1 then 2 else "s"'))
+
+    def test_errors_are_located(self):
+        errors = type_check(Parser('let var a := 1\nin a := "s" end', 'file.tig').parse())
+        self.assertEqual(['file.tig:2: assignment: expected int but found string'], [e.to_string() for e in errors])
+
+    def test_specialize(self):
+        program = parse('let var a := 1 in (while a < 3 do a := a + 1; if a = 3 then "s" = "t" else 0) end')
+        self.assertEqual([], type_check(program))
+        typed = Typed()
+        typed.visit(specialize(program))
+        self.assertEqual(['While', 'LessThan', 'Add', 'If', 'Equals'], typed.typed)
+        self.assertEqual(0, program.evaluate(create_environment_with_natives()).integer)
+
+    def assertSpecializedAs(self, expected, source):
+        program = parse(source)
+        self.assertEqual([], type_check(program))
+        typed = Typed()
+        typed.visit(specialize(program))
+        self.assertEqual(expected, typed.typed)
+        return program
+
+    def test_specialize_under_dynamic_scoping(self):
+        # f's x is the global int lexically but g's string parameter when called from g
+        program = self.assertSpecializedAs([], 'let var x := 1 function f() : int = x + 1 '
+                                               'function g(x : string) : int = f() in print(g("s")) end')
+        with self.assertRaises(AssertionError):
+            program.evaluate(create_environment_with_natives())
+        # h's parameter is bound by modifying the innermost y, which is g's
+        program = self.assertSpecializedAs([], 'let function h(y : string) : int = 0 '
+                                               'function g() : int = let var y := 1 in h("s"); y + 1 end in g() end')
+        with self.assertRaises(AssertionError):
+            program.evaluate(create_environment_with_natives())
+        # a read of a local is trusted if every write to its name is
+        self.assertSpecializedAs(['If', 'LessThan', 'Subtract', 'Subtract'],
+                                 'let function fib(n : int) : int = if n < 2 then n else '
+                                 '(let var k := n in fib(k - 1) + fib(k - 2) end) in fib(10) end')
+        self.assertSpecializedAs(['Add', 'Add'], 'let function f(a : int) : int = '
+                                                 '(for i := 1 to 2 do a := a + i; a + 1) in f(0) end')
+
+    def test_print_tests_are_well_typed(self):
+        for path in list_test_files('print-tests'):
+            self.assertEqual([], [e.to_string() for e in type_check(parse_file(path))], path)
+
+
+if __name__ == '__main__':
+    unittest.main()
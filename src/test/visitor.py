@@ -0,0 +1,76 @@
+import unittest
+
+from src.ast import Add, IntegerValue, LValue, Sequence, Let, VariableDeclaration, TypeId
+from src.parser import Parser
+from src.visitor import Visitor, to_string, tree_equals, tree_hash, children
+
+# deeper than CPython's default recursion limit
+DEPTH = 20000
+
+
+def nested_adds(depth):
+    exp = IntegerValue(0)
+    for i in range(depth):
+        exp = Add(exp, IntegerValue(i))
+    return exp
+
+
+class Recorder(Visitor):
+    def __init__(self, skip=None):
+        self.events = []
+        self.skip = skip
+
+    def enter(self, node):
+        self.events.append('enter ' + node.__class__.__name__)
+        return node.__class__ is not self.skip
+
+    def leave(self, node):
+        self.events.append('leave ' + node.__class__.__name__)
+
+
+class TestVisitor(unittest.TestCase):
+    def test_to_string_format(self):
+        exp = Let([VariableDeclaration('a', None, IntegerValue(1))], [Add(LValue('a'), IntegerValue(2))])
+        self.assertEqual('Let(declarations=[VariableDeclaration(name=a, type=None, exp=IntegerValue(1))], '
+                         'expressions=[Add(left=LValue(name=a, next=None), right=IntegerValue(2))])', exp.to_string())
+
+    def test_children_in_order(self):
+        exp = Sequence([IntegerValue(1), LValue('b'), IntegerValue(3)])
+        self.assertEqual([IntegerValue(1), LValue('b'), IntegerValue(3)], children(exp))
+
+    def test_enter_and_leave_order(self):
+        recorder = Recorder()
+        recorder.visit(Add(IntegerValue(1), Sequence([LValue('a')])))
+        self.assertEqual(['enter Add', 'enter IntegerValue', 'leave IntegerValue', 'enter Sequence', 'enter LValue',
+                          'leave LValue', 'leave Sequence', 'leave Add'], recorder.events)
+
+    def test_enter_can_skip_children(self):
+        recorder = Recorder(Sequence)
+        recorder.visit(Add(IntegerValue(1), Sequence([LValue('a')])))
+        self.assertEqual(['enter Add', 'enter IntegerValue', 'leave IntegerValue', 'enter Sequence', 'leave Add'],
+                         recorder.events)
+
+    def test_equals(self):
+        self.assertTrue(tree_equals(Add(IntegerValue(1), LValue('a')), Add(IntegerValue(1), LValue('a'))))
+        self.assertFalse(tree_equals(Add(IntegerValue(1), LValue('a')), Add(IntegerValue(1), LValue('b'))))
+        self.assertFalse(tree_equals(Sequence([IntegerValue(1)]), Sequence([IntegerValue(1), IntegerValue(1)])))
+        self.assertFalse(tree_equals(VariableDeclaration('a', None, IntegerValue(1)),
+                                     VariableDeclaration('a', TypeId('int'), IntegerValue(1))))
+
+    def test_equal_trees_hash_equally(self):
+        source = 'let var a := 1 in a + 2 * 3 end'
+        self.assertEqual(tree_hash(Parser(source).parse()), tree_hash(Parser(source).parse()))
+        self.assertNotEqual(tree_hash(Parser('1 + 2').parse()), tree_hash(Parser('2 + 1').parse()))
+
+    def test_deep_trees(self):
+        deep = nested_adds(DEPTH)
+        printed = to_string(deep)
+        self.assertTrue(printed.startswith('Add(left=Add(left='))
+        self.assertEqual(DEPTH, printed.count('Add('))
+        self.assertTrue(tree_equals(deep, nested_adds(DEPTH)))
+        self.assertFalse(tree_equals(deep, nested_adds(DEPTH - 1)))
+        self.assertEqual(tree_hash(deep), tree_hash(nested_adds(DEPTH)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,12 @@
+from src.allocations import stats as allocations
 from src.rpythonized_object import RPythonizedObject
 from src.tokens import NumberToken, IdentifierToken, KeywordToken, SymbolToken, StringToken
 
 
 class Location(RPythonizedObject):
     def __init__(self, offset, line, file):
+        if allocations.enabled:
+            allocations.allocated(self.__class__.__name__)
         self.offset = offset
         self.line = line
         self.file = file
@@ -34,6 +37,15 @@ class Tokenizer:
         self.line = 1
         self.buffer = []
 
+    def seek(self, offset, end, line, line_offset):
+        """Tokenize only the text between 'offset' and 'end', which starts at 'line' and 'line_offset' (e.g. a function
+        body skipped by a lazy parser), so that its tokens keep their locations in the whole text"""
+        self.offset = offset
+        self.length = end
+        self.line = line
+        self.line_offset = line_offset
+        self.buffer = []
+
     def all(self):
         """Return all of the tokens in the text"""
         ts = []
@@ -262,3 +274,19 @@ class Tokenizer:
         #         c = self.__read()
         #     if c != '': self.__unread()
         #     return value
+
+
+class TokenList(Tokenizer):
+    """Replays tokens already produced, e.g. by src/chunked_tokenizer.py, to a parser"""
+
+    def __init__(self, tokens, file=None):
+        Tokenizer.__init__(self, '', file)
+        self.tokens = tokens
+        self.index = 0
+
+    def tokenize(self):
+        if self.index < len(self.tokens):
+            token = self.tokens[self.index]
+            self.index += 1
+            return token
+        return None
@@ -1,8 +1,11 @@
+from src.allocations import stats as allocations
 from src.rpythonized_object import RPythonizedObject
 
 
 class Token(RPythonizedObject):
     def __init__(self, value=None, location=None):
+        if allocations.enabled:
+            allocations.allocated(self.__class__.__name__)
         self.value = value
         self.location = location
 
@@ -0,0 +1,171 @@
+"""
+Summarize a PYPYLOG produced by bin/tiger-interpreter per Tiger source location, e.g.:
+
+    PYPYLOG=jit-log-opt,jit-summary:jit.log bin/tiger-interpreter program.tig
+    python src/tools/jitlog.py jit.log
+
+Loops are attributed to the location in their header (see get_location in src/ast.py, e.g. 'queens.tig:18 For');
+bridges are attributed to the loop owning the guard they leave from. Guard failures are only known if the log also
+contains the jit-backend-counts section; aborts are attributed to the last location traced before them.
+"""
+import re
+import sys
+
+SECTION_START = re.compile(r'^\[[0-9a-f]+\] \{([\w-]+)$')
+SECTION_END = re.compile(r'^\[[0-9a-f]+\] ([\w-]+)\}$')
+LOOP_HEADER = re.compile(r'^# Loop (\d+) \((.*)\) : (loop|entry bridge) with (\d+) ops$')
+BRIDGE_HEADER = re.compile(r'^# bridge out of Guard (0x[0-9a-f]+) with (\d+) ops$')
+GUARD = re.compile(r'^(?:\+\d+: )?guard_\w+\(.*descr=<Guard(0x[0-9a-f]+)>')
+MERGE_POINT = re.compile(r"debug_merge_point\(\d+, \d+, '(.*)'\)")
+ABORT = re.compile(r'ABORTING TRACING\s*(.*)$')
+BRIDGE_COUNT = re.compile(r'^bridge (\d+):(\d+)$')
+SUMMARY_LINE = re.compile(r'^([^:\t]+):\s*(.*)$')
+
+UNKNOWN = '<unknown>'
+
+
+class LocationStats:
+    def __init__(self, location):
+        self.location = location
+        self.loops = 0
+        self.entry_bridges = 0
+        self.bridges = 0
+        self.aborts = 0
+        self.guard_failures = 0
+        self.operations = 0
+        self.guards = 0
+
+    def traces(self):
+        return self.loops + self.entry_bridges + self.bridges
+
+    def operations_per_trace(self):
+        return float(self.operations) / self.traces() if self.traces() else 0.0
+
+
+class JitLog:
+    def __init__(self):
+        self.locations = {}  # map of source locations to LocationStats
+        self.guards = {}  # map of guard addresses to the location of the trace containing them
+        self.summary = []  # (name, value) pairs from the jit-summary section, in order
+        self.aborts = []  # (location, reason) pairs
+
+    def stats(self, location):
+        if location not in self.locations:
+            self.locations[location] = LocationStats(location)
+        return self.locations[location]
+
+
+def parse(lines):
+    """Parse the lines of a PYPYLOG file into a JitLog"""
+    log = JitLog()
+    section = None
+    body = []
+    last_location = UNKNOWN
+    for line in lines:
+        line = line.rstrip('\n')
+        start = SECTION_START.match(line)
+        end = SECTION_END.match(line)
+        if start:
+            section = start.group(1)
+            body = []
+        elif end and end.group(1) == section:
+            if section == 'jit-log-opt-loop':
+                parse_loop(log, body)
+            elif section == 'jit-log-opt-bridge':
+                parse_bridge(log, body)
+            elif section == 'jit-summary':
+                parse_summary(log, body)
+            elif section == 'jit-backend-counts':
+                parse_backend_counts(log, body)
+            section = None
+        else:
+            body.append(line)
+            merge_point = MERGE_POINT.search(line)
+            if merge_point:
+                last_location = merge_point.group(1)
+            abort = ABORT.search(line)
+            if abort:
+                reason = abort.group(1).strip() or 'unknown reason'
+                log.aborts.append((last_location, reason))
+                log.stats(last_location).aborts += 1
+    return log
+
+
+def parse_loop(log, body):
+    header = LOOP_HEADER.match(body[0]) if body else None
+    location = header.group(2) if header else UNKNOWN
+    stats = log.stats(location)
+    if header and header.group(3) == 'entry bridge':
+        stats.entry_bridges += 1
+    else:
+        stats.loops += 1
+    record_operations(log, stats, location, body[1:], int(header.group(4)) if header else 0)
+
+
+def parse_bridge(log, body):
+    header = BRIDGE_HEADER.match(body[0]) if body else None
+    location = log.guards.get(header.group(1), UNKNOWN) if header else UNKNOWN
+    stats = log.stats(location)
+    stats.bridges += 1
+    record_operations(log, stats, location, body[1:], int(header.group(2)) if header else 0)
+
+
+def record_operations(log, stats, location, body, operations):
+    stats.operations += operations
+    for line in body:
+        guard = GUARD.match(line)
+        if guard:
+            stats.guards += 1
+            log.guards[guard.group(1)] = location
+
+
+def parse_summary(log, body):
+    for line in body:
+        match = SUMMARY_LINE.match(line.strip())
+        if match:
+            log.summary.append((match.group(1).strip(), ' '.join(match.group(2).split())))
+
+
+def parse_backend_counts(log, body):
+    """Bridge counters are keyed by the decimal address of the guard they leave from; each run of a bridge is a guard
+    failure of the trace owning that guard"""
+    for line in body:
+        match = BRIDGE_COUNT.match(line.strip())
+        if match:
+            location = log.guards.get(hex(int(match.group(1))).rstrip('L'), UNKNOWN)
+            log.stats(location).guard_failures += int(match.group(2))
+
+
+def report(log):
+    lines = ['%-40s %6s %6s %8s %7s %7s %9s %8s' % ('location', 'loops', 'entry', 'bridges', 'aborts', 'guards',
+                                                    'ops/trace', 'failures')]
+    ordered = sorted(log.locations.values(), key=lambda stats: (-stats.traces(), -stats.aborts, stats.location))
+    for stats in ordered:
+        lines.append('%-40s %6d %6d %8d %7d %7d %9.1f %8d' % (
+            stats.location, stats.loops, stats.entry_bridges, stats.bridges, stats.aborts, stats.guards,
+            stats.operations_per_trace(), stats.guard_failures))
+    if log.aborts:
+        lines.append('')
+        lines.append('Aborts:')
+        for location, reason in log.aborts:
+            lines.append('  %s: %s' % (location, reason))
+    if log.summary:
+        lines.append('')
+        lines.append('Summary:')
+        for name, value in log.summary:
+            lines.append('  %-28s %s' % (name + ':', value))
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv):
+    if len(argv) != 2:
+        print('Expected one PYPYLOG file name argument, e.g. python src/tools/jitlog.py jit.log')
+        return 40
+    with open(argv[1], 'r') as file:
+        log = parse(file)
+    sys.stdout.write(report(log))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,556 @@
+"""
+Static type checking of Tiger programs, following the type rules of Appel's Tiger: names are scoped lexically, record and
+array types are equal only if they come from the same declaration, 'nil' belongs to every record type and consecutive
+type or function declarations may refer to each other. Checking annotates every expression with its static type (see
+Program.static_type) and collects all errors rather than stopping at the first; specialize() then marks the nodes whose
+operands are known to be integers so that evaluation can drop its class checks (see Program.typed).
+"""
+from src.ast import Exp, NilValue, IntegerValue, StringValue, ArrayCreation, RecordCreation, ObjectCreation, TypeId, \
+    LValue, RecordLValue, ArrayLValue, FunctionCall, MethodCall, Assign, If, While, For, Break, Let, TypeDeclaration, \
+    VariableDeclaration, FunctionDeclaration, ArrayType, RecordType, Sequence, BinaryOperation, Equals, NotEquals, \
+    GreaterThanOrEquals, LessThanOrEquals, GreaterThan, LessThan
+from src.visitor import Visitor
+
+
+class TigerType:
+    name = ''
+
+    def to_string(self):
+        return self.name
+
+    def accepts(self, other):
+        """Whether a value of type 'other' can be used where this type is expected"""
+        return other is self or other is ERROR or self is ERROR
+
+
+class Primitive(TigerType):
+    def __init__(self, name):
+        self.name = name
+
+
+class Printable(Primitive):
+    """The parameter type of print, which prints both integers and strings (see util.tiger_print)"""
+
+    def accepts(self, other):
+        return other is INT or other is STRING or other is ERROR
+
+
+INT = Primitive('int')
+STRING = Primitive('string')
+NIL = Primitive('nil')
+UNIT = Primitive('unit')
+ERROR = Primitive('<error>')  # the type of erroneous expressions; accepted anywhere so that errors do not cascade
+PRINTABLE = Printable('int or string')
+
+
+class ArrayOf(TigerType):
+    def __init__(self, name):
+        self.name = name
+        self.element = ERROR  # set once the declarations it may refer to are known
+
+
+class RecordOf(TigerType):
+    def __init__(self, name):
+        self.name = name
+        self.fields = {}  # map of field names to types; set once the declarations it may refer to are known
+
+    def accepts(self, other):
+        return other is self or other is NIL or other is ERROR
+
+
+class VariableEntry:
+    def __init__(self, type, assignable=True):
+        self.type = type
+        self.assignable = assignable  # loop variables may not be assigned
+
+
+class FunctionEntry:
+    def __init__(self, parameters, result):
+        self.parameters = parameters
+        self.result = result
+
+
+# the native functions of create_environment_with_natives
+NATIVES = {'print': FunctionEntry([PRINTABLE], UNIT)}
+# and the names their parameters are bound to, which calls write like any variable (see Specialization)
+NATIVE_PARAMETERS = {'print': ['string']}
+
+
+class Scope:
+    """Variables and functions share a namespace; types have their own"""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.values = {}  # map of names to VariableEntry or FunctionEntry
+        self.types = {}  # map of names to TigerTypes
+
+    def find_value(self, name):
+        scope = self
+        while scope is not None:
+            if name in scope.values:
+                return scope.values[name]
+            scope = scope.parent
+        return None
+
+    def find_type(self, name):
+        scope = self
+        while scope is not None:
+            if name in scope.types:
+                return scope.types[name]
+            scope = scope.parent
+        return None
+
+
+class TypeCheckError:
+    def __init__(self, reason, node):
+        self.reason = reason
+        self.node = node
+
+    def to_string(self):
+        location = self.node.location.to_string() if self.node is not None and self.node.location is not None \
+            else '<unknown>'
+        return '%s: %s' % (location, self.reason)
+
+
+def global_scope():
+    scope = Scope()
+    scope.types['int'] = INT
+    scope.types['string'] = STRING
+    for name in NATIVES:
+        scope.values[name] = NATIVES[name]
+    return scope
+
+
+class TypeChecker:
+    """Checks a program in one (recursive) pass over its tree"""
+
+    def __init__(self):
+        self.errors = []
+        self.nearest = None  # the innermost node being checked that has a location, to report errors on other nodes
+
+    def check(self, program):
+        """Check 'program', returning the list of TypeCheckErrors found (empty if it is well-typed)"""
+        self.check_expression(program, global_scope())
+        return self.errors
+
+    def error(self, reason, node):
+        if node.location is None:
+            node = self.nearest
+        self.errors.append(TypeCheckError(reason, node))
+        return ERROR
+
+    def expect(self, expected, actual, node, what):
+        if not expected.accepts(actual):
+            self.error('%s: expected %s but found %s' % (what, expected.to_string(), actual.to_string()), node)
+
+    def check_expression(self, node, scope):
+        nearest = self.nearest
+        if node.location is not None:
+            self.nearest = node
+        type = self.expression_type(node, scope)
+        self.nearest = nearest
+        if isinstance(node, Exp):
+            node.static_type = type
+        return type
+
+    def expression_type(self, node, scope):
+        if isinstance(node, NilValue):
+            return NIL
+        elif isinstance(node, IntegerValue):
+            return INT
+        elif isinstance(node, StringValue):
+            return STRING
+        elif isinstance(node, LValue):
+            return self.check_lvalue(node, scope)
+        elif isinstance(node, BinaryOperation):
+            return self.check_operation(node, scope)
+        elif isinstance(node, FunctionCall):
+            return self.check_call(node, scope)
+        elif isinstance(node, Assign):
+            return self.check_assign(node, scope)
+        elif isinstance(node, If):
+            return self.check_if(node, scope)
+        elif isinstance(node, While):
+            self.expect(INT, self.check_expression(node.condition, scope), node.condition, 'while condition')
+            self.expect(UNIT, self.check_expression(node.body, scope), node.body, 'while body')
+            return UNIT
+        elif isinstance(node, For):
+            self.expect(INT, self.check_expression(node.start, scope), node.start, 'for start')
+            self.expect(INT, self.check_expression(node.end, scope), node.end, 'for end')
+            inner = Scope(scope)
+            inner.values[node.var] = VariableEntry(INT, False)
+            self.expect(UNIT, self.check_expression(node.body, inner), node.body, 'for body')
+            return UNIT
+        elif isinstance(node, Break):
+            return UNIT
+        elif isinstance(node, Let):
+            inner = Scope(scope)
+            self.check_declarations(node.declarations, inner)
+            return self.check_sequence(node.expressions, inner)
+        elif isinstance(node, Sequence):
+            return self.check_sequence(node.expressions, scope)
+        elif isinstance(node, ArrayCreation):
+            return self.check_array(node, scope)
+        elif isinstance(node, RecordCreation):
+            return self.check_record(node, scope)
+        elif isinstance(node, TypeDeclaration) or isinstance(node, VariableDeclaration) or \
+                isinstance(node, FunctionDeclaration):
+            self.check_declarations([node], scope)  # a declaration outside of a let adds to the enclosing scope
+            return UNIT
+        elif isinstance(node, ObjectCreation) or isinstance(node, MethodCall):
+            return self.error('Objects are not supported', node)
+        return self.error('Unable to check %s' % node.__class__.__name__, node)
+
+    def check_sequence(self, expressions, scope):
+        type = UNIT
+        for expression in expressions:
+            type = self.check_expression(expression, scope)
+        return type
+
+    def check_lvalue(self, lvalue, scope):
+        entry = scope.find_value(lvalue.name)
+        if entry is None:
+            return self.error('Undeclared variable %s' % lvalue.name, lvalue)
+        if not isinstance(entry, VariableEntry):
+            return self.error('%s is a function, not a variable' % lvalue.name, lvalue)
+        type = entry.type
+        next = lvalue.next
+        while next is not None and type is not ERROR:
+            if isinstance(next, RecordLValue):
+                if not isinstance(type, RecordOf):
+                    return self.error('Expected a record when accessing field %s but found %s' % (
+                        next.name, type.to_string()), lvalue)
+                if next.name not in type.fields:
+                    return self.error('Record %s has no field %s' % (type.to_string(), next.name), lvalue)
+                type = type.fields[next.name]
+            elif isinstance(next, ArrayLValue):
+                if not isinstance(type, ArrayOf):
+                    return self.error('Expected an array when indexing but found %s' % type.to_string(), lvalue)
+                self.expect(INT, self.check_expression(next.exp, scope), next.exp, 'array index')
+                type = type.element
+            next = next.next
+        return type
+
+    def check_operation(self, node, scope):
+        left = self.check_expression(node.left, scope)
+        right = self.check_expression(node.right, scope)
+        name = node.__class__.__name__
+        if isinstance(node, Equals) or isinstance(node, NotEquals):
+            if left is NIL and right is NIL:
+                return self.error('%s: unable to compare nil with nil' % name, node)
+            if not left.accepts(right) and not right.accepts(left):
+                return self.error('%s: unable to compare %s with %s' % (name, left.to_string(), right.to_string()),
+                                  node)
+            return INT
+        # the evaluator orders integers only (see e.g. LessThan), so strings are not accepted by comparisons either
+        self.expect(INT, left, node.left, name)
+        self.expect(INT, right, node.right, name)
+        return INT
+
+    def check_call(self, node, scope):
+        entry = scope.find_value(node.name)
+        if entry is None:
+            return self.error('Undeclared function %s' % node.name, node)
+        if not isinstance(entry, FunctionEntry):
+            return self.error('%s is a variable, not a function' % node.name, node)
+        if len(node.arguments) != len(entry.parameters):
+            self.error('Incorrect number of arguments passed (%d); expected %d for function %s' % (
+                len(node.arguments), len(entry.parameters), node.name), node)
+        for index in range(len(node.arguments)):
+            type = self.check_expression(node.arguments[index], scope)
+            if index < len(entry.parameters):
+                self.expect(entry.parameters[index], type, node.arguments[index],
+                            'argument %d of %s' % (index + 1, node.name))
+        return entry.result
+
+    def check_assign(self, node, scope):
+        entry = scope.find_value(node.lvalue.name)
+        if isinstance(entry, VariableEntry) and not entry.assignable and node.lvalue.next is None:
+            self.error('Unable to assign to loop variable %s' % node.lvalue.name, node)
+        target = self.check_lvalue(node.lvalue, scope)
+        self.expect(target, self.check_expression(node.expression, scope), node.expression, 'assignment')
+        return UNIT
+
+    def check_if(self, node, scope):
+        self.expect(INT, self.check_expression(node.condition, scope), node.condition, 'if condition')
+        then = self.check_expression(node.body_if_true, scope)
+        if node.body_if_false is None:
+            self.expect(UNIT, then, node.body_if_true, 'if-then without else')
+            return UNIT
+        otherwise = self.check_expression(node.body_if_false, scope)
+        if then.accepts(otherwise):
+            return then if then is not NIL else otherwise
+        if otherwise.accepts(then):
+            return otherwise
+        return self.error('Branches of if have different types: %s and %s' % (then.to_string(), otherwise.to_string()),
+                          node)
+
+    def check_array(self, node, scope):
+        type = self.resolve(node.type, scope)
+        self.expect(INT, self.check_expression(node.inner, scope), node.inner, 'array size')
+        initial = self.check_expression(node.outer, scope)
+        if not isinstance(type, ArrayOf):
+            if type is not ERROR:
+                self.error('%s is not an array type' % node.type.name, node)
+            return ERROR
+        self.expect(type.element, initial, node.outer, 'array initializer')
+        return type
+
+    def check_record(self, node, scope):
+        type = self.resolve(node.type, scope)
+        types = {}
+        for name in node.fields:
+            types[name] = self.check_expression(node.fields[name], scope)
+        if not isinstance(type, RecordOf):
+            if type is not ERROR:
+                self.error('%s is not a record type' % node.type.name, node)
+            return ERROR
+        for name in types:
+            if name not in type.fields:
+                self.error('Record %s has no field %s' % (type.to_string(), name), node)
+            else:
+                self.expect(type.fields[name], types[name], node.fields[name], 'field %s' % name)
+        for name in type.fields:
+            if name not in types:
+                self.error('Missing field %s of record %s' % (name, type.to_string()), node)
+        return type
+
+    def resolve(self, type_id, scope):
+        type = scope.find_type(type_id.name)
+        if type is None:
+            return self.error('Undeclared type %s' % type_id.name, type_id)
+        return type
+
+    def resolve_declared(self, type, declaration, scope):
+        """Resolve the type named in a variable or function declaration; the parser also accepts type definitions there"""
+        if not isinstance(type, TypeId):
+            return self.error('Expected a type name in the declaration of %s' % declaration.name, declaration)
+        return self.resolve(type, scope)
+
+    def check_declarations(self, declarations, scope):
+        """Consecutive type declarations, and consecutive function declarations, may refer to each other"""
+        index = 0
+        nearest = self.nearest
+        while index < len(declarations):
+            declaration = declarations[index]
+            if declaration.location is not None:
+                self.nearest = declaration
+            if isinstance(declaration, TypeDeclaration) or isinstance(declaration, FunctionDeclaration):
+                end = index
+                while end < len(declarations) and declarations[end].__class__ is declaration.__class__:
+                    end += 1
+                if isinstance(declaration, TypeDeclaration):
+                    self.check_types(declarations[index:end], scope)
+                else:
+                    self.check_functions(declarations[index:end], scope)
+                index = end
+            else:
+                if isinstance(declaration, VariableDeclaration):
+                    self.check_variable(declaration, scope)
+                else:
+                    self.error('Unable to check %s' % declaration.__class__.__name__, declaration)
+                index += 1
+        self.nearest = nearest
+
+    def check_variable(self, declaration, scope):
+        type = self.check_expression(declaration.exp, scope)
+        if declaration.type is not None:
+            declared = self.resolve_declared(declaration.type, declaration, scope)
+            self.expect(declared, type, declaration.exp, 'variable %s' % declaration.name)
+            type = declared
+        elif type is NIL:
+            type = self.error('Variable %s is initialized with nil but has no record type' % declaration.name,
+                              declaration)
+        elif type is UNIT:
+            type = self.error('Variable %s is initialized without a value' % declaration.name, declaration)
+        scope.values[declaration.name] = VariableEntry(type)
+
+    def check_types(self, declarations, scope):
+        names = {}
+        for declaration in declarations:
+            if declaration.name in names:
+                self.error('Type %s is declared twice in the same group' % declaration.name, declaration)
+            names[declaration.name] = True
+            if isinstance(declaration.type, RecordType):
+                scope.types[declaration.name] = RecordOf(declaration.name)
+            elif isinstance(declaration.type, ArrayType):
+                scope.types[declaration.name] = ArrayOf(declaration.name)
+        # aliases (type a = b) may refer to other aliases of the group, but not in a cycle
+        aliases = {}
+        for declaration in declarations:
+            if isinstance(declaration.type, TypeId):
+                aliases[declaration.name] = declaration.type
+        for declaration in declarations:
+            if isinstance(declaration.type, TypeId):
+                scope.types[declaration.name] = self.resolve_alias(declaration, aliases, scope)
+        for declaration in declarations:
+            type = scope.types[declaration.name]
+            if isinstance(declaration.type, RecordType) and isinstance(type, RecordOf):
+                for name in declaration.type.type_fields:
+                    type.fields[name] = self.resolve(declaration.type.type_fields[name], scope)
+            elif isinstance(declaration.type, ArrayType) and isinstance(type, ArrayOf):
+                type.element = self.resolve(TypeId(declaration.type.type_name), scope)
+
+    def resolve_alias(self, declaration, aliases, scope):
+        seen = {declaration.name: True}
+        target = aliases[declaration.name]
+        while target.name in aliases:
+            if target.name in seen:
+                return self.error('Type %s is declared in a cycle of aliases' % declaration.name, declaration)
+            seen[target.name] = True
+            target = aliases[target.name]
+        return self.resolve(target, scope)
+
+    def check_functions(self, declarations, scope):
+        entries = []
+        names = {}
+        for declaration in declarations:
+            if declaration.name in names:
+                self.error('Function %s is declared twice in the same group' % declaration.name, declaration)
+            names[declaration.name] = True
+            parameters = [self.resolve(parameter.type, scope) if parameter.type is not None else ERROR
+                          for parameter in declaration.parameters]
+            result = UNIT
+            if declaration.return_type is not None:
+                result = self.resolve_declared(declaration.return_type, declaration, scope)
+            entry = FunctionEntry(parameters, result)
+            scope.values[declaration.name] = entry
+            entries.append(entry)
+        for index in range(len(declarations)):
+            declaration = declarations[index]
+            entry = entries[index]
+            inner = Scope(scope)
+            for position in range(len(declaration.parameters)):
+                inner.values[declaration.parameters[position].name] = VariableEntry(entry.parameters[position])
+            body = self.check_expression(declaration.body, inner)
+            self.expect(entry.result, body, declaration.body, 'body of %s' % declaration.name)
+
+
+def type_check(program):
+    return TypeChecker().check(program)
+
+
+class Specialization(Visitor):
+    """
+    Marks the nodes whose operands are known to be integers at run time. Types are checked with lexical scopes but names
+    are found dynamically (see Environment), so a static type only holds for some reads: a read is trusted if it is
+    bound in the same function (a parameter or a variable of a let in its body) and if every write to a variable of that
+    name, anywhere, stores a trusted integer. Calls write their arguments to the parameters' names, reaching past the
+    callee to any binding of the name, so these count as writes too. Other reads keep their run-time class checks
+    """
+
+    def __init__(self):
+        self.scopes = [{}]  # the lexical scopes, innermost last: maps of names to whether they are variables
+        self.boundaries = [0]  # for each function being visited, the index of its first scope
+        self.loops = []  # the For nodes being visited, whose variable is only bound in their body
+        self.writes = []  # the names written to and the expressions they are written
+        self.calls = []
+        self.parameters = {}  # map of function names to the parameter names of each function of that name
+        for name in NATIVE_PARAMETERS:
+            self.parameters[name] = [NATIVE_PARAMETERS[name]]
+        self.candidates = []  # the nodes that may skip their class checks
+        self.unsafe = {}  # the names written something other than a trusted integer
+
+    def enter(self, node):
+        if len(self.loops) > 0 and node is self.loops[-1].body:
+            self.scopes.append({self.loops[-1].var: True})
+        if isinstance(node, For):
+            self.loops.append(node)
+        elif isinstance(node, Let):
+            self.scopes.append({})
+        elif isinstance(node, FunctionDeclaration):
+            self.scopes[-1][node.name] = False
+            self.parameters.setdefault(node.name, []).append([parameter.name for parameter in node.parameters])
+            self.boundaries.append(len(self.scopes))
+            scope = {}
+            for parameter in node.parameters:
+                scope[parameter.name] = True
+            self.scopes.append(scope)
+        elif node.__class__ is LValue:
+            node.local = self.is_local(node.name)
+        elif isinstance(node, Assign):
+            if node.lvalue.next is None:
+                self.writes.append(Write(node.lvalue.name, node.expression))
+        elif isinstance(node, FunctionCall):
+            self.calls.append(node)
+        if isinstance(node, BinaryOperation) or isinstance(node, If) or isinstance(node, While):
+            self.candidates.append(node)
+        return True
+
+    def leave(self, node):
+        if isinstance(node, For):
+            self.loops.pop()
+        elif isinstance(node, Let):
+            self.scopes.pop()
+        elif isinstance(node, FunctionDeclaration):
+            self.scopes.pop()
+            self.boundaries.pop()
+        elif isinstance(node, VariableDeclaration):
+            self.scopes[-1][node.name] = True
+            self.writes.append(Write(node.name, node.exp))
+        if len(self.loops) > 0 and node is self.loops[-1].body:
+            self.scopes.pop()
+
+    def is_local(self, name):
+        """Whether the innermost lexical binding of 'name' is a variable of the function being visited"""
+        for index in range(len(self.scopes) - 1, -1, -1):
+            if name in self.scopes[index]:
+                return self.scopes[index][name] and index >= self.boundaries[-1]
+        return False
+
+    def specialize(self, program):
+        self.visit(program)
+        for call in self.calls:
+            for names in self.parameters.get(call.name, []):
+                for index in range(min(len(names), len(call.arguments))):
+                    self.writes.append(Write(names[index], call.arguments[index]))
+        # distrusting a name may distrust the writes reading it, so repeat until no more names are distrusted
+        changed = True
+        while changed:
+            changed = False
+            for write in self.writes:
+                if write.name not in self.unsafe and not self.trusted(write.expression):
+                    self.unsafe[write.name] = True
+                    changed = True
+        for node in self.candidates:
+            if isinstance(node, Equals) or isinstance(node, NotEquals):
+                node.typed = node.left.static_type is INT and node.right.static_type is INT and \
+                             self.trusted(node.left) and self.trusted(node.right)
+            elif isinstance(node, BinaryOperation):
+                node.typed = self.trusted(node.left) and self.trusted(node.right)
+            else:
+                node.typed = self.trusted(node.condition)
+
+    def trusted(self, node):
+        """Whether 'node' evaluates to an IntegerValue: a literal, an operation (which checks its own operands) or a
+        trusted read, possibly as the value of an if, sequence or let"""
+        pending = [node]
+        while len(pending) > 0:
+            node = pending.pop()
+            if isinstance(node, If):
+                if node.body_if_false is None:
+                    return False
+                pending.append(node.body_if_true)
+                pending.append(node.body_if_false)
+            elif isinstance(node, Sequence) or isinstance(node, Let):
+                if len(node.expressions) == 0:
+                    return False
+                pending.append(node.expressions[-1])
+            elif node.__class__ is LValue:
+                if not node.local or node.name in self.unsafe:
+                    return False
+            elif not isinstance(node, IntegerValue) and not isinstance(node, BinaryOperation):
+                return False
+        return True
+
+
+class Write:
+    def __init__(self, name, expression):
+        self.name = name
+        self.expression = expression
+
+
+def specialize(program):
+    """Mark the nodes of a program that type-checked without errors so that they skip their run-time class checks"""
+    Specialization().specialize(program)
+    return program
@@ -0,0 +1,173 @@
+"""
+Iterative traversals of AST nodes. Each node class describes itself with describe(out): the text it prints and its
+immediate children, in order. Printing, equality, hashing and analysis passes (see Visitor) are built on these
+descriptions with an explicit work stack rather than recursion, so that they handle trees of any depth and size.
+"""
+
+# hashes are kept to 31 bits so that they are the same under CPython and RPython
+HASH_MASK = 0x7fffffff
+
+
+class Description:
+    """The text and the children of a single node: texts[i] precedes nodes[i] and the last text follows the last node.
+    Analyses that only need the children can skip building text with Description(False)"""
+
+    def __init__(self, with_text=True):
+        self.with_text = with_text
+        self.texts = ['']
+        self.nodes = []
+
+    def text(self, string):
+        if self.with_text:
+            self.texts[-1] += string
+
+    def child(self, node):
+        """Describe a child node; None (e.g. an optional type) is printed as 'None'"""
+        if node is None:
+            self.text('None')
+        else:
+            self.nodes.append(node)
+            self.texts.append('')
+
+    def children(self, nodes):
+        self.text('[')
+        for index in range(len(nodes)):
+            if index > 0:
+                self.text(', ')
+            self.child(nodes[index])
+        self.text(']')
+
+    def fields(self, nodes):
+        """Describe a map of names to child nodes (e.g. the fields of a record)"""
+        self.text('{')
+        first = True
+        for name in nodes:
+            if not first:
+                self.text(', ')
+            first = False
+            self.text(name + '=')
+            self.child(nodes[name])
+        self.text('}')
+
+
+def describe(node, with_text=True):
+    description = Description(with_text)
+    node.describe(description)
+    return description
+
+
+def children(node):
+    return describe(node, False).nodes
+
+
+class Step:
+    def __init__(self, node, leaving):
+        self.node = node
+        self.leaving = leaving
+
+
+class Visitor:
+    """
+    Walks a tree in pre-order with an explicit stack: enter() is called on each node before its children, which are
+    skipped if it returns False, and leave() after them (if they were not skipped). Sub-classes override both.
+    """
+
+    def enter(self, node):
+        return True
+
+    def leave(self, node):
+        pass
+
+    def visit(self, root):
+        stack = [Step(root, False)]
+        while len(stack) > 0:
+            step = stack.pop()
+            if step.leaving:
+                self.leave(step.node)
+            elif self.enter(step.node):
+                stack.append(Step(step.node, True))
+                nodes = children(step.node)
+                for index in range(len(nodes) - 1, -1, -1):
+                    stack.append(Step(nodes[index], False))
+
+
+class Piece:
+    """Either text to print or a node still to describe"""
+
+    def __init__(self, text, node):
+        self.text = text
+        self.node = node
+
+
+class Collector:
+    """A writer that keeps everything written, to be joined once"""
+
+    def __init__(self):
+        self.pieces = []
+
+    def write(self, string):
+        self.pieces.append(string)
+
+    def to_string(self):
+        return ''.join(self.pieces)
+
+
+def write_tree(root, out):
+    """Print a tree piece by piece to 'out' (anything with a write(string) method, e.g. a BufferedWriter), so that the
+    printed text is never held in memory as a whole"""
+    stack = [Piece(None, root)]
+    while len(stack) > 0:
+        piece = stack.pop()
+        if piece.node is None:
+            if len(piece.text) > 0:
+                out.write(piece.text)
+            continue
+        description = describe(piece.node)
+        stack.append(Piece(description.texts[-1], None))
+        for index in range(len(description.nodes) - 1, -1, -1):
+            stack.append(Piece(None, description.nodes[index]))
+            stack.append(Piece(description.texts[index], None))
+
+
+def to_string(root):
+    """Print a tree; the result is built in a single list and joined once"""
+    collector = Collector()
+    write_tree(root, collector)
+    return collector.to_string()
+
+
+def tree_equals(left, right):
+    """Compare two trees structurally: every pair of corresponding nodes must print the same text (which includes their
+    class names and non-node fields) and have the same number of children"""
+    lefts = [left]
+    rights = [right]
+    while len(lefts) > 0:
+        a = lefts.pop()
+        b = rights.pop()
+        if a is b:
+            continue
+        description_a = describe(a)
+        description_b = describe(b)
+        if len(description_a.nodes) != len(description_b.nodes):
+            return False
+        for index in range(len(description_a.texts)):
+            if description_a.texts[index] != description_b.texts[index]:
+                return False
+        lefts.extend(description_a.nodes)
+        rights.extend(description_b.nodes)
+    return True
+
+
+def tree_hash(root):
+    """Hash a tree consistently with tree_equals: equal trees have equal hashes"""
+    hash = 0
+    stack = [root]
+    while len(stack) > 0:
+        description = describe(stack.pop())
+        for text in description.texts:
+            for c in text:
+                hash = (hash * 1000003 + ord(c)) & HASH_MASK
+            hash = (hash * 1000003 + 1) & HASH_MASK  # separate the texts
+        for index in range(len(description.nodes) - 1, -1, -1):
+            stack.append(description.nodes[index])
+    return hash